@@ -1,5 +1,64 @@
-from django.contrib import admin
-from .models import Category, Product
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils.functional import cached_property
+
+from .models import Category, Product, Inventory, InventoryQuerySet, UsageLog
+from . import costing, waste
+from .models import ProductMaster, InventoryItem, Location, StockTransfer, WasteRecord
+from .models import Recipe, RecipeIngredient, SalesImport
+
+# Below this many rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Uses PostgreSQL's planner estimate instead of COUNT(*) for unfiltered
+    changelists of large tables; filtered lists and other databases fall
+    back to an exact count.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE relname = %s',
+                    [self.object_list.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+    ordering = ['-pk']
+
+
+class ExpiryStatusFilter(admin.SimpleListFilter):
+    title = 'expiry status'
+    parameter_name = 'status'
+
+    def lookups(self, request, model_admin):
+        return [
+            ('expired', 'Expired'),
+            ('expiring_soon', 'Expiring soon'),
+            ('good', 'Good'),
+        ]
+
+    def queryset(self, request, queryset):
+        if self.value() in InventoryQuerySet.STATUSES:
+            # Translated to expiry_date ranges, so the expiry index is used
+            return queryset.with_status(self.value())
+        return queryset
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -10,4 +69,117 @@ class CategoryAdmin(admin.ModelAdmin):
 class ProductAdmin(admin.ModelAdmin):
     list_display = ['name', 'barcode', 'category', 'unit_price']
     list_filter = ['category']
-    search_fields = ['name', 'barcode']
\ No newline at end of file
+    list_select_related = ['category']
+    search_fields = ['name', 'barcode']
+    autocomplete_fields = ['category']
+
+@admin.register(Inventory)
+class InventoryAdmin(LargeTableAdmin):
+    list_display = ['product', 'quantity', 'expiry_date', 'location', 'supplier', 'batch_number', 'is_expired', 'added_by']
+    list_select_related = ['product', 'location', 'added_by']
+    list_filter = [ExpiryStatusFilter, ('expiry_date', admin.DateFieldListFilter), 'location', 'is_expired']
+    search_fields = ['=product__barcode', 'product__name', 'batch_number']
+    autocomplete_fields = ['product', 'added_by']
+    readonly_fields = ['created_at']
+    actions = ['write_off', 'mark_expired']
+
+    def get_queryset(self, request):
+        # __str__ goes through product.name (also used by autocomplete results)
+        return super().get_queryset(request).select_related('product')
+
+    def save_model(self, request, obj, form, change):
+        # The change view already runs in a transaction
+        before = Inventory.objects.get(pk=obj.pk) if change else None
+        super().save_model(request, obj, form, change)
+        if change:
+            costing.record_adjustment(before, obj)
+        else:
+            costing.record_receipt(obj)
+
+    def delete_model(self, request, obj):
+        if obj.quantity > 0:
+            costing.issue(obj, obj.quantity)
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            costing.issue_many((batch, batch.quantity) for batch in queryset.filter(quantity__gt=0))
+            super().delete_queryset(request, queryset)
+
+    @admin.action(description='Write off selected batches as waste (set quantity to 0)')
+    def write_off(self, request, queryset):
+        result = waste.write_off(queryset, user=request.user, notes='Written off in admin')
+        self.message_user(
+            request, f"Wrote off {result['batches']} batches ({result['value']:.2f} at cost).", messages.SUCCESS
+        )
+
+    @admin.action(description='Mark selected batches as expired')
+    def mark_expired(self, request, queryset):
+        updated = queryset.update(is_expired=True, version=F('version') + 1)
+        self.message_user(request, f'Marked {updated} batches as expired.', messages.SUCCESS)
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'kind', 'is_active', 'created_at']
+    list_filter = ['kind', 'is_active']
+    search_fields = ['name']
+
+class RecipeIngredientInline(admin.TabularInline):
+    model = RecipeIngredient
+    autocomplete_fields = ['product']
+    extra = 1
+
+@admin.register(Recipe)
+class RecipeAdmin(admin.ModelAdmin):
+    list_display = ['name', 'pos_code', 'is_active', 'updated_at']
+    list_filter = ['is_active']
+    search_fields = ['name', '=pos_code']
+    inlines = [RecipeIngredientInline]
+
+@admin.register(SalesImport)
+class SalesImportAdmin(admin.ModelAdmin):
+    list_display = ['filename', 'lines', 'portions_sold', 'units_used', 'value', 'imported_by', 'created_at']
+    list_select_related = ['imported_by']
+    readonly_fields = [field.name for field in SalesImport._meta.fields]
+
+@admin.register(StockTransfer)
+class StockTransferAdmin(LargeTableAdmin):
+    list_display = ['product', 'quantity', 'from_location', 'to_location', 'moved_by', 'created_at']
+    list_select_related = ['product', 'from_location', 'to_location', 'moved_by']
+    list_filter = ['to_location', ('created_at', admin.DateFieldListFilter)]
+    raw_id_fields = ['source', 'destination']
+
+@admin.register(WasteRecord)
+class WasteRecordAdmin(LargeTableAdmin):
+    list_display = ['product', 'quantity', 'value', 'reason', 'supplier', 'location', 'recorded_by', 'created_at']
+    list_select_related = ['product', 'location', 'recorded_by']
+    list_filter = ['reason', ('created_at', admin.DateFieldListFilter), 'location']
+    search_fields = ['=product__barcode', 'product__name', 'supplier']
+    raw_id_fields = ['inventory', 'product', 'recorded_by']
+
+@admin.register(UsageLog)
+class UsageLogAdmin(LargeTableAdmin):
+    list_display = ['inventory', 'quantity_used', 'used_by', 'created_at']
+    list_select_related = ['inventory__product', 'used_by']
+    list_filter = [('created_at', admin.DateFieldListFilter)]
+    search_fields = ['=inventory__product__barcode', 'inventory__product__name', 'notes']
+    autocomplete_fields = ['inventory', 'used_by']
+
+@admin.register(ProductMaster)
+class ProductMasterAdmin(admin.ModelAdmin):
+    list_display = ['gtin', 'name', 'shelf_life_days']
+    search_fields = ['=gtin', 'name']
+
+@admin.register(InventoryItem)
+class InventoryItemAdmin(LargeTableAdmin):
+    list_display = ['product', 'quantity', 'expiry_date', 'supplier', 'batch_number']
+    list_select_related = ['product']
+    list_filter = [('expiry_date', admin.DateFieldListFilter)]
+    search_fields = ['=product__gtin', 'product__name', 'batch_number']
+    autocomplete_fields = ['product']
+    actions = ['write_off']
+
+    @admin.action(description='Write off selected items (set quantity to 0)')
+    def write_off(self, request, queryset):
+        updated = queryset.filter(quantity__gt=0).update(quantity=0, version=F('version') + 1)
+        self.message_user(request, f'Wrote off {updated} items.', messages.SUCCESS)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Register background job handlers
+        from . import tasks  # noqa: F401
+        from . import resolvers
+        resolvers.connect_signals()
@@ -0,0 +1,184 @@
+# backend/inventory/catalog.py
+
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import CatalogSnapshot, Category, Product, ProductMaster
+
+FORMAT = 'columnar-v1'
+COLUMNS = ('gtin', 'name', 'shelf_life_days', 'category')
+
+# GTINs are keyed by their GTIN-14 (inventory/gtin.py), other codes as stored
+PRODUCT_CODE = Coalesce('gtin14', 'barcode')
+MASTER_CODE = Coalesce('gtin14', 'gtin')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def catalog_state():
+    """Row counts and newest updated_at of each source table, plus a digest of the category names."""
+    products = Product.objects.aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    masters = ProductMaster.objects.aggregate(count=Count('pk'), updated_at=Max('updated_at'))
+    categories = list(Category.objects.order_by('pk').values_list('pk', 'name'))
+    return {
+        'products_count': products['count'],
+        'products_updated_at': products['updated_at'],
+        'masters_count': masters['count'],
+        'masters_updated_at': masters['updated_at'],
+        'categories_digest': hashlib.sha256(json.dumps(categories).encode()).hexdigest(),
+    }
+
+
+def is_current(snapshot, state):
+    return all(getattr(snapshot, field) == value for field, value in state.items())
+
+
+def _all_rows():
+    """{gtin: (name, shelf_life_days, category)}; Product wins over ProductMaster for the same code."""
+    rows = {}
+    for gtin, name, shelf_life_days in (
+        ProductMaster.objects.annotate(code=MASTER_CODE).values_list('code', 'name', 'shelf_life_days').iterator()
+    ):
+        rows[gtin] = (name, shelf_life_days, None)
+    for barcode, name, shelf_life_days, category in (
+        Product.objects.annotate(code=PRODUCT_CODE)
+        .values_list('code', 'name', 'shelf_life_days', 'category__name').iterator()
+    ):
+        rows[barcode] = (name, shelf_life_days, category)
+    return rows
+
+
+def _new_since(model, watermark):
+    if watermark is None:
+        return model.objects.count()
+    return model.objects.filter(created_at__gt=watermark).count()
+
+
+def _changed_since(model, watermark):
+    if watermark is None:
+        return model.objects.all()
+    # Overlap the watermark so rows committed late with an older timestamp are not missed
+    overlap = timedelta(seconds=_setting('CATALOG_WATERMARK_OVERLAP_SECONDS', 60))
+    return model.objects.filter(updated_at__gte=watermark - overlap)
+
+
+def _merged_rows(previous, state):
+    """
+    Apply only the rows changed since ``previous`` to its contents. Returns
+    None when that cannot be done safely (rows deleted, categories renamed,
+    codes changed) and the catalog has to be read in full.
+    """
+    if previous.categories_digest != state['categories_digest']:
+        return None
+    if state['products_count'] != previous.products_count + _new_since(Product, previous.products_updated_at):
+        return None
+    if state['masters_count'] != previous.masters_count + _new_since(ProductMaster, previous.masters_updated_at):
+        return None
+
+    rows = decode(previous.payload)
+    masters = list(
+        _changed_since(ProductMaster, previous.masters_updated_at)
+        .annotate(code=MASTER_CODE).values_list('code', 'name', 'shelf_life_days')
+    )
+    master_codes = [gtin for gtin, _, _ in masters]
+    shadowed = set(
+        Product.objects.filter(Q(gtin14__in=master_codes) | Q(barcode__in=master_codes))
+        .annotate(code=PRODUCT_CODE).values_list('code', flat=True)
+    )
+    for gtin, name, shelf_life_days in masters:
+        if gtin not in shadowed:
+            rows[gtin] = (name, shelf_life_days, None)
+    for barcode, name, shelf_life_days, category in (
+        _changed_since(Product, previous.products_updated_at)
+        .annotate(code=PRODUCT_CODE).values_list('code', 'name', 'shelf_life_days', 'category__name')
+    ):
+        rows[barcode] = (name, shelf_life_days, category)
+
+    expected = state['products_count'] + ProductMaster.objects.annotate(code=MASTER_CODE).exclude(
+        code__in=Product.objects.annotate(code=PRODUCT_CODE).values('code')
+    ).count()
+    return rows if len(rows) == expected else None
+
+
+def encode(rows, version, generated_at):
+    """
+    Gzip-compressed columnar JSON: one array per column, rows sorted by
+    gtin so devices can binary-search, and categories stored once in a
+    lookup table (-1 for none).
+    """
+    gtins = sorted(rows)
+    categories = sorted({row[2] for row in rows.values() if row[2]})
+    category_index = {name: index for index, name in enumerate(categories)}
+    document = {
+        'format': FORMAT,
+        'version': version,
+        'generated_at': generated_at.isoformat(),
+        'count': len(gtins),
+        'columns': list(COLUMNS),
+        'categories': categories,
+        'gtin': gtins,
+        'name': [rows[gtin][0] for gtin in gtins],
+        'shelf_life_days': [rows[gtin][1] for gtin in gtins],
+        'category': [category_index.get(rows[gtin][2], -1) for gtin in gtins],
+    }
+    return gzip.compress(json.dumps(document, separators=(',', ':')).encode(), mtime=0)
+
+
+def decode(payload):
+    document = json.loads(gzip.decompress(bytes(payload)))
+    categories = document['categories']
+    return {
+        gtin: (name, shelf_life_days, categories[category] if category >= 0 else None)
+        for gtin, name, shelf_life_days, category in zip(
+            document['gtin'], document['name'], document['shelf_life_days'], document['category']
+        )
+    }
+
+
+def content_digest(rows):
+    return hashlib.sha256(json.dumps(sorted(rows.items())).encode()).hexdigest()
+
+
+def current_snapshot():
+    """
+    The latest snapshot, rebuilt first if the catalog has changed since it
+    was made. Changed rows are merged into the previous version where
+    possible; edits that leave the snapshot contents unchanged (such as a
+    new description) do not create a new version.
+    """
+    state = catalog_state()
+    previous = CatalogSnapshot.objects.order_by('-pk').first()
+    if previous is not None and is_current(previous, state):
+        return previous
+
+    rows = _merged_rows(previous, state) if previous is not None else None
+    if rows is None:
+        rows = _all_rows()
+    digest = content_digest(rows)
+
+    with transaction.atomic():
+        if previous is not None and previous.digest == digest:
+            for field, value in state.items():
+                setattr(previous, field, value)
+            previous.save(update_fields=list(state))
+            return previous
+
+        snapshot = CatalogSnapshot.objects.create(payload=b'', digest=digest, row_count=len(rows), **state)
+        snapshot.payload = encode(rows, snapshot.pk, snapshot.created_at)
+        snapshot.save(update_fields=['payload'])
+
+        keep = _setting('CATALOG_SNAPSHOTS_KEPT', 3)
+        CatalogSnapshot.objects.filter(pk__lte=snapshot.pk - keep).delete()
+
+    print(f"📦 Catalog snapshot v{snapshot.pk}: {len(rows)} products, {len(snapshot.payload)} bytes")
+    return snapshot
@@ -0,0 +1,160 @@
+# backend/inventory/concurrency.py
+
+import copy
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpResponseNotModified
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+ANY = '*'
+
+
+class PreconditionFailed(Exception):
+    """If-Match did not match the row's current version."""
+
+
+def etag(instance):
+    return f'"{instance.version}"'
+
+
+def parse_if_match(header):
+    """
+    The version named by an If-Match header: None when the header is
+    absent, ANY for ``*``. Raises PreconditionFailed for anything that is
+    not one of our ETags.
+    """
+    if not header:
+        return None
+    header = header.strip()
+    if header == ANY:
+        return ANY
+    value = header.split(',')[0].strip()
+    if value.startswith('W/'):
+        value = value[2:]
+    try:
+        return int(value.strip('"'))
+    except ValueError:
+        raise PreconditionFailed(header)
+
+
+def conditional_update(instance, changes, expected_version=None, quantity_delta=0):
+    """
+    UPDATE ... SET <changes>, version = version + 1 WHERE pk = ? [AND version = ?]
+    without reading the row first. A ``quantity_delta`` is applied in SQL
+    (quantity = quantity + delta) and never takes the quantity below zero.
+    Returns True if the row was updated.
+    """
+    model = type(instance)
+    for name, value in changes.items():
+        setattr(instance, name, value)
+    values = dict(changes)
+    if hasattr(instance, 'fill_derived_fields'):
+        values.update(instance.fill_derived_fields())
+
+    queryset = model.objects.filter(pk=instance.pk)
+    if expected_version is not None:
+        queryset = queryset.filter(version=expected_version)
+    if quantity_delta:
+        values['quantity'] = F('quantity') + quantity_delta
+        if quantity_delta < 0:
+            queryset = queryset.filter(quantity__gte=-quantity_delta)
+    values['version'] = F('version') + 1
+    return queryset.update(**values) == 1
+
+
+class OptimisticConcurrencyMixin:
+    """
+    ModelViewSet mixin for models with a ``version`` column. Reads return
+    the version as an ETag; PUT/PATCH with ``If-Match`` only apply if the
+    row is still at that version (412 otherwise). Without If-Match the
+    write is still made conditional on the version read at the start of
+    the request, unless CONCURRENCY_REQUIRE_IF_MATCH rejects it with 428.
+
+    PATCH may send ``quantity_delta`` instead of ``quantity``; the change is
+    made atomically in SQL, so concurrent adjustments all count and need
+    no If-Match. Override after_update() to keep derived records in step;
+    it runs in the same transaction as the UPDATE.
+    """
+
+    def after_update(self, before, instance):
+        """Called with the row as it was and as it is now, after a successful update."""
+
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if etag(instance) in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag(instance)
+        return response
+
+    def _precondition_failed(self, instance, current=None):
+        current = current or type(instance).objects.filter(pk=instance.pk).only('version').first()
+        if current is None:
+            return Response({'error': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
+        response = Response({
+            'error': 'This item was changed by someone else; reload it and try again',
+            'current_version': current.version,
+        }, status=status.HTTP_412_PRECONDITION_FAILED)
+        response['ETag'] = etag(current)
+        return response
+
+    def update(self, request, *args, **kwargs):
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+
+        try:
+            expected = parse_if_match(request.headers.get('If-Match'))
+        except PreconditionFailed:
+            return self._precondition_failed(instance)
+        if expected is None and getattr(settings, 'CONCURRENCY_REQUIRE_IF_MATCH', False):
+            return Response({'error': 'If-Match header required'}, status=status.HTTP_428_PRECONDITION_REQUIRED)
+
+        data = request.data.copy()
+        delta = data.pop('quantity_delta', None)
+        if isinstance(delta, list):
+            # QueryDict.pop returns a list
+            delta = delta[0]
+        if delta is not None:
+            try:
+                delta = int(delta)
+            except (TypeError, ValueError):
+                raise ValidationError({'quantity_delta': 'Must be an integer'})
+            if not partial:
+                raise ValidationError({'quantity_delta': 'Only allowed with PATCH'})
+
+        serializer = self.get_serializer(instance, data=data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        changes = dict(serializer.validated_data)
+        if delta and 'quantity' in changes:
+            raise ValidationError({'quantity_delta': 'Send quantity or quantity_delta, not both'})
+
+        if expected is None:
+            # A pure delta commutes with other writers; anything else must not
+            # overwrite a change made since this request read the row
+            expected = None if (delta and not changes) else instance.version
+        elif expected == ANY:
+            expected = None
+
+        before = copy.copy(instance)
+        with transaction.atomic():
+            if not conditional_update(instance, changes, expected, delta or 0):
+                current = type(instance).objects.filter(pk=instance.pk).only('version', 'quantity').first()
+                if current is None or not delta or (expected is not None and current.version != expected):
+                    return self._precondition_failed(instance, current)
+                return Response({'error': f'Only {current.quantity} units available'}, status=status.HTTP_409_CONFLICT)
+
+            # Re-read through the viewset so annotations are fresh too
+            instance = self.get_object()
+            if delta:
+                # The row is locked by our UPDATE, so this is what the delta applied to
+                before.quantity = instance.quantity - delta
+            self.after_update(before, instance)
+        response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag(instance)
+        return response
@@ -0,0 +1,355 @@
+# backend/inventory/costing.py
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import ArchivedUsageLog, CostLedger, Inventory, PriceHistory, Product, StockTransfer, UsageLog
+
+FOUR_PLACES = Decimal('0.0001')
+
+
+def _quantize(value):
+    return Decimal(value).quantize(FOUR_PLACES)
+
+
+def _locked_ledgers(keys):
+    """
+    {(product_id, supplier_key): CostLedger} for ``keys`` (a dict of key ->
+    supplier display name), creating missing rows, locked for update.
+    """
+    CostLedger.objects.bulk_create(
+        [
+            CostLedger(product_id=product_id, supplier_key=supplier_key, supplier=supplier)
+            for (product_id, supplier_key), supplier in keys.items()
+        ],
+        ignore_conflicts=True
+    )
+    ledgers = CostLedger.objects.select_for_update().filter(
+        product_id__in={product_id for product_id, _ in keys}
+    ).order_by('pk')
+    return {
+        (ledger.product_id, ledger.supplier_key): ledger
+        for ledger in ledgers
+        if (ledger.product_id, ledger.supplier_key) in keys
+    }
+
+
+def record_receipt(inventory, received_at=None):
+    """
+    Add a newly received batch to its product/supplier ledger and to the
+    price history. Stock moved between locations is not a receipt and must
+    not come through here.
+    """
+    received_at = received_at or inventory.created_at or timezone.now()
+    value = inventory.cost_price * inventory.quantity
+    # Joins the caller's transaction without a savepoint of its own
+    with transaction.atomic(savepoint=False):
+        PriceHistory.objects.create(
+            product_id=inventory.product_id,
+            supplier=inventory.supplier,
+            supplier_key=inventory.supplier_key,
+            inventory=inventory,
+            unit_cost=inventory.cost_price,
+            quantity=inventory.quantity,
+            received_at=received_at,
+        )
+        key = (inventory.product_id, inventory.supplier_key)
+        ledger = _locked_ledgers({key: inventory.supplier})[key]
+        if ledger.on_hand_quantity <= 0:
+            # Nothing left to average against
+            ledger.on_hand_quantity, ledger.on_hand_value = 0, Decimal('0')
+        ledger.on_hand_quantity += inventory.quantity
+        ledger.on_hand_value = _quantize(ledger.on_hand_value + value)
+        ledger.received_quantity += inventory.quantity
+        ledger.received_value = _quantize(ledger.received_value + value)
+        if ledger.on_hand_quantity > 0:
+            ledger.average_cost = _quantize(ledger.on_hand_value / ledger.on_hand_quantity)
+        ledger.last_cost = inventory.cost_price
+        if ledger.last_received_at is None or received_at >= ledger.last_received_at:
+            ledger.last_received_at = received_at
+        ledger.save()
+
+
+def issue_many(entries):
+    """
+    Take stock out of (or, with a negative quantity, back into) the ledgers
+    at their current average cost. ``entries`` are Inventory rows (or
+    anything with product_id, supplier_key, supplier and cost_price) paired
+    with a quantity. Returns the value of each entry, in order; the batch
+    cost is used for ledgers that have never seen a receipt.
+    """
+    entries = list(entries)
+    if not entries:
+        return []
+    keys = {(item.product_id, item.supplier_key): item.supplier for item, _ in entries}
+    values = []
+    # bulk_update() skips auto_now
+    now = timezone.now()
+    with transaction.atomic():
+        ledgers = _locked_ledgers(keys)
+        for item, quantity in entries:
+            ledger = ledgers[(item.product_id, item.supplier_key)]
+            unit_cost = ledger.average_cost if ledger.received_quantity else item.cost_price
+            value = _quantize(unit_cost * quantity)
+            ledger.on_hand_quantity -= quantity
+            ledger.on_hand_value = _quantize(ledger.on_hand_value - value)
+            if ledger.on_hand_quantity <= 0 or ledger.on_hand_value < 0:
+                ledger.on_hand_quantity = max(ledger.on_hand_quantity, 0)
+                ledger.on_hand_value = Decimal('0')
+            ledger.issued_quantity += quantity
+            ledger.issued_value = _quantize(ledger.issued_value + value)
+            ledger.updated_at = now
+            values.append(value)
+        CostLedger.objects.bulk_update(
+            ledgers.values(),
+            ['on_hand_quantity', 'on_hand_value', 'issued_quantity', 'issued_value', 'updated_at'],
+            batch_size=500
+        )
+    return values
+
+
+def issue(inventory, quantity):
+    return issue_many([(inventory, quantity)])[0]
+
+
+def record_adjustment(before, after):
+    """
+    Move the ledgers by a hand edit of a batch: the quantity difference
+    is issued (or returned, if it went up), and a batch moved to another
+    product or supplier takes its stock from the old ledger to the new one.
+    """
+    if (before.product_id, before.supplier_key) != (after.product_id, after.supplier_key):
+        entries = [(before, before.quantity), (after, -after.quantity)]
+    else:
+        entries = [(after, before.quantity - after.quantity)]
+    return issue_many([(item, quantity) for item, quantity in entries if quantity])
+
+
+class InsufficientStock(ValueError):
+    """The batch holds fewer units than are being taken from it."""
+
+
+def take_stock(inventory_id, quantity):
+    """
+    Take ``quantity`` units off a batch (a negative quantity puts them back)
+    with one UPDATE that never takes it below zero.
+    """
+    batches = Inventory.objects.filter(pk=inventory_id)
+    if quantity > 0:
+        batches = batches.filter(quantity__gte=quantity)
+    if not batches.update(quantity=F('quantity') - quantity, version=F('version') + 1):
+        available = Inventory.objects.filter(pk=inventory_id).values_list('quantity', flat=True).first()
+        raise InsufficientStock(f'Only {available or 0} units available')
+
+
+def record_usage(usage_log):
+    """
+    Take a new UsageLog's units off its batch and out of the ledger, and
+    store their cost (at the ledger's average) on the log. Raises
+    InsufficientStock if the batch is short; run it in the transaction
+    that saved the log.
+    """
+    take_stock(usage_log.inventory_id, usage_log.quantity_used)
+    usage_log.cost_value = issue(usage_log.inventory, usage_log.quantity_used)
+    usage_log.save(update_fields=['cost_value'])
+    return usage_log.cost_value
+
+
+def reverse_usage(usage_log):
+    """Put a UsageLog's units back on its batch and into the ledger (before it is changed or deleted)."""
+    take_stock(usage_log.inventory_id, -usage_log.quantity_used)
+    issue(usage_log.inventory, -usage_log.quantity_used)
+
+
+def rebuild_ledgers(backfill_history=True):
+    """
+    Recompute every ledger from the live batches: on-hand quantity and
+    value from Inventory, receipt totals from PriceHistory. With
+    ``backfill_history`` batches received before price history existed get
+    a PriceHistory row first (batches created by transfers are skipped).
+    """
+    with transaction.atomic():
+        backfilled = 0
+        if backfill_history:
+            missing = (
+                Inventory.objects
+                .filter(price_record__isnull=True)
+                .exclude(pk__in=StockTransfer.objects.filter(destination__isnull=False).values('destination_id'))
+                .values_list('pk', 'product_id', 'supplier', 'supplier_key', 'cost_price', 'quantity', 'created_at')
+            )
+            rows = [
+                PriceHistory(
+                    inventory_id=pk, product_id=product_id, supplier=supplier, supplier_key=supplier_key,
+                    unit_cost=cost_price, quantity=max(quantity, 0), received_at=created_at
+                )
+                for pk, product_id, supplier, supplier_key, cost_price, quantity, created_at in missing.iterator()
+            ]
+            PriceHistory.objects.bulk_create(rows, batch_size=1000)
+            backfilled = len(rows)
+
+        # Issue totals cannot be rederived from batches, so they are carried over
+        issued = {
+            (product_id, supplier_key): (quantity, value)
+            for product_id, supplier_key, quantity, value in CostLedger.objects.values_list(
+                'product_id', 'supplier_key', 'issued_quantity', 'issued_value'
+            )
+        }
+        ledgers = {}
+        for row in PriceHistory.objects.values_list(
+            'product_id', 'supplier_key', 'supplier', 'unit_cost', 'quantity', 'received_at'
+        ).order_by('received_at', 'pk').iterator():
+            product_id, supplier_key, supplier, unit_cost, quantity, received_at = row
+            ledger = ledgers.setdefault(
+                (product_id, supplier_key),
+                CostLedger(product_id=product_id, supplier_key=supplier_key, supplier=supplier)
+            )
+            ledger.received_quantity += quantity
+            ledger.received_value += unit_cost * quantity
+            ledger.last_cost = unit_cost
+            ledger.last_received_at = received_at
+
+        for product_id, supplier_key, supplier, quantity, cost_price in Inventory.objects.filter(
+            quantity__gt=0
+        ).values_list('product_id', 'supplier_key', 'supplier', 'quantity', 'cost_price').iterator():
+            ledger = ledgers.setdefault(
+                (product_id, supplier_key),
+                CostLedger(product_id=product_id, supplier_key=supplier_key, supplier=supplier)
+            )
+            ledger.on_hand_quantity += quantity
+            ledger.on_hand_value += cost_price * quantity
+
+        for key, ledger in ledgers.items():
+            ledger.issued_quantity, ledger.issued_value = issued.get(key, (0, Decimal('0')))
+            ledger.on_hand_value = _quantize(ledger.on_hand_value)
+            ledger.received_value = _quantize(ledger.received_value)
+            if ledger.on_hand_quantity:
+                ledger.average_cost = _quantize(ledger.on_hand_value / ledger.on_hand_quantity)
+            elif ledger.received_quantity:
+                ledger.average_cost = _quantize(ledger.received_value / ledger.received_quantity)
+
+        CostLedger.objects.all().delete()
+        CostLedger.objects.bulk_create(ledgers.values(), batch_size=1000)
+
+    return {'ledgers': len(ledgers), 'price_history_backfilled': backfilled}
+
+
+def stock_valuation(product=None, supplier_key=None, by_supplier=False):
+    """Current stock value from the ledgers, per product (or per product and supplier)."""
+    ledgers = CostLedger.objects.filter(on_hand_quantity__gt=0)
+    if product:
+        ledgers = ledgers.filter(product_id=product)
+    if supplier_key:
+        ledgers = ledgers.filter(supplier_key=supplier_key)
+    group = ['product_id', 'product__name'] + (['supplier_key', 'supplier'] if by_supplier else [])
+    rows = list(
+        ledgers.values(*group)
+        .annotate(quantity=Sum('on_hand_quantity'), value=Sum('on_hand_value'))
+        .order_by('-value', *group)
+    )
+    for row in rows:
+        row['average_cost'] = _quantize(row['value'] / row['quantity'])
+    return {
+        'total_quantity': sum(row['quantity'] for row in rows),
+        'total_value': sum((row['value'] for row in rows), Decimal('0')),
+        'results': rows,
+    }
+
+
+def cost_of_goods_used(start, end, product=None):
+    """
+    Cost of the stock consumed in [start, end) per product, summed from the
+    cost stored on each UsageLog (live and archived). Logs written before
+    costing existed have no cost and are only counted.
+    """
+    live = UsageLog.objects.filter(
+        created_at__gte=start, created_at__lt=end, reason__in=UsageLog.CONSUMPTION_REASONS
+    ).annotate(product_ref=F('inventory__product_id'))
+    archived = ArchivedUsageLog.objects.filter(
+        created_at__gte=start, created_at__lt=end, reason__in=UsageLog.CONSUMPTION_REASONS
+    ).annotate(product_ref=F('product_id'))
+    if product:
+        live = live.filter(product_ref=product)
+        archived = archived.filter(product_ref=product)
+
+    totals = {}
+    for queryset in (live, archived):
+        rows = queryset.values('product_ref').annotate(
+            quantity=Sum('quantity_used'),
+            value=Sum('cost_value'),
+            uncosted=Count('pk', filter=Q(cost_value__isnull=True)),
+        ).order_by()
+        for row in rows:
+            total = totals.setdefault(row['product_ref'], {'quantity': 0, 'value': Decimal('0'), 'uncosted': 0})
+            total['quantity'] += row['quantity'] or 0
+            total['value'] += row['value'] or 0
+            total['uncosted'] += row['uncosted']
+
+    names = dict(Product.objects.filter(pk__in=[pk for pk in totals if pk]).values_list('pk', 'name'))
+    results = sorted(
+        (
+            {'product_id': pk, 'product_name': names.get(pk), **total}
+            for pk, total in totals.items()
+        ),
+        key=lambda row: row['value'],
+        reverse=True
+    )
+    return {
+        'start': start,
+        'end': end,
+        'total_quantity': sum(row['quantity'] for row in results),
+        'total_value': sum((row['value'] for row in results), Decimal('0')),
+        'uncosted_logs': sum(row['uncosted'] for row in results),
+        'results': results,
+    }
+
+
+def price_trends(product=None, supplier_key=None, since=None):
+    """
+    Receipt prices per product and supplier from PriceHistory: first, last,
+    lowest, highest and quantity-weighted average unit cost, plus the
+    individual receipts oldest first.
+    """
+    history = PriceHistory.objects.filter(quantity__gt=0)
+    if product:
+        history = history.filter(product_id=product)
+    if supplier_key:
+        history = history.filter(supplier_key=supplier_key)
+    if since:
+        history = history.filter(received_at__gte=since)
+
+    trends = {}
+    for row in history.values(
+        'product_id', 'product__name', 'supplier_key', 'supplier', 'unit_cost', 'quantity', 'received_at'
+    ).order_by('product_id', 'supplier_key', 'received_at', 'pk'):
+        trend = trends.setdefault((row['product_id'], row['supplier_key']), {
+            'product_id': row['product_id'],
+            'product_name': row['product__name'],
+            'supplier': row['supplier'],
+            'receipts': [],
+        })
+        trend['receipts'].append({
+            'received_at': row['received_at'],
+            'unit_cost': row['unit_cost'],
+            'quantity': row['quantity'],
+        })
+
+    results = []
+    for trend in trends.values():
+        receipts = trend['receipts']
+        costs = [receipt['unit_cost'] for receipt in receipts]
+        quantity = sum(receipt['quantity'] for receipt in receipts)
+        value = sum(receipt['unit_cost'] * receipt['quantity'] for receipt in receipts)
+        first, last = costs[0], costs[-1]
+        trend.update({
+            'first_cost': first,
+            'last_cost': last,
+            'min_cost': min(costs),
+            'max_cost': max(costs),
+            'average_cost': _quantize(value / quantity),
+            'change_pct': round(float((last - first) / first * 100), 2) if first else None,
+        })
+        results.append(trend)
+    return results
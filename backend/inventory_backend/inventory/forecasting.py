@@ -0,0 +1,182 @@
+# backend/inventory/forecasting.py
+
+import math
+from datetime import date, datetime, time, timedelta
+from datetime import timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Func, IntegerField, Sum
+from django.utils import timezone
+
+from .models import ArchivedUsageLog, Inventory, Product, UsageLog
+
+CACHE_KEY = 'inventory:reorder-suggestions:{day}'
+EPOCH = date(1970, 1, 1)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class UTCDayNumber(Func):
+    """
+    Days since 1970-01-01 of a datetime column, bucketed by UTC day with
+    native SQL (TruncDate runs a Python function per row on SQLite).
+    """
+    output_field = IntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='FLOOR(EXTRACT(EPOCH FROM %(expressions)s) / 86400)::integer',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) - 2440587.5 AS INTEGER)',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='FLOOR(UNIX_TIMESTAMP(%(expressions)s) / 86400)',
+            **extra_context
+        )
+
+
+def _utc_midnight(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+
+def load_usage_matrix(end_day, history_days):
+    """
+    Daily consumption per product for the ``history_days`` UTC days ending
+    the day before ``end_day``. Returns ``(product_ids, matrix)`` where
+    ``matrix[i, j]`` is the quantity of ``product_ids[i]`` used on
+    ``end_day - history_days + j``. Logs of batches the retention job has
+    closed are read back from ArchivedUsageLog, so archiving a batch does
+    not drop its consumption from the history.
+    """
+    start_day = end_day - timedelta(days=history_days)
+    window = {
+        'created_at__gte': _utc_midnight(start_day),
+        'created_at__lt': _utc_midnight(end_day),
+        'reason__in': UsageLog.CONSUMPTION_REASONS,
+    }
+    rows = []
+    for logs, product_field in (
+        (UsageLog.objects.filter(**window), 'inventory__product_id'),
+        (ArchivedUsageLog.objects.filter(product__isnull=False, **window), 'product_id'),
+    ):
+        rows += (
+            logs.annotate(day=UTCDayNumber('created_at'))
+            .values_list(product_field, 'day')
+            .annotate(total=Sum('quantity_used'))
+            .order_by()
+        )
+    rows = np.array(rows, dtype=np.int64).reshape(-1, 3)
+    if not len(rows):
+        return np.empty(0, dtype=np.int64), np.zeros((0, history_days))
+
+    product_ids, product_index = np.unique(rows[:, 0], return_inverse=True)
+    day_index = rows[:, 1] - (start_day - EPOCH).days
+    matrix = np.zeros((len(product_ids), history_days))
+    np.add.at(matrix, (product_index, day_index), rows[:, 2].astype(float))
+    return product_ids, matrix
+
+
+def forecast_daily_demand(matrix, start_day, horizon_days, moving_average_days=7):
+    """
+    Forecast demand for the next ``horizon_days`` days for every row of
+    ``matrix`` at once: the mean of a trailing moving average and a
+    day-of-week profile built from the complete weeks of history.
+    """
+    n_products, history_days = matrix.shape
+    window = min(moving_average_days, history_days)
+    moving_average = matrix[:, history_days - window:].mean(axis=1) if window else np.zeros(n_products)
+    moving_forecast = np.repeat(moving_average[:, None], horizon_days, axis=1)
+
+    weeks = history_days // 7
+    if weeks == 0:
+        return moving_forecast
+
+    # Per-weekday averages over the most recent complete weeks
+    recent = matrix[:, history_days - weeks * 7:]
+    profile = recent.reshape(n_products, weeks, 7).mean(axis=1)
+    first_weekday = (start_day + timedelta(days=history_days - weeks * 7)).weekday()
+    future_weekdays = (np.arange(horizon_days) + history_days + start_day.weekday()) % 7
+    # Column k of the profile holds weekday (first_weekday + k) % 7
+    seasonal_forecast = profile[:, (future_weekdays - first_weekday) % 7]
+
+    return (moving_forecast + seasonal_forecast) / 2
+
+
+def compute_reorder_suggestions(today=None):
+    """
+    Suggest order quantities for every product with recent consumption,
+    covering demand for REORDER_COVER_DAYS but never more than the product's
+    shelf life, so an order is not expected to expire unused.
+    """
+    today = today or timezone.now().date()
+    history_days = _setting('FORECAST_HISTORY_DAYS', 56)
+    cover_days = _setting('REORDER_COVER_DAYS', 7)
+
+    product_ids, matrix = load_usage_matrix(today, history_days)
+    if not len(product_ids):
+        return []
+
+    start_day = today - timedelta(days=history_days)
+    daily_forecast = forecast_daily_demand(matrix, start_day, cover_days)
+
+    # Whole-table reads grouped by product rather than huge IN (...) lists
+    products = {pk: (shelf_life, name) for pk, shelf_life, name in
+                Product.objects.values_list('pk', 'shelf_life_days', 'name').iterator(chunk_size=5000)}
+    stock = dict(
+        Inventory.objects
+        .on_hand()
+        .values_list('product_id')
+        .annotate(on_hand=Sum('quantity'))
+        .order_by()
+    )
+
+    ids = product_ids.tolist()
+    shelf_life_days = np.array([products.get(pk, (cover_days, ''))[0] for pk in ids])
+    on_hand = np.array([stock.get(pk, 0) for pk in ids], dtype=float)
+    usable_days = np.clip(np.minimum(shelf_life_days, cover_days), 1, cover_days)
+
+    cumulative = np.cumsum(daily_forecast, axis=1)
+    demand = cumulative[np.arange(len(product_ids)), usable_days - 1]
+    suggested = np.ceil(np.maximum(demand - on_hand, 0))
+
+    wanted = np.nonzero(suggested > 0)[0]
+    suggestions = [
+        {
+            'product_id': ids[i],
+            'product_name': products.get(ids[i], (0, ''))[1],
+            'daily_forecast': round(float(daily_forecast[i].mean()), 2),
+            'cover_days': int(usable_days[i]),
+            'forecast_demand': round(float(demand[i]), 2),
+            'on_hand': int(on_hand[i]),
+            'suggested_quantity': int(suggested[i]),
+        }
+        for i in wanted.tolist()
+    ]
+    suggestions.sort(key=lambda item: item['suggested_quantity'], reverse=True)
+    return suggestions
+
+
+def get_reorder_suggestions(refresh=False):
+    """Today's (UTC) suggestions, computed at most once per day per cache."""
+    today = timezone.now().date()
+    key = CACHE_KEY.format(day=today.isoformat())
+    suggestions = None if refresh else cache.get(key)
+    if suggestions is None:
+        suggestions = compute_reorder_suggestions(today)
+        midnight = _utc_midnight(today + timedelta(days=1))
+        cache.set(key, suggestions, max(math.ceil((midnight - timezone.now()).total_seconds()), 1))
+    return suggestions
@@ -0,0 +1,54 @@
+# backend/inventory/gtin.py
+
+import re
+
+from django.db.models import Q
+
+NON_DIGITS = re.compile(r'[\s\-.]')
+
+
+def check_digit(body):
+    """GS1 check digit for the digits of ``body`` (weights 3,1,3,... from the right)."""
+    total = sum(int(digit) * (3 if index % 2 == 0 else 1) for index, digit in enumerate(reversed(body)))
+    return str((10 - total % 10) % 10)
+
+
+def is_valid(code):
+    return len(code) in (8, 12, 13, 14) and code.isdigit() and check_digit(code[:-1]) == code[-1]
+
+
+def normalize_gtin(code):
+    """
+    Canonical GTIN-14 for a scanned or typed code, or None if it is not a
+    GTIN (internal or non-numeric codes, or a bad check digit).
+
+    EAN-8, UPC-A, EAN-13 and GTIN-14 are accepted with any amount of zero
+    padding: leading zeros are dropped and the rest is padded back to 14
+    digits, which leaves the check digit unchanged. Codes shorter than 8
+    digits are never GTINs, and a code whose check digit does not validate
+    is rejected rather than reread as another format.
+    """
+    if code is None:
+        return None
+    code = NON_DIGITS.sub('', str(code))
+    if not code.isdigit() or len(code) < 8:
+        return None
+    significant = code.lstrip('0')
+    if not significant or len(significant) > 14:
+        return None
+    gtin = significant.zfill(14)
+    return gtin if is_valid(gtin) else None
+
+
+def code_filter(code, raw_field, canonical_field='gtin14'):
+    """
+    Q matching rows whose canonical key equals the code's GTIN-14, or whose
+    raw field equals the code as sent (rows not yet backfilled, internal
+    codes).
+    """
+    code = str(code).strip()
+    canonical = normalize_gtin(code)
+    condition = Q(**{raw_field: code})
+    if canonical:
+        condition |= Q(**{canonical_field: canonical})
+    return condition
@@ -0,0 +1,160 @@
+# backend/inventory/gtin_backfill.py
+
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, When
+from django.utils import timezone
+
+from .gtin import normalize_gtin
+from .models import CostLedger, Product, ProductMaster, RecipeIngredient, StockSnapshot
+
+FOUR_PLACES = Decimal('0.0001')
+
+
+def _combine_ledgers(survivor, duplicate):
+    # Sums of a weighted-average ledger stay exact when two are added together
+    for field in ('on_hand_quantity', 'on_hand_value', 'received_quantity', 'received_value',
+                  'issued_quantity', 'issued_value'):
+        setattr(survivor, field, getattr(survivor, field) + getattr(duplicate, field))
+    if survivor.on_hand_quantity > 0:
+        survivor.average_cost = (survivor.on_hand_value / survivor.on_hand_quantity).quantize(FOUR_PLACES)
+    if duplicate.last_received_at and (
+        survivor.last_received_at is None or duplicate.last_received_at > survivor.last_received_at
+    ):
+        survivor.last_received_at, survivor.last_cost = duplicate.last_received_at, duplicate.last_cost
+
+
+def _combine_snapshots(survivor, duplicate):
+    survivor.quantity += duplicate.quantity
+    survivor.value += duplicate.value
+
+
+def _combine_ingredients(survivor, duplicate):
+    # Both lines stood for the same product, so a portion used the two amounts together
+    survivor.quantity += duplicate.quantity
+
+
+# Related rows that are unique per product: (key fields, how to fold a duplicate's row into the survivor's)
+UNIQUE_RELATED = {
+    CostLedger: (('supplier_key',), _combine_ledgers),
+    StockSnapshot: (('day',), _combine_snapshots),
+    RecipeIngredient: (('recipe',), _combine_ingredients),
+}
+
+
+def canonical_groups(model, raw_field, batch_size=1000):
+    """
+    Stream ``model`` once and return ({gtin14: [pk, ...]} with pks ascending,
+    [(pk, gtin14)] of rows whose stored gtin14 is missing or stale).
+    """
+    groups = {}
+    stale = []
+    rows = model.objects.order_by('pk').values_list('pk', raw_field, 'gtin14').iterator(chunk_size=batch_size)
+    for pk, code, stored in rows:
+        canonical = normalize_gtin(code)
+        if canonical:
+            groups.setdefault(canonical, []).append(pk)
+        if stored != canonical:
+            stale.append((pk, canonical))
+    return groups, stale
+
+
+def _merge_unique_rows(related, field, mapping, key_fields, combine):
+    """Re-point rows of ``related`` to the survivors, folding rows that would collide."""
+    attname = related._meta.get_field(field).attname
+    # Key on attnames, so a foreign key in the key costs no query per row
+    key_attnames = [related._meta.get_field(name).attname for name in key_fields]
+    survivors = {
+        (getattr(row, attname),) + tuple(getattr(row, name) for name in key_attnames): row
+        for row in related.objects.filter(**{f'{attname}__in': set(mapping.values())})
+    }
+    changed, moved, folded = [], [], []
+    for row in related.objects.filter(**{f'{attname}__in': list(mapping)}).order_by('pk'):
+        target = mapping[getattr(row, attname)]
+        key = (target,) + tuple(getattr(row, name) for name in key_attnames)
+        if key in survivors:
+            combine(survivors[key], row)
+            changed.append(survivors[key])
+            folded.append(row.pk)
+        else:
+            setattr(row, attname, target)
+            survivors[key] = row
+            moved.append(row)
+    related.objects.filter(pk__in=folded).delete()
+    changed_fields = [
+        f.name for f in related._meta.concrete_fields
+        if not f.primary_key and f.attname != attname and f.name not in key_fields
+    ]
+    if changed:
+        related.objects.bulk_update({row.pk: row for row in changed}.values(), changed_fields)
+    if moved:
+        related.objects.bulk_update(moved, [field])
+
+
+def merge_duplicates(model, mapping):
+    """
+    Move everything that references the duplicates in ``mapping``
+    ({duplicate pk: survivor pk}) to the survivors, then delete the
+    duplicates. Plain foreign keys are re-pointed with one UPDATE per
+    related table.
+    """
+    with transaction.atomic():
+        # related_objects leaves out relations declared with related_name='+'
+        for relation in model._meta.get_fields(include_hidden=True):
+            if not (relation.auto_created and (relation.one_to_many or relation.one_to_one)):
+                continue
+            related, field = relation.related_model, relation.field
+            if related in UNIQUE_RELATED:
+                key_fields, combine = UNIQUE_RELATED[related]
+                _merge_unique_rows(related, field.name, mapping, key_fields, combine)
+                continue
+            related.objects.filter(**{f'{field.attname}__in': list(mapping)}).update(**{
+                field.attname: Case(*(When(**{field.attname: duplicate}, then=survivor)
+                                      for duplicate, survivor in mapping.items()))
+            })
+        model.objects.filter(pk__in=list(mapping)).delete()
+
+
+def backfill(model, raw_field, dry_run=False, batch_size=1000):
+    """
+    Merge the rows of ``model`` that share a canonical GTIN into the oldest
+    one and store gtin14 on every row, ``batch_size`` rows per transaction.
+    """
+    groups, stale = canonical_groups(model, raw_field, batch_size)
+    mapping = {
+        duplicate: pks[0]
+        for pks in groups.values() if len(pks) > 1
+        for duplicate in pks[1:]
+    }
+    result = {
+        'duplicate_groups': sum(1 for pks in groups.values() if len(pks) > 1),
+        'merged': len(mapping),
+        'updated': sum(1 for pk, _ in stale if pk not in mapping),
+    }
+    if dry_run:
+        return result
+
+    duplicates = list(mapping.items())
+    for start in range(0, len(duplicates), batch_size):
+        merge_duplicates(model, dict(duplicates[start:start + batch_size]))
+
+    # bulk_update() skips auto_now; the catalog snapshot needs to see the new codes
+    now = timezone.now()
+    updates = [model(pk=pk, gtin14=canonical, updated_at=now) for pk, canonical in stale if pk not in mapping]
+    # Clear stale values first, so a GTIN moving from one row to another
+    # never trips the unique constraint halfway through
+    cleared = [pk for pk, _ in stale if pk not in mapping]
+    for start in range(0, len(cleared), batch_size):
+        model.objects.filter(pk__in=cleared[start:start + batch_size]).update(gtin14=None)
+    for start in range(0, len(updates), batch_size):
+        with transaction.atomic():
+            model.objects.bulk_update(updates[start:start + batch_size], ['gtin14', 'updated_at'])
+    return result
+
+
+def backfill_all(dry_run=False, batch_size=1000):
+    return {
+        'products': backfill(Product, 'barcode', dry_run, batch_size),
+        'product_masters': backfill(ProductMaster, 'gtin', dry_run, batch_size),
+    }
@@ -0,0 +1,209 @@
+# backend/inventory/idempotency.py
+
+import hashlib
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+MAX_KEY_LENGTH = 255
+
+# Outcomes a retry should not replay: the client is expected to try again
+RETRYABLE_STATUSES = {409, 429}
+
+
+class KeyInUse(Exception):
+    """The key is already bound to a request that is still in flight."""
+
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different body."""
+
+
+def data_fingerprint(data):
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def request_fingerprint(request):
+    """
+    Hash of the request body. JSON bodies are canonicalised first so the
+    same payload hashes alike whether it came alone or inside a batch.
+    """
+    body = request.body or b''
+    if request.content_type == 'application/json':
+        try:
+            return data_fingerprint(json.loads(body))
+        except ValueError:
+            pass
+    return hashlib.sha256(body).hexdigest()
+
+
+def request_scope(request, path=None):
+    user = getattr(request, 'user', None)
+    user_part = f'u{user.pk}' if user is not None and user.is_authenticated else 'anon'
+    return f'{request.method} {path or request.path} {user_part}'[:255]
+
+
+def _ttl():
+    return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+
+def _lease():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LEASE_SECONDS', 60))
+
+
+def _take_over(existing, now):
+    """
+    Claim an in-flight key whose lease has run out (its request crashed or
+    its worker died). The old lease is the guard, so only one retry wins
+    and the dead request can no longer complete or release the key.
+    """
+    lease_expires_at = now + _lease()
+    claimed = IdempotencyKey.objects.filter(
+        pk=existing.pk, status_code__isnull=True, lease_expires_at=existing.lease_expires_at
+    ).update(lease_expires_at=lease_expires_at, expires_at=now + _ttl())
+    if not claimed:
+        return None
+    existing.lease_expires_at = lease_expires_at
+    return existing
+
+
+def begin(key, scope, request_hash):
+    """
+    Claim ``key`` for a new request. Returns ``(record, None)`` when the
+    caller should run the write, or ``(None, record)`` with the completed
+    record to replay. Raises KeyInUse / KeyReused for conflicting retries.
+    """
+    now = timezone.now()
+    for _ in range(2):
+        existing = IdempotencyKey.objects.filter(key=key, scope=scope).first()
+        if existing is not None:
+            if existing.expires_at <= now:
+                existing.delete()
+            elif existing.request_hash != request_hash:
+                raise KeyReused(key)
+            elif existing.status_code is None:
+                if existing.lease_expires_at is not None and existing.lease_expires_at > now:
+                    raise KeyInUse(key)
+                record = _take_over(existing, now)
+                if record is None:
+                    raise KeyInUse(key)
+                return record, None
+            else:
+                return None, existing
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    key=key,
+                    scope=scope,
+                    request_hash=request_hash,
+                    lease_expires_at=now + _lease(),
+                    expires_at=now + _ttl()
+                )
+            return record, None
+        except IntegrityError:
+            # Lost the race against a concurrent request with the same key
+            continue
+    raise KeyInUse(key)
+
+
+def complete(record, status_code, content_type, body):
+    """Store the response for ``record``, or release the key for retryable outcomes."""
+    if status_code >= 500 or status_code in RETRYABLE_STATUSES:
+        abandon(record)
+        return
+    _owned(record).update(
+        status_code=status_code,
+        lease_expires_at=None,
+        content_type=content_type or '',
+        response_body=zlib.compress(body or b'')
+    )
+
+
+def _owned(record):
+    # No-op once another request has taken the key over
+    return IdempotencyKey.objects.filter(
+        pk=record.pk, status_code__isnull=True, lease_expires_at=record.lease_expires_at
+    )
+
+
+def abandon(record):
+    _owned(record).delete()
+
+
+def stored_body(record):
+    return zlib.decompress(bytes(record.response_body)) if record.response_body else b''
+
+
+def replay_response(record):
+    response = HttpResponse(
+        stored_body(record),
+        status=record.status_code,
+        content_type=record.content_type or None
+    )
+    response['Idempotent-Replayed'] = 'true'
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+def conflict_response(message, status):
+    response = JsonResponse({'success': False, 'message': message}, status=status)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+
+def purge_expired():
+    """Delete expired keys; returns the number of rows removed."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
+
+
+class IdempotencyMiddleware:
+    """
+    Makes write requests carrying an ``Idempotency-Key`` header safe to
+    retry: the first response is stored (compressed) and every replay with
+    the same key, path and user gets it back from a single indexed lookup
+    without the view running again. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        key = request.headers.get(HEADER)
+        if not key or request.method not in WRITE_METHODS:
+            return self.get_response(request)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return conflict_response(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters', 400)
+
+        try:
+            record, replay = begin(key, request_scope(request), request_fingerprint(request))
+        except KeyInUse:
+            return conflict_response('A request with this Idempotency-Key is still being processed', 409)
+        except KeyReused:
+            return conflict_response('This Idempotency-Key was already used with a different request body', 422)
+
+        if replay is not None:
+            return replay_response(replay)
+
+        try:
+            response = self.get_response(request)
+        except Exception:
+            abandon(record)
+            raise
+
+        if response.streaming:
+            abandon(record)
+        else:
+            complete(record, response.status_code, response.get('Content-Type'), response.content)
+        return response
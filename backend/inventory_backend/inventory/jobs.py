@@ -0,0 +1,203 @@
+# backend/inventory/jobs.py
+
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Avg, Count, F, Max, Q
+from django.utils import timezone
+
+from .models import Job
+
+_tasks = {}
+
+
+class PermanentError(Exception):
+    """Raised by a task whose input can never succeed; the job fails without retrying."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def task(name):
+    """Register a function as the handler for jobs called ``name``."""
+    def decorator(func):
+        _tasks[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    try:
+        return _tasks[name]
+    except KeyError:
+        raise LookupError(f'No task registered as {name!r}')
+
+
+def enqueue(name, payload=None, priority=0, delay=None, max_attempts=None):
+    """Queue a job for the workers and return it without waiting."""
+    get_task(name)
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        run_after=timezone.now() + (delay or timedelta()),
+        max_attempts=max_attempts or _setting('JOB_MAX_ATTEMPTS', 3),
+    )
+
+
+def worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, limit=1):
+    """
+    Atomically take up to ``limit`` ready jobs for ``worker``. Databases
+    with row locks use SELECT ... FOR UPDATE SKIP LOCKED so workers never
+    wait on each other; SQLite claims each candidate with a conditional
+    UPDATE, which only one worker can win.
+    """
+    now = timezone.now()
+    ready = (
+        Job.objects
+        .filter(status=Job.QUEUED, run_after__lte=now)
+        .order_by('-priority', 'run_after', 'pk')
+    )
+    claimed_fields = dict(
+        status=Job.RUNNING,
+        locked_by=worker,
+        locked_at=now,
+        started_at=now,
+        attempts=F('attempts') + 1,
+    )
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(ready.select_for_update(skip_locked=True).values_list('pk', flat=True)[:limit])
+            Job.objects.filter(pk__in=ids).update(**claimed_fields)
+    else:
+        ids = []
+        for pk in ready.values_list('pk', flat=True)[:limit * 2]:
+            if Job.objects.filter(pk=pk, status=Job.QUEUED).update(**claimed_fields):
+                ids.append(pk)
+                if len(ids) == limit:
+                    break
+
+    return list(Job.objects.filter(pk__in=ids).order_by('-priority', 'run_after', 'pk'))
+
+
+def requeue_stale(timeout=None):
+    """
+    Put back jobs whose worker died while running them. A job that has
+    used up its attempts is failed instead, so one that crashes every
+    worker running it is not handed out forever.
+    """
+    timeout = timeout or timedelta(seconds=_setting('JOB_LOCK_TIMEOUT_SECONDS', 600))
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING, locked_at__lt=now - timeout)
+    stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED,
+        finished_at=now,
+        last_error='Worker stopped while running the job; no attempts left',
+    )
+    return stale.update(status=Job.QUEUED, locked_by='', locked_at=None)
+
+
+def _retry_delay(attempts):
+    base = _setting('JOB_RETRY_BASE_SECONDS', 30)
+    return timedelta(seconds=base * 2 ** max(attempts - 1, 0))
+
+
+def run_job(job):
+    """
+    Run one claimed job and record its outcome and timing. Failures are
+    retried with exponential backoff until ``max_attempts`` is reached;
+    PermanentError fails the job at once. The outcome is only written
+    while this worker still holds the job: one requeued as stale and
+    claimed again is left to its new worker.
+    """
+    # The claim this run belongs to
+    lease = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+    started = time.monotonic()
+    try:
+        result = get_task(job.name)(**job.payload)
+    except Exception as exc:
+        duration_ms = int((time.monotonic() - started) * 1000)
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts and not isinstance(exc, PermanentError):
+            lease.update(
+                status=Job.QUEUED,
+                run_after=now + _retry_delay(job.attempts),
+                locked_by='',
+                locked_at=None,
+                last_error=error,
+                duration_ms=duration_ms,
+            )
+        else:
+            lease.update(
+                status=Job.FAILED,
+                finished_at=now,
+                last_error=error,
+                duration_ms=duration_ms,
+            )
+        return False
+
+    return bool(lease.update(
+        status=Job.SUCCEEDED,
+        result=result,
+        finished_at=timezone.now(),
+        duration_ms=int((time.monotonic() - started) * 1000),
+    ))
+
+
+def work(worker=None, once=False, poll_interval=1.0, batch_size=1, should_stop=None):
+    """
+    Worker loop: claim and run jobs until told to stop, or until the queue
+    is empty when ``once`` is set. Returns the number of jobs run.
+    """
+    worker = worker or worker_id()
+    processed = 0
+    last_stale_check = 0.0
+    while not (should_stop and should_stop()):
+        close_old_connections()
+        if time.monotonic() - last_stale_check > 60:
+            requeue_stale()
+            last_stale_check = time.monotonic()
+
+        jobs = claim(worker, batch_size)
+        for job in jobs:
+            run_job(job)
+            processed += 1
+
+        if not jobs:
+            if once:
+                break
+            time.sleep(poll_interval)
+    return processed
+
+
+def stats(since=None):
+    """Per-task counts and timings, for spotting slow or failing jobs."""
+    queryset = Job.objects.all()
+    if since is not None:
+        queryset = queryset.filter(created_at__gte=since)
+    return list(
+        queryset
+        .values('name')
+        .annotate(
+            total=Count('pk'),
+            queued=Count('pk', filter=Q(status=Job.QUEUED)),
+            running=Count('pk', filter=Q(status=Job.RUNNING)),
+            succeeded=Count('pk', filter=Q(status=Job.SUCCEEDED)),
+            failed=Count('pk', filter=Q(status=Job.FAILED)),
+            avg_duration_ms=Avg('duration_ms'),
+            max_duration_ms=Max('duration_ms'),
+        )
+        .order_by('name')
+    )
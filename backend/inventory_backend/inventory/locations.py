@@ -0,0 +1,127 @@
+# backend/inventory/locations.py
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import EXPIRING_SOON_DAYS, CostLedger, Inventory, Location, StockTransfer
+
+
+class TransferError(ValueError):
+    """The transfer cannot be made as requested."""
+
+
+def transfer(source_id, to_location, quantity, user=None, notes=''):
+    """
+    Move ``quantity`` units of one batch to ``to_location`` atomically.
+    The source is decremented with a guarded UPDATE, so concurrent
+    transfers or usage can never drive it negative. The units are merged
+    into a matching batch (same product, batch, supplier, expiry and cost)
+    already at the destination, or a new batch is created there.
+    """
+    if quantity <= 0:
+        raise TransferError('quantity must be positive')
+
+    with transaction.atomic():
+        source = Inventory.objects.select_for_update().get(pk=source_id)
+        if source.location_id == to_location.pk:
+            raise TransferError('Batch is already at that location')
+        if source.quarantined:
+            raise TransferError('Quarantined stock cannot be moved')
+
+        moved = Inventory.objects.filter(pk=source.pk, quantity__gte=quantity).update(
+            quantity=F('quantity') - quantity, version=F('version') + 1
+        )
+        if not moved:
+            raise TransferError(f'Only {source.quantity} units available')
+
+        destination = (
+            Inventory.objects
+            .select_for_update()
+            .filter(
+                product_id=source.product_id,
+                location=to_location,
+                batch_key=source.batch_key,
+                supplier_key=source.supplier_key,
+                expiry_date=source.expiry_date,
+                cost_price=source.cost_price,
+                quarantined=False,
+            )
+            .first()
+        )
+        if destination is not None:
+            Inventory.objects.filter(pk=destination.pk).update(
+                quantity=F('quantity') + quantity, version=F('version') + 1
+            )
+        else:
+            destination = Inventory.objects.create(
+                product_id=source.product_id,
+                quantity=quantity,
+                purchase_date=source.purchase_date,
+                expiry_date=source.expiry_date,
+                batch_number=source.batch_number,
+                supplier=source.supplier,
+                cost_price=source.cost_price,
+                is_expired=source.is_expired,
+                added_by_id=source.added_by_id,
+                location=to_location,
+            )
+
+        return StockTransfer.objects.create(
+            product_id=source.product_id,
+            from_location_id=source.location_id,
+            to_location=to_location,
+            source=source,
+            destination=destination,
+            quantity=quantity,
+            moved_by=user if user is not None and user.is_authenticated else None,
+            notes=notes,
+        )
+
+
+def location_summary():
+    """
+    Stock on hand, value and expiry counts for every location in one
+    grouped query over Inventory (batches without a location are reported
+    under ``location_id`` None). Stock is valued at its ledger's average
+    cost, like the snapshots and the valuation endpoint, so the locations
+    add up to the same total.
+    """
+    now = timezone.now()
+    soon = now + timedelta(days=EXPIRING_SOON_DAYS)
+    live = Q(quantity__gt=0)
+    money = DecimalField(max_digits=14, decimal_places=4)
+    # Same basis as costing.issue_many(): batch cost only for ledgers with no receipts
+    average_cost = CostLedger.objects.filter(
+        product_id=OuterRef('product_id'), supplier_key=OuterRef('supplier_key'), received_quantity__gt=0
+    ).values('average_cost')[:1]
+    unit_cost = Coalesce(Subquery(average_cost), F('cost_price'), output_field=money)
+    value = ExpressionWrapper(F('quantity') * unit_cost, output_field=money)
+    rows = (
+        Inventory.objects
+        .values('location_id')
+        .annotate(
+            batches=Count('pk', filter=live),
+            on_hand=Sum('quantity', filter=live),
+            stock_value=Sum(value, filter=live),
+            expiring_soon=Count('pk', filter=live & Q(is_expired=False, expiry_date__gte=now, expiry_date__lte=soon)),
+            expired=Count('pk', filter=live & (Q(is_expired=True) | Q(expiry_date__lt=now))),
+        )
+        .order_by('location_id')
+    )
+    names = dict(Location.objects.values_list('pk', 'name'))
+    return [
+        {
+            'location_id': row['location_id'],
+            'location_name': names.get(row['location_id'], 'Unassigned'),
+            'batches': row['batches'],
+            'on_hand': row['on_hand'] or 0,
+            'stock_value': row['stock_value'] or 0,
+            'expiring_soon': row['expiring_soon'],
+            'expired': row['expired'],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,16 @@
+# backend/inventory/log_handlers.py
+
+import logging.handlers
+import os
+
+
+class RotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotating file handler that creates the log directory when the file is
+    first opened, not when settings are imported. Use with ``delay=True``.
+    Kept free of model imports: it is loaded while logging is configured.
+    """
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from inventory import retention
+
+
+class Command(BaseCommand):
+    help = 'Move closed or long-expired batches and old usage logs into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Rows moved per transaction (default: RETENTION_BATCH_SIZE)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many rows would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            stale = retention.stale_stock().count()
+            self.stdout.write(
+                f"{retention.closed_batches().count() + stale} batches "
+                f"({stale} still holding stock, written off first) and "
+                f"{retention.old_usage_logs().count()} usage logs would be archived"
+            )
+            return
+
+        result = retention.run_retention(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result['batches_archived']} batches and "
+            f"{result['usage_logs_archived']} usage logs"
+        ))
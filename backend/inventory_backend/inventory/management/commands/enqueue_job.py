@@ -0,0 +1,22 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import jobs
+
+
+class Command(BaseCommand):
+    help = 'Queue a background job, e.g. from cron: enqueue_job inventory.expiry_sweep'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Registered task name')
+        parser.add_argument('--payload', default='{}', help='JSON keyword arguments for the task')
+        parser.add_argument('--priority', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            payload = json.loads(options['payload'])
+            job = jobs.enqueue(options['name'], payload, priority=options['priority'])
+        except (ValueError, LookupError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Queued {job}'))
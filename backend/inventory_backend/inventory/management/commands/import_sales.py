@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from inventory import sales
+
+
+class Command(BaseCommand):
+    help = 'Apply a POS sales CSV as ingredient usage through the recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Sales CSV with an item code column and a quantity column')
+        parser.add_argument('--user', default=None,
+                            help='Username the usage is recorded under (default: the first superuser)')
+        parser.add_argument('--location', type=int, default=None,
+                            help='Only take stock from this location id')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be used')
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f"Unknown user {options['user']!r}")
+        else:
+            user = User.objects.filter(is_superuser=True).order_by('pk').first()
+            if user is None:
+                raise CommandError('No superuser to record the usage under; pass --user')
+
+        location = Q(location_id=options['location']) if options['location'] else None
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+                result = sales.import_sales(
+                    lines, user, filename=options['path'], location=location, dry_run=options['dry_run']
+                )
+        except sales.SalesImportError as e:
+            raise CommandError(str(e))
+
+        verb = 'Would use' if options['dry_run'] else 'Used'
+        line = (
+            f"{verb} {result['units_used']} units from {result['usage_logs']} batches "
+            f"({result['value']:.2f} at cost) for {result['portions_sold']} portions in {result['lines']} lines"
+        )
+        self.stdout.write(line if options['dry_run'] else self.style.SUCCESS(line))
+        if result['unknown_items']:
+            self.stdout.write(self.style.WARNING(f"No recipe for: {', '.join(sorted(result['unknown_items']))}"))
+        if result['shortfall']:
+            self.stdout.write(self.style.WARNING(f"Not enough stock for products: {result['shortfall']}"))
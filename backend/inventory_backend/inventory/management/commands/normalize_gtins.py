@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from inventory import gtin_backfill
+
+
+class Command(BaseCommand):
+    help = 'Store the canonical GTIN-14 of every product and merge products that are the same GTIN'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows written per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be merged and updated')
+
+    def handle(self, *args, **options):
+        results = gtin_backfill.backfill_all(dry_run=options['dry_run'], batch_size=options['batch_size'])
+        verb = 'would be' if options['dry_run'] else 'were'
+        for label, result in results.items():
+            line = (
+                f"{label}: {result['merged']} duplicates in {result['duplicate_groups']} groups {verb} merged, "
+                f"{result['updated']} rows {verb} updated"
+            )
+            self.stdout.write(line if options['dry_run'] else self.style.SUCCESS(line))
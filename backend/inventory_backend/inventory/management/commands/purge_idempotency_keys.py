@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory import idempotency
+
+
+class Command(BaseCommand):
+    help = 'Delete stored Idempotency-Key responses that are past their TTL'
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Purged {deleted} expired idempotency keys'))
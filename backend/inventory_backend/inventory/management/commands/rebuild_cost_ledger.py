@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory import costing
+
+
+class Command(BaseCommand):
+    help = 'Recompute the weighted-average cost ledgers from the live batches and price history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-backfill', action='store_true',
+                            help='Do not create price history for batches that have none')
+
+    def handle(self, *args, **options):
+        result = costing.rebuild_ledgers(backfill_history=not options['no_backfill'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {result['ledgers']} ledgers "
+            f"({result['price_history_backfilled']} batches added to price history)"
+        ))
@@ -0,0 +1,71 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from inventory import jobs
+
+
+def _worker_main(index, once, poll_interval, batch_size, stop_event):
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        # Spawned (not forked) children start without Django configured
+        django.setup()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = f'{jobs.worker_id()}/{index}'
+    jobs.work(
+        worker=worker,
+        once=once,
+        poll_interval=poll_interval,
+        batch_size=batch_size,
+        should_stop=stop_event.is_set,
+    )
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1,
+                            help='Number of worker processes')
+        parser.add_argument('--once', action='store_true',
+                            help='Exit once the queue is empty')
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--batch-size', type=int, default=1,
+                            help='Jobs claimed per round trip')
+
+    def handle(self, *args, **options):
+        processes = max(options['processes'], 1)
+        if processes == 1:
+            processed = jobs.work(
+                once=options['once'],
+                poll_interval=options['poll_interval'],
+                batch_size=options['batch_size'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'Processed {processed} jobs'))
+            return
+
+        # Children must not share the parent's database connection
+        connections.close_all()
+        stop_event = multiprocessing.Event()
+        workers = [
+            multiprocessing.Process(
+                target=_worker_main,
+                args=(index, options['once'], options['poll_interval'], options['batch_size'], stop_event),
+            )
+            for index in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Started {processes} workers')
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping workers after their current job...')
+            stop_event.set()
+            for worker in workers:
+                worker.join()
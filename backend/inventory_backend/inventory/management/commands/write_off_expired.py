@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q, Sum
+
+from inventory import waste
+
+
+class Command(BaseCommand):
+    help = 'Write off the remaining stock of every expired batch and record it as waste'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--location', type=int, default=None,
+                            help='Only batches at this location id')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report what would be written off')
+
+    def handle(self, *args, **options):
+        location = Q(location_id=options['location']) if options['location'] else None
+        if options['dry_run']:
+            batches = waste.expired_stock(location)
+            self.stdout.write(
+                f"{batches.count()} batches ({batches.aggregate(units=Sum('quantity'))['units'] or 0} units) "
+                f"would be written off"
+            )
+            return
+
+        result = waste.write_off_expired(location=location)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote off {result['batches']} batches ({result['quantity']} units, {result['value']:.2f} at cost)"
+        ))
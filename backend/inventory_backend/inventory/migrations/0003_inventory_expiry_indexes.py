@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_productmaster_inventoryitem'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['expiry_date'], name='inventory_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['product', 'expiry_date'], name='inventory_product_expiry_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['supplier', 'expiry_date'], name='inventory_supplier_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:29
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedInventory',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('quantity', models.IntegerField()),
+                ('purchase_date', models.DateTimeField()),
+                ('expiry_date', models.DateTimeField()),
+                ('batch_number', models.CharField(blank=True, max_length=50)),
+                ('supplier', models.CharField(max_length=200)),
+                ('cost_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('is_expired', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Archived Inventory Items',
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedUsageLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('inventory_id', models.BigIntegerField(db_index=True)),
+                ('quantity_used', models.IntegerField()),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='usagelog',
+            index=models.Index(fields=['created_at'], name='usagelog_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedinventory',
+            name='added_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='archivedinventory',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_inventory', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='archivedusagelog',
+            name='product',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_usage_logs', to='inventory.product'),
+        ),
+        migrations.AddField(
+            model_name='archivedusagelog',
+            name='used_by',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='archivedinventory',
+            index=models.Index(fields=['product', 'expiry_date'], name='archived_inv_product_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedinventory',
+            index=models.Index(fields=['archived_at'], name='archived_inv_archived_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedusagelog',
+            index=models.Index(fields=['product', 'created_at'], name='archived_log_product_idx'),
+        ),
+    ]
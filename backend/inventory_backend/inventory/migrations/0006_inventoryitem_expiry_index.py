@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_archive_tables'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='inventoryitem',
+            index=models.Index(fields=['expiry_date'], name='inventoryitem_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _normalize(value):
+    return ''.join(ch for ch in (value or '').upper() if ch.isalnum())
+
+
+def fill_recall_keys(apps, schema_editor):
+    Inventory = apps.get_model('inventory', 'Inventory')
+    batch = []
+    for item in Inventory.objects.only('supplier', 'batch_number').iterator(chunk_size=2000):
+        item.supplier_key = _normalize(item.supplier)
+        item.batch_key = _normalize(item.batch_number)
+        batch.append(item)
+        if len(batch) >= 2000:
+            Inventory.objects.bulk_update(batch, ['supplier_key', 'batch_key'])
+            batch = []
+    if batch:
+        Inventory.objects.bulk_update(batch, ['supplier_key', 'batch_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='inventory',
+            name='inventory_supplier_expiry_idx',
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='batch_key',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='quarantined',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='inventory',
+            name='supplier_key',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.AddIndex(
+            model_name='inventory',
+            index=models.Index(fields=['supplier_key', 'batch_key'], name='inventory_recall_idx'),
+        ),
+        migrations.RunPython(fill_recall_keys, migrations.RunPython.noop),
+    ]
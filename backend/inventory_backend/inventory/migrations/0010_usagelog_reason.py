@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_requestprofile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedusagelog',
+            name='reason',
+            field=models.CharField(choices=[('usage', 'Usage'), ('stocktake', 'Stocktake adjustment')], default='usage', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='usagelog',
+            name='reason',
+            field=models.CharField(choices=[('usage', 'Usage'), ('stocktake', 'Stocktake adjustment')], default='usage', max_length=20),
+        ),
+    ]
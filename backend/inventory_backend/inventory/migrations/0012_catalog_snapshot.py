@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_locations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.BinaryField()),
+                ('digest', models.CharField(max_length=64)),
+                ('row_count', models.PositiveIntegerField()),
+                ('products_count', models.PositiveIntegerField()),
+                ('products_updated_at', models.DateTimeField(null=True)),
+                ('masters_count', models.PositiveIntegerField()),
+                ('masters_updated_at', models.DateTimeField(null=True)),
+                ('categories_digest', models.CharField(max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='productmaster',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='productmaster',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_catalog_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedusagelog',
+            name='cost_value',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='usagelog',
+            name='cost_value',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.CreateModel(
+            name='CostLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier', models.CharField(max_length=200)),
+                ('supplier_key', models.CharField(max_length=200)),
+                ('on_hand_quantity', models.IntegerField(default=0)),
+                ('on_hand_value', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('average_cost', models.DecimalField(decimal_places=4, default=0, max_digits=12)),
+                ('received_quantity', models.PositiveIntegerField(default=0)),
+                ('received_value', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('issued_quantity', models.IntegerField(default=0)),
+                ('issued_value', models.DecimalField(decimal_places=4, default=0, max_digits=14)),
+                ('last_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('last_received_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cost_ledgers', to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'supplier_key'), name='costledger_product_supplier_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier', models.CharField(max_length=200)),
+                ('supplier_key', models.CharField(max_length=200)),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('quantity', models.PositiveIntegerField()),
+                ('received_at', models.DateTimeField()),
+                ('inventory', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='price_record', to='inventory.inventory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='inventory.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Price history',
+                'indexes': [models.Index(fields=['product', 'supplier_key', 'received_at'], name='price_product_supplier_idx'), models.Index(fields=['supplier_key', 'received_at'], name='price_supplier_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_cost_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventory',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='inventoryitem',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
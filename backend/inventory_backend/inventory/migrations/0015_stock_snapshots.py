@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_row_versions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('products', models.PositiveIntegerField()),
+                ('quantity', models.IntegerField()),
+                ('value', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'category'], name='categorysnapshot_day_idx'), models.Index(fields=['category', 'day'], name='categorysnapshot_category_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('quantity', models.IntegerField()),
+                ('value', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.category')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'day'], name='stocksnapshot_product_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'product'), name='stocksnapshot_day_product_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 02:56
+
+from django.db import migrations, models
+
+
+def drop_catalog_snapshots(apps, schema_editor):
+    # Snapshots are keyed by raw code; the next request rebuilds one keyed by GTIN-14
+    apps.get_model('inventory', 'CatalogSnapshot').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_stock_snapshots'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='gtin14',
+            field=models.CharField(blank=True, editable=False, max_length=14, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='productmaster',
+            name='gtin14',
+            field=models.CharField(blank=True, editable=False, max_length=14, null=True, unique=True),
+        ),
+        migrations.RunPython(drop_catalog_snapshots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_gtin14'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('endpoint', models.CharField(max_length=200)),
+                ('fingerprint', models.CharField(max_length=16)),
+                ('sql', models.TextField()),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('slow_count', models.PositiveBigIntegerField(default=0)),
+                ('explain', models.TextField(blank=True)),
+                ('explained_at', models.DateTimeField(blank=True, null=True)),
+                ('first_seen', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('endpoint', 'fingerprint'), name='querystat_endpoint_fingerprint_uniq')],
+            },
+        ),
+    ]
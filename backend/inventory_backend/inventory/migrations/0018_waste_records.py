@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_query_stats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WasteRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('supplier', models.CharField(blank=True, max_length=200)),
+                ('supplier_key', models.CharField(blank=True, max_length=200)),
+                ('quantity', models.IntegerField()),
+                ('unit_cost', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('value', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('reason', models.CharField(choices=[('expired', 'Expired'), ('damaged', 'Damaged'), ('spoiled', 'Spoiled'), ('recalled', 'Recalled'), ('other', 'Other')], default='expired', max_length=20)),
+                ('expiry_date', models.DateTimeField(null=True)),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.category')),
+                ('inventory', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waste_records', to='inventory.inventory')),
+                ('location', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='inventory.location')),
+                ('product', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='waste_records', to='inventory.product')),
+                ('recorded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at'], name='waste_created_idx'), models.Index(fields=['category', 'created_at'], name='waste_category_idx'), models.Index(fields=['supplier_key', 'created_at'], name='waste_supplier_idx'), models.Index(fields=['product', 'created_at'], name='waste_product_idx')],
+            },
+        ),
+    ]
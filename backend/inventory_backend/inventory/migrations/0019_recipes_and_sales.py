@@ -0,0 +1,66 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_waste_records'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200, unique=True)),
+                ('pos_code', models.CharField(max_length=64, unique=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='archivedusagelog',
+            name='reason',
+            field=models.CharField(choices=[('usage', 'Usage'), ('stocktake', 'Stocktake adjustment'), ('sale', 'Sold (recipe ingredients)')], default='usage', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='usagelog',
+            name='reason',
+            field=models.CharField(choices=[('usage', 'Usage'), ('stocktake', 'Stocktake adjustment'), ('sale', 'Sold (recipe ingredients)')], default='usage', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='SalesImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(blank=True, max_length=255)),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('lines', models.PositiveIntegerField()),
+                ('portions_sold', models.DecimalField(decimal_places=3, max_digits=14)),
+                ('usage_logs', models.PositiveIntegerField()),
+                ('units_used', models.PositiveIntegerField()),
+                ('value', models.DecimalField(decimal_places=4, max_digits=14)),
+                ('unknown_items', models.JSONField(default=dict)),
+                ('shortfall', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('imported_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RecipeIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=3, max_digits=10)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.product')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ingredients', to='inventory.recipe')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('recipe', 'product'), name='recipeingredient_recipe_product_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:07
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Min, Sum
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    # Rows pointing at a duplicate move to the oldest category of that name
+    Category = apps.get_model('inventory', 'Category')
+    CategoryStockSnapshot = apps.get_model('inventory', 'CategoryStockSnapshot')
+    keep = {
+        row['name']: row['first']
+        for row in Category.objects.values('name').annotate(first=Min('pk'), count=models.Count('pk'))
+        .filter(count__gt=1)
+    }
+    if not keep:
+        return
+    duplicates = defaultdict(list)
+    for pk, name in Category.objects.filter(name__in=list(keep)).exclude(pk__in=keep.values()).values_list('pk', 'name'):
+        duplicates[keep[name]].append(pk)
+
+    for model_name in ('Product', 'StockSnapshot', 'CategoryStockSnapshot', 'WasteRecord'):
+        model = apps.get_model('inventory', model_name)
+        for first, others in duplicates.items():
+            model.objects.filter(category_id__in=others).update(category_id=first)
+
+    # Fold the per-day category totals that now share a (day, category)
+    for first in duplicates:
+        days = (
+            CategoryStockSnapshot.objects.filter(category_id=first).values('day')
+            .annotate(count=models.Count('pk')).filter(count__gt=1).values_list('day', flat=True)
+        )
+        for day in list(days):
+            rows = CategoryStockSnapshot.objects.filter(category_id=first, day=day)
+            totals = rows.aggregate(products=Sum('products'), quantity=Sum('quantity'), value=Sum('value'))
+            survivor = rows.order_by('pk').first()
+            rows.exclude(pk=survivor.pk).delete()
+            CategoryStockSnapshot.objects.filter(pk=survivor.pk).update(**totals)
+
+    Category.objects.filter(pk__in=[pk for others in duplicates.values() for pk in others]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0019_recipes_and_sales'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0020_merge_duplicate_categories'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='name',
+            field=models.CharField(max_length=100, unique=True),
+        ),
+    ]
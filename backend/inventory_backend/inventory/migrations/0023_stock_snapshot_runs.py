@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 03:20
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def record_existing_runs(apps, schema_editor):
+    CategoryStockSnapshot = apps.get_model('inventory', 'CategoryStockSnapshot')
+    StockSnapshotRun = apps.get_model('inventory', 'StockSnapshotRun')
+    StockSnapshotRun.objects.bulk_create([
+        StockSnapshotRun(day=row['day'], products=row['products'] or 0, categories=row['categories'])
+        for row in CategoryStockSnapshot.objects.values('day').annotate(
+            products=models.Sum('products'), categories=Count('pk')
+        ).order_by('day')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0022_idempotency_key_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshotRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('products', models.PositiveIntegerField(default=0)),
+                ('categories', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(record_existing_runs, migrations.RunPython.noop),
+    ]
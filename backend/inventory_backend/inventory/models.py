@@ -1,10 +1,19 @@
 # backend/inventory/models.py
 
+import uuid
+from datetime import datetime, time, timedelta
+
 from django.db import models
+from django.db.models.functions import TruncDate
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .gtin import normalize_gtin
+
+EXPIRING_SOON_DAYS = 7
 
 class Category(models.Model):
-    name = models.CharField(max_length=100)
+    name = models.CharField(max_length=100, unique=True)
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -24,10 +33,151 @@ class Product(models.Model):
     description = models.TextField(blank=True)
     image_url = models.URLField(blank=True)  # For Open Food Facts images
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped on save(); the catalog snapshot (inventory/catalog.py) diffs on it
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Canonical GTIN-14 of barcode (inventory/gtin.py); None for non-GTIN codes
+    gtin14 = models.CharField(max_length=14, unique=True, null=True, blank=True, editable=False)
     
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.gtin14 = normalize_gtin(self.barcode)
+        if kwargs.get('update_fields') is not None and 'barcode' in kwargs['update_fields']:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'gtin14'}
+        super().save(*args, **kwargs)
+
+class Location(models.Model):
+    STORE = 'store'
+    WALK_IN = 'walk_in'
+    FREEZER = 'freezer'
+    KITCHEN = 'kitchen'
+    KIND_CHOICES = [
+        (STORE, 'Central store'),
+        (WALK_IN, 'Walk-in'),
+        (FREEZER, 'Freezer'),
+        (KITCHEN, 'Kitchen'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default=STORE)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
+class DaysUntil(models.Func):
+    """
+    Whole days between ``today`` and the local calendar date of a datetime
+    column, computed by the database so it can be filtered and ordered on.
+    """
+    arity = 2
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(
+            TruncDate(expression),
+            models.Value(today, output_field=models.DateField()),
+            **extra
+        )
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL: date - date is already an integer number of days
+        return super().as_sql(
+            compiler, connection,
+            template='(%(expressions)s)', arg_joiner=' - ',
+            **extra_context
+        )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='DATEDIFF(%(expressions)s)', arg_joiner=', ',
+            **extra_context
+        )
+
+
+def normalize_key(value):
+    """
+    Lookup key for free-text identifiers such as supplier names and batch
+    numbers: upper-case alphanumerics only, so 'Acme Dairy Ltd.' and
+    'ACME DAIRY LTD' (or 'l-23/7' and 'L237') match.
+    """
+    return ''.join(ch for ch in (value or '').upper() if ch.isalnum())
+
+
+def _start_of_day(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class InventoryQuerySet(models.QuerySet):
+    STATUSES = ('expired', 'expiring_soon', 'good')
+
+    def with_expiry(self):
+        """
+        Annotate ``days_to_expiry`` and ``expiry_status`` so the same values
+        the serializer shows can be used in filter() and order_by().
+        """
+        today = timezone.localdate()
+        return self.annotate(
+            days_to_expiry=DaysUntil('expiry_date', today),
+        ).annotate(
+            expiry_status=models.Case(
+                models.When(is_expired=True, then=models.Value('expired')),
+                models.When(days_to_expiry__lt=0, then=models.Value('expired')),
+                models.When(
+                    days_to_expiry__gt=0,
+                    days_to_expiry__lte=EXPIRING_SOON_DAYS,
+                    then=models.Value('expiring_soon')
+                ),
+                default=models.Value('good'),
+                output_field=models.CharField(),
+            )
+        )
+
+    @staticmethod
+    def _expired_q(today):
+        return models.Q(is_expired=True) | models.Q(expiry_date__lt=_start_of_day(today))
+
+    def on_hand(self):
+        """Batches with usable stock left: not expired and not quarantined."""
+        return self.filter(quantity__gt=0, quarantined=False).exclude(self._expired_q(timezone.localdate()))
+
+    def with_status(self, status):
+        """
+        Filter by expiry status using ranges on ``expiry_date`` (instead of
+        the computed annotation) so the expiry indexes can be used.
+        """
+        today = timezone.localdate()
+        soon_start = _start_of_day(today + timedelta(days=1))
+        soon_end = _start_of_day(today + timedelta(days=EXPIRING_SOON_DAYS + 1))
+        expired = self._expired_q(today)
+        if status == 'expired':
+            return self.filter(expired)
+        if status == 'expiring_soon':
+            return self.filter(
+                is_expired=False,
+                expiry_date__gte=soon_start,
+                expiry_date__lt=soon_end
+            )
+        if status == 'good':
+            return self.exclude(expired).exclude(
+                expiry_date__gte=soon_start,
+                expiry_date__lt=soon_end
+            )
+        raise ValueError(f'Unknown status: {status}')
+
+
 class Inventory(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.IntegerField()
@@ -39,29 +189,70 @@ class Inventory(models.Model):
     is_expired = models.BooleanField(default=False)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Normalized copies of supplier / batch_number for recall lookups
+    supplier_key = models.CharField(max_length=200, blank=True, editable=False)
+    batch_key = models.CharField(max_length=50, blank=True, editable=False)
+    quarantined = models.BooleanField(default=False)
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True)
+    # Bumped on every write; the API's ETag/If-Match (see inventory/concurrency.py)
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = InventoryQuerySet.as_manager()
     
     class Meta:
         verbose_name_plural = "Inventory Items"
+        indexes = [
+            models.Index(fields=['expiry_date'], name='inventory_expiry_idx'),
+            models.Index(fields=['product', 'expiry_date'], name='inventory_product_expiry_idx'),
+            models.Index(fields=['supplier_key', 'batch_key'], name='inventory_recall_idx'),
+            models.Index(fields=['location', 'expiry_date'], name='inventory_location_expiry_idx'),
+            models.Index(fields=['location', 'product'], name='inventory_location_product_idx'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} - {self.quantity} units"
+
+    def fill_derived_fields(self):
+        """Recompute the lookup keys; returns their values for UPDATE statements."""
+        self.supplier_key = normalize_key(self.supplier)
+        self.batch_key = normalize_key(self.batch_number)
+        return {'supplier_key': self.supplier_key, 'batch_key': self.batch_key}
+
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+        if not self._state.adding:
+            self.version += 1
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'version'}
+            if 'supplier' in update_fields:
+                update_fields.add('supplier_key')
+            if 'batch_number' in update_fields:
+                update_fields.add('batch_key')
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
     
     @property
     def days_until_expiry(self):
-        from datetime import datetime
+        # Prefer the value annotated by InventoryQuerySet.with_expiry()
+        if 'days_to_expiry' in self.__dict__:
+            return self.days_to_expiry
         if self.expiry_date:
-            delta = self.expiry_date.date() - datetime.now().date()
+            delta = timezone.localdate(self.expiry_date) - timezone.localdate()
             return delta.days
         return None
     
     @property
     def is_expiring_soon(self):
         days = self.days_until_expiry
-        return days is not None and 0 < days <= 7
+        return days is not None and 0 < days <= EXPIRING_SOON_DAYS
     
     @property
     def status(self):
-        if self.is_expired:
+        if 'expiry_status' in self.__dict__:
+            return self.expiry_status
+        days = self.days_until_expiry
+        if self.is_expired or (days is not None and days < 0):
             return 'expired'
         elif self.is_expiring_soon:
             return 'expiring_soon'
@@ -69,14 +260,297 @@ class Inventory(models.Model):
             return 'good'
 
 class UsageLog(models.Model):
+    USAGE = 'usage'
+    STOCKTAKE = 'stocktake'
+    SALE = 'sale'
+    REASON_CHOICES = [
+        (USAGE, 'Usage'),
+        (STOCKTAKE, 'Stocktake adjustment'),
+        (SALE, 'Sold (recipe ingredients)'),
+    ]
+    # Reasons that count as real consumption (e.g. for forecasting)
+    CONSUMPTION_REASONS = (USAGE, SALE)
+
     inventory = models.ForeignKey(Inventory, on_delete=models.CASCADE)
     quantity_used = models.IntegerField()
     used_by = models.ForeignKey(User, on_delete=models.CASCADE)
     notes = models.TextField(blank=True)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default=USAGE)
+    # Weighted-average cost of the units at the time of use (inventory/costing.py)
+    cost_value = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='usagelog_created_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.inventory.product.name} - {self.quantity_used} used"
+
+
+class StockTransfer(models.Model):
+    """A quantity moved from one batch/location to another (see inventory/locations.py)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    from_location = models.ForeignKey(Location, on_delete=models.PROTECT, null=True, blank=True, related_name='transfers_out')
+    to_location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_in')
+    source = models.ForeignKey(Inventory, on_delete=models.SET_NULL, null=True, related_name='transfers_out')
+    destination = models.ForeignKey(Inventory, on_delete=models.SET_NULL, null=True, related_name='transfers_in')
+    quantity = models.PositiveIntegerField()
+    moved_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} -> {self.to_location_id}"
+
+
+class PriceHistory(models.Model):
+    """Unit cost of every receipt, for supplier price trends (see inventory/costing.py)."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    supplier = models.CharField(max_length=200)
+    supplier_key = models.CharField(max_length=200)
+    inventory = models.OneToOneField(Inventory, on_delete=models.SET_NULL, null=True, blank=True, related_name='price_record')
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    quantity = models.PositiveIntegerField()
+    received_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "Price history"
+        indexes = [
+            models.Index(fields=['product', 'supplier_key', 'received_at'], name='price_product_supplier_idx'),
+            models.Index(fields=['supplier_key', 'received_at'], name='price_supplier_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} from {self.supplier} @ {self.unit_cost}"
+
+
+class CostLedger(models.Model):
+    """
+    Running weighted-average cost of one product from one supplier, kept
+    up to date on every receipt and issue by inventory/costing.py so stock
+    valuation never has to scan batch history.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='cost_ledgers')
+    supplier = models.CharField(max_length=200)
+    supplier_key = models.CharField(max_length=200)
+    on_hand_quantity = models.IntegerField(default=0)
+    on_hand_value = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    average_cost = models.DecimalField(max_digits=12, decimal_places=4, default=0)
+    received_quantity = models.PositiveIntegerField(default=0)
+    received_value = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    issued_quantity = models.IntegerField(default=0)
+    issued_value = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    last_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    last_received_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'supplier_key'], name='costledger_product_supplier_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}/{self.supplier}: {self.on_hand_quantity} @ {self.average_cost}"
+
+
+class StockSnapshot(models.Model):
+    """
+    Stock on hand of one product at the end of one day, written in bulk by
+    the nightly snapshot job (see inventory/snapshots.py).
+    """
+    day = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    quantity = models.IntegerField()
+    value = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'product'], name='stocksnapshot_day_product_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['product', 'day'], name='stocksnapshot_product_idx'),
+        ]
+
+
+class StockSnapshotRun(models.Model):
+    """
+    One row per snapshot day, so a day on which nothing was in stock still
+    counts as taken (and reads as zero) instead of falling back a day.
+    """
+    day = models.DateField(unique=True)
+    products = models.PositiveIntegerField(default=0)
+    categories = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Stock snapshot {self.day}"
+
+
+class CategoryStockSnapshot(models.Model):
+    """Per-category totals of one day's StockSnapshot rows (category None = uncategorised)."""
+    day = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    products = models.PositiveIntegerField()
+    quantity = models.IntegerField()
+    value = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['day', 'category'], name='categorysnapshot_day_idx'),
+            models.Index(fields=['category', 'day'], name='categorysnapshot_category_idx'),
+        ]
+
+
+class WasteRecord(models.Model):
+    """
+    Stock written off (see inventory/waste.py). Product, category, supplier
+    and location are copied from the batch so the record outlives it and
+    the summary can group without joins.
+    """
+    EXPIRED = 'expired'
+    DAMAGED = 'damaged'
+    SPOILED = 'spoiled'
+    RECALLED = 'recalled'
+    OTHER = 'other'
+    REASON_CHOICES = [
+        (EXPIRED, 'Expired'),
+        (DAMAGED, 'Damaged'),
+        (SPOILED, 'Spoiled'),
+        (RECALLED, 'Recalled'),
+        (OTHER, 'Other'),
+    ]
+
+    inventory = models.ForeignKey(Inventory, on_delete=models.SET_NULL, null=True, related_name='waste_records')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='waste_records')
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='+')
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, related_name='+')
+    supplier = models.CharField(max_length=200, blank=True)
+    supplier_key = models.CharField(max_length=200, blank=True)
+    quantity = models.IntegerField()
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2)   # the batch's cost price
+    # Value at the ledger's weighted-average cost (inventory/costing.py)
+    value = models.DecimalField(max_digits=14, decimal_places=4)
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, default=EXPIRED)
+    expiry_date = models.DateTimeField(null=True)
+    recorded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    notes = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at'], name='waste_created_idx'),
+            models.Index(fields=['category', 'created_at'], name='waste_category_idx'),
+            models.Index(fields=['supplier_key', 'created_at'], name='waste_supplier_idx'),
+            models.Index(fields=['product', 'created_at'], name='waste_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} ({self.reason})"
+
+
+class Recipe(models.Model):
+    """A menu item as the POS sells it, and the ingredients one portion uses."""
+    name = models.CharField(max_length=200, unique=True)
+    pos_code = models.CharField(max_length=64, unique=True)   # item code in POS sales exports
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.pos_code})"
+
+
+class RecipeIngredient(models.Model):
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE, related_name='ingredients')
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name='+')
+    quantity = models.DecimalField(max_digits=10, decimal_places=3)   # stock units per portion
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['recipe', 'product'], name='recipeingredient_recipe_product_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} in {self.recipe_id}"
+
+
+class SalesImport(models.Model):
+    """
+    One POS sales file applied as ingredient usage (see inventory/sales.py).
+    The digest stops the same file from being applied twice.
+    """
+    filename = models.CharField(max_length=255, blank=True)
+    digest = models.CharField(max_length=64, unique=True)
+    lines = models.PositiveIntegerField()
+    portions_sold = models.DecimalField(max_digits=14, decimal_places=3)
+    usage_logs = models.PositiveIntegerField()
+    units_used = models.PositiveIntegerField()
+    value = models.DecimalField(max_digits=14, decimal_places=4)
+    unknown_items = models.JSONField(default=dict)     # {pos code: portions} with no recipe
+    shortfall = models.JSONField(default=dict)         # {product id: units} not in stock
+    imported_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.filename or 'sales'} #{self.pk}"
+
+
+class ArchivedInventory(models.Model):
+    """
+    Closed or long-expired batches moved out of Inventory by the retention
+    job (see inventory/retention.py). Keeps the original primary key.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='archived_inventory')
+    quantity = models.IntegerField()
+    purchase_date = models.DateTimeField()
+    expiry_date = models.DateTimeField()
+    batch_number = models.CharField(max_length=50, blank=True)
+    supplier = models.CharField(max_length=200)
+    cost_price = models.DecimalField(max_digits=10, decimal_places=2)
+    is_expired = models.BooleanField(default=False)
+    added_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    location = models.ForeignKey(Location, on_delete=models.SET_NULL, null=True, related_name='+')
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name_plural = "Archived Inventory Items"
+        indexes = [
+            models.Index(fields=['product', 'expiry_date'], name='archived_inv_product_idx'),
+            models.Index(fields=['archived_at'], name='archived_inv_archived_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived batch #{self.pk} - {self.quantity} units"
+
+
+class ArchivedUsageLog(models.Model):
+    """
+    UsageLog rows moved out by the retention job. ``inventory_id`` may point
+    at a live Inventory row or an ArchivedInventory row.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    inventory_id = models.BigIntegerField(db_index=True)
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, related_name='archived_usage_logs')
+    quantity_used = models.IntegerField()
+    used_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    notes = models.TextField(blank=True)
+    reason = models.CharField(max_length=20, choices=UsageLog.REASON_CHOICES, default=UsageLog.USAGE)
+    cost_value = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='archived_log_product_idx'),
+        ]
+
+    def __str__(self):
+        return f"Archived usage #{self.pk} - {self.quantity_used} used"
     
 
     from django.db import models
@@ -85,10 +559,19 @@ class ProductMaster(models.Model):
     gtin = models.CharField(max_length=32, unique=True)          # barcode
     name = models.CharField(max_length=200)
     shelf_life_days = models.PositiveIntegerField()              # e.g. 7 days
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    gtin14 = models.CharField(max_length=14, unique=True, null=True, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.gtin} – {self.name}"
 
+    def save(self, *args, **kwargs):
+        self.gtin14 = normalize_gtin(self.gtin)
+        if kwargs.get('update_fields') is not None and 'gtin' in kwargs['update_fields']:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'gtin14'}
+        super().save(*args, **kwargs)
+
 class InventoryItem(models.Model):
     product = models.ForeignKey(ProductMaster, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
@@ -97,8 +580,164 @@ class InventoryItem(models.Model):
     supplier = models.CharField(max_length=200, blank=True)
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)
     batch_number = models.CharField(max_length=100, blank=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['expiry_date'], name='inventoryitem_expiry_idx'),
+        ]
+
     def __str__(self):
         return f"{self.product.name} ({self.quantity})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | {'version'}
+        super().save(*args, **kwargs)
+
+
+class IdempotencyKey(models.Model):
+    """
+    Stored outcome of a write request sent with an ``Idempotency-Key``
+    header, so client retries replay the first response instead of
+    running the write again. ``status_code`` is null while the first
+    request is still in flight; once ``lease_expires_at`` passes, the
+    request is presumed dead and a retry may take the key over.
+    """
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=255)             # "METHOD /path/ user"
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    response_body = models.BinaryField(blank=True)       # zlib-compressed
+    created_at = models.DateTimeField(auto_now_add=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'scope'], name='unique_idempotency_key_scope'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+
+
+class Job(models.Model):
+    """
+    A unit of background work run by `manage.py run_jobs` workers (see
+    inventory/jobs.py), so slow tasks stay off the request path.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)       # higher runs first
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    duration_ms = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_claim_idx'),
+            models.Index(fields=['name', 'status'], name='job_name_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class RequestProfile(models.Model):
+    """
+    cProfile and SQL report for one request made in staff profiling mode
+    (see inventory/profiling.py).
+    """
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    duration_ms = models.FloatField()
+    query_count = models.PositiveIntegerField()
+    query_time_ms = models.FloatField()
+    report = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
+
+
+class QueryStat(models.Model):
+    """
+    Running totals for one SQL fingerprint under one endpoint, flushed
+    from each process by QueryLogMiddleware (see inventory/querylog.py).
+    """
+    endpoint = models.CharField(max_length=200)
+    fingerprint = models.CharField(max_length=16)
+    sql = models.TextField()                 # normalized statement
+    count = models.PositiveBigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    slow_count = models.PositiveBigIntegerField(default=0)
+    explain = models.TextField(blank=True)   # plan of the last slow run
+    explained_at = models.DateTimeField(null=True, blank=True)
+    first_seen = models.DateTimeField(auto_now_add=True)
+    last_seen = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['endpoint', 'fingerprint'], name='querystat_endpoint_fingerprint_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.endpoint} {self.fingerprint} ({self.count}x, max {self.max_ms:.0f} ms)"
+
+
+class CatalogSnapshot(models.Model):
+    """
+    One version of the compressed product catalog served to devices for
+    offline barcode lookups (see inventory/catalog.py). The watermark
+    fields record the catalog state it was built from.
+    """
+    payload = models.BinaryField()          # gzip-compressed columnar JSON
+    digest = models.CharField(max_length=64)
+    row_count = models.PositiveIntegerField()
+    products_count = models.PositiveIntegerField()
+    products_updated_at = models.DateTimeField(null=True)
+    masters_count = models.PositiveIntegerField()
+    masters_updated_at = models.DateTimeField(null=True)
+    categories_digest = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def version(self):
+        return self.pk
+
+    @property
+    def etag(self):
+        return f'"catalog-{self.pk}-{self.digest[:16]}"'
+
+    def __str__(self):
+        return f"Catalog v{self.pk} ({self.row_count} products)"
@@ -0,0 +1,145 @@
+# backend/inventory/profiling.py
+
+import cProfile
+import json
+import pstats
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+from django.http import JsonResponse
+
+from .models import RequestProfile
+
+QUERY_PARAM = '_profile'
+HEADER = 'HTTP_X_PROFILE'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueryCollector:
+    """connection.execute_wrapper that records every statement with its timing."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'sql': sql,
+                'params': repr(params)[:500],
+                'many': many,
+                'time_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
+
+
+def _top_functions(profiler, limit):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            'function': f'{filename}:{line}({func})',
+            'calls': calls,
+            'total_ms': round(total * 1000, 3),
+            'cumulative_ms': round(cumulative * 1000, 3),
+        })
+    rows.sort(key=lambda row: row['cumulative_ms'], reverse=True)
+    return rows[:limit]
+
+
+def _query_analysis(queries, n_plus_one_threshold):
+    """
+    Exact repeats (same SQL and parameters) are duplicates; the same SQL
+    run many times with different parameters is an N+1 suspect.
+    """
+    exact = Counter((query['sql'], query['params']) for query in queries)
+    by_sql = defaultdict(lambda: {'count': 0, 'time_ms': 0.0})
+    for query in queries:
+        by_sql[query['sql']]['count'] += 1
+        by_sql[query['sql']]['time_ms'] += query['time_ms']
+
+    duplicates = [
+        {'sql': sql, 'params': params, 'count': count}
+        for (sql, params), count in exact.items() if count > 1
+    ]
+    suspects = [
+        {'sql': sql, 'count': info['count'], 'time_ms': round(info['time_ms'], 3)}
+        for sql, info in by_sql.items() if info['count'] >= n_plus_one_threshold
+    ]
+    duplicates.sort(key=lambda item: item['count'], reverse=True)
+    suspects.sort(key=lambda item: item['count'], reverse=True)
+    return duplicates, suspects
+
+
+def build_report(profiler, queries):
+    duplicates, suspects = _query_analysis(queries, _setting('PROFILING_N_PLUS_ONE_THRESHOLD', 5))
+    return {
+        'top_functions': _top_functions(profiler, _setting('PROFILING_TOP_FUNCTIONS', 40)),
+        'queries': queries,
+        'duplicate_queries': duplicates,
+        'n_plus_one_suspects': suspects,
+    }
+
+
+class ProfilingMiddleware:
+    """
+    Staff-only profiling mode: a request with ?_profile=1 (or ?_profile=inline)
+    or an ``X-Profile: 1`` header runs under cProfile with every SQL
+    statement captured. The report is stored as a RequestProfile whose id
+    comes back in ``X-Profile-Id``; ``inline`` returns the report instead
+    of the normal response. Other requests pay for a substring check and
+    a header lookup only. Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if QUERY_PARAM not in request.META.get('QUERY_STRING', '') and HEADER not in request.META:
+            return self.get_response(request)
+
+        mode = request.GET.get(QUERY_PARAM) or request.META.get(HEADER)
+        user = getattr(request, 'user', None)
+        if mode not in ('1', 'true', 'inline') or not (user and user.is_authenticated and user.is_staff):
+            return self.get_response(request)
+
+        collector = QueryCollector()
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        with connection.execute_wrapper(collector):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        report = build_report(profiler, collector.queries)
+        profile = RequestProfile.objects.create(
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            user=user,
+            duration_ms=round(duration_ms, 3),
+            query_count=len(collector.queries),
+            query_time_ms=round(sum(query['time_ms'] for query in collector.queries), 3),
+            report=json.loads(json.dumps(report, default=str)),
+        )
+
+        if mode == 'inline':
+            response = JsonResponse({
+                'id': str(profile.pk),
+                'status_code': profile.status_code,
+                'duration_ms': profile.duration_ms,
+                'query_count': profile.query_count,
+                'query_time_ms': profile.query_time_ms,
+                **profile.report,
+            })
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
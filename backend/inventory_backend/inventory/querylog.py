@@ -0,0 +1,257 @@
+# backend/inventory/querylog.py
+
+import hashlib
+import json
+import logging
+import random
+import re
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, NotSupportedError, connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import QueryStat
+
+logger = logging.getLogger('inventory.querylog')
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'(?<![\w"$.])-?\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s')
+IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+VALUES_ROWS = re.compile(r'(\([?,+ ]+\))(?:\s*,\s*\1)+')
+WHITESPACE = re.compile(r'\s+')
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    (fingerprint, normalized SQL): literals and placeholders become ``?``
+    and IN lists and multi-row VALUES collapse, so the same statement
+    with different values or list lengths shares one fingerprint.
+    """
+    normalized = STRING.sub('?', sql)
+    normalized = PLACEHOLDER.sub('?', normalized)
+    normalized = NUMBER.sub('?', normalized)
+    normalized = WHITESPACE.sub(' ', normalized).strip()
+    normalized = IN_LIST.sub('(?+)', normalized)
+    normalized = VALUES_ROWS.sub(r'\1, ...', normalized)
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16], normalized
+
+
+def explain(sql, params):
+    """The plan of a SELECT, from EXPLAIN (EXPLAIN QUERY PLAN on SQLite)."""
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except (DatabaseError, NotSupportedError) as exc:
+        return f'EXPLAIN failed: {exc}'
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(str(row[-1]) for row in rows)
+    return '\n'.join(str(row[0]) if len(row) == 1 else ' | '.join(map(str, row)) for row in rows)
+
+
+def _explainable(sql, many):
+    return not many and sql.lstrip()[:6].upper() in ('SELECT', 'WITH')
+
+
+class StatementCollector:
+    """connection.execute_wrapper that totals statement timings per fingerprint for one request."""
+
+    def __init__(self, slow_ms):
+        self.slow_ms = slow_ms
+        self.stats = {}
+        self.slowest = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            key, normalized = fingerprint(sql)
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = {'sql': normalized, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0}
+            entry['count'] += 1
+            entry['total_ms'] += elapsed
+            entry['max_ms'] = max(entry['max_ms'], elapsed)
+            if elapsed >= self.slow_ms:
+                entry['slow'] += 1
+                if key not in self.slowest or elapsed > self.slowest[key][2]:
+                    self.slowest[key] = (sql, params, elapsed, many)
+
+
+class QueryLog:
+    """
+    Per-process totals per (endpoint, fingerprint). Requests only add to
+    the in-memory totals; a background thread started on first use runs
+    the due EXPLAINs and writes the totals to QueryStat every
+    QUERYLOG_FLUSH_SECONDS. Slow SELECTs are explained at most once per
+    QUERYLOG_EXPLAIN_INTERVAL_SECONDS for each endpoint and fingerprint.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.explained = {}
+        self.to_explain = {}
+        self.worker = None
+
+    def record(self, endpoint, collector):
+        interval = _setting('QUERYLOG_EXPLAIN_INTERVAL_SECONDS', 3600)
+        now = time.monotonic()
+        with self.lock:
+            for key, stats in collector.stats.items():
+                entry = self.pending.get((endpoint, key))
+                if entry is None:
+                    entry = self.pending[(endpoint, key)] = {
+                        'sql': stats['sql'], 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'slow': 0, 'explain': None,
+                    }
+                entry['count'] += stats['count']
+                entry['total_ms'] += stats['total_ms']
+                entry['max_ms'] = max(entry['max_ms'], stats['max_ms'])
+                entry['slow'] += stats['slow']
+            for key, (sql, params, elapsed, many) in collector.slowest.items():
+                if _explainable(sql, many) and now - self.explained.get((endpoint, key), -interval) >= interval:
+                    self.explained[(endpoint, key)] = now
+                    self.to_explain[(endpoint, key)] = (sql, params)
+
+        for key, (sql, params, elapsed, many) in collector.slowest.items():
+            logger.warning(json.dumps({
+                'event': 'slow_query',
+                'endpoint': endpoint,
+                'fingerprint': key,
+                'time_ms': round(elapsed, 3),
+                'sql': sql[:_setting('QUERYLOG_MAX_SQL_CHARS', 4000)],
+            }))
+        self._start_worker()
+
+    def _start_worker(self):
+        # Started lazily so that each forked server process gets its own
+        if self.worker is None or not self.worker.is_alive():
+            with self.lock:
+                if self.worker is None or not self.worker.is_alive():
+                    self.worker = threading.Thread(target=self._run, name='querylog-flush', daemon=True)
+                    self.worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(_setting('QUERYLOG_FLUSH_SECONDS', 60))
+            try:
+                self.explain_pending()
+                self.flush()
+            except Exception:
+                logger.exception('Query log flush failed')
+            finally:
+                # This thread's own connection; never left open between flushes
+                connection.close()
+
+    def explain_pending(self):
+        """Run the EXPLAINs queued by record(); returns how many ran."""
+        with self.lock:
+            to_explain, self.to_explain = self.to_explain, {}
+        for (endpoint, key), (sql, params) in to_explain.items():
+            plan = explain(sql, params)
+            with self.lock:
+                entry = self.pending.get((endpoint, key))
+                if entry is not None:
+                    entry['explain'] = plan
+                else:
+                    # Totals were flushed meanwhile (a reset); explain it again next time
+                    self.explained.pop((endpoint, key), None)
+            logger.info(json.dumps({'event': 'query_plan', 'endpoint': endpoint, 'fingerprint': key, 'explain': plan}))
+        return len(to_explain)
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return 0
+
+        now = timezone.now()
+        max_chars = _setting('QUERYLOG_MAX_SQL_CHARS', 4000)
+        try:
+            with transaction.atomic():
+                QueryStat.objects.bulk_create(
+                    [
+                        QueryStat(endpoint=endpoint, fingerprint=key, sql=entry['sql'][:max_chars], last_seen=now)
+                        for (endpoint, key), entry in pending.items()
+                    ],
+                    ignore_conflicts=True
+                )
+                for (endpoint, key), entry in pending.items():
+                    changes = {
+                        'count': F('count') + entry['count'],
+                        'total_ms': F('total_ms') + entry['total_ms'],
+                        'max_ms': Greatest('max_ms', Value(entry['max_ms'])),
+                        'slow_count': F('slow_count') + entry['slow'],
+                        'last_seen': now,
+                    }
+                    if entry['explain'] is not None:
+                        changes.update(explain=entry['explain'], explained_at=now)
+                    QueryStat.objects.filter(endpoint=endpoint, fingerprint=key).update(**changes)
+        except DatabaseError:
+            logger.exception('Could not write query stats; %d entries dropped', len(pending))
+            return 0
+
+        for (endpoint, key), entry in pending.items():
+            logger.info(json.dumps({
+                'event': 'query_stats',
+                'endpoint': endpoint,
+                'fingerprint': key,
+                'count': entry['count'],
+                'total_ms': round(entry['total_ms'], 3),
+                'max_ms': round(entry['max_ms'], 3),
+                'slow': entry['slow'],
+            }))
+        return len(pending)
+
+
+query_log = QueryLog()
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match and match.view_name else 'unresolved'
+    return f'{request.method} {name}'[:200]
+
+
+class QueryLogMiddleware:
+    """
+    Times every SQL statement of every request through a connection
+    execute wrapper and adds it to the totals for its endpoint (URL name)
+    and fingerprint. Statements slower than QUERYLOG_SLOW_MS go to the
+    ``inventory.querylog`` logger; their plans are taken later by the
+    flush thread. Totals are written to QueryStat (staff report at
+    /api/sql-stats/) off the request path, so up to one interval of data
+    is lost when a process stops. Only a QUERYLOG_SAMPLE_RATE share of
+    requests is timed, so counts are of the sampled requests.
+    """
+
+    def __init__(self, get_response):
+        if not _setting('QUERYLOG_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= _setting('QUERYLOG_SAMPLE_RATE', 1.0):
+            return self.get_response(request)
+        collector = StatementCollector(_setting('QUERYLOG_SLOW_MS', 100))
+        with connection.execute_wrapper(collector):
+            response = self.get_response(request)
+        if collector.stats:
+            query_log.record(endpoint_name(request), collector)
+        return response
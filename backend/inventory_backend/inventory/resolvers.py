@@ -0,0 +1,178 @@
+# backend/inventory/resolvers.py
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models.signals import post_delete, post_save
+
+from .gtin import code_filter, normalize_gtin
+from .models import Category, Product
+
+SYSTEM_USERNAME = 'system'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class ResolverCache:
+    """
+    Small process-local LRU of reference-data ids. Entries expire after
+    RESOLVER_CACHE_TTL_SECONDS, which bounds how long a change made by
+    another process can go unnoticed; changes made in this process clear
+    the affected entries through signals straight away.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        ttl = _setting('RESOLVER_CACHE_TTL_SECONDS', 300)
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > _setting('RESOLVER_CACHE_SIZE', 10000):
+                self.entries.popitem(last=False)
+
+    def discard_value(self, kind, value):
+        with self.lock:
+            for key in [key for key, (cached, _) in self.entries.items() if key[0] == kind and cached == value]:
+                del self.entries[key]
+
+    def clear(self, kind=None):
+        with self.lock:
+            if kind is None:
+                self.entries.clear()
+            else:
+                for key in [key for key in self.entries if key[0] == kind]:
+                    del self.entries[key]
+
+
+cache = ResolverCache()
+
+
+def _remember(key, pk):
+    # Only once committed, so a rolled-back create is never served from the cache
+    transaction.on_commit(lambda: cache.put(key, pk))
+
+
+def product_key(barcode):
+    """Cache key for a scanned code: its GTIN-14, or the code as sent."""
+    barcode = str(barcode).strip()
+    return normalize_gtin(barcode) or barcode
+
+
+def category_id(name):
+    """Id of the category called ``name``, created on first use."""
+    pk = cache.get(('category', name))
+    if pk is None:
+        category, _ = Category.objects.get_or_create(
+            name=name,
+            defaults={'description': f'Auto-created category: {name}'}
+        )
+        pk = category.pk
+        _remember(('category', name), pk)
+    return pk
+
+
+def product_id(product_data):
+    """
+    Id of the product with this barcode (any UPC/EAN/padded form of it),
+    created from ``product_data`` if there is none. A concurrent create
+    of the same product loses on the unique barcode/GTIN and reads the
+    winner's row instead.
+    """
+    key = ('product', product_key(product_data['barcode']))
+    pk = cache.get(key)
+    if pk is not None:
+        return pk
+
+    lookup = code_filter(product_data['barcode'], 'barcode')
+    pk = Product.objects.filter(lookup).order_by('pk').values_list('pk', flat=True).first()
+    if pk is None:
+        try:
+            with transaction.atomic():
+                pk = Product.objects.create(
+                    barcode=product_data['barcode'],
+                    name=product_data['name'],
+                    category_id=category_id(product_data.get('category', 'Food & Beverages')),
+                    brand=product_data.get('brand', ''),
+                    unit_price=product_data['unit_price'],
+                    description=product_data.get('description', ''),
+                    image_url=product_data.get('image_url', ''),
+                ).pk
+        except IntegrityError:
+            pk = Product.objects.filter(lookup).order_by('pk').values_list('pk', flat=True).first()
+            if pk is None:
+                raise
+    _remember(key, pk)
+    return pk
+
+
+def system_user_id():
+    """
+    User recorded for writes with no signed-in user: the first superuser,
+    else a ``system`` account with no usable password.
+    """
+    pk = cache.get(('user', SYSTEM_USERNAME))
+    if pk is None:
+        pk = User.objects.filter(is_superuser=True).order_by('pk').values_list('pk', flat=True).first()
+        if pk is None:
+            user, created = User.objects.get_or_create(
+                username=SYSTEM_USERNAME,
+                defaults={'email': 'system@cheftrack.com', 'is_active': False}
+            )
+            if created:
+                user.set_unusable_password()
+                user.save(update_fields=['password'])
+            pk = user.pk
+        _remember(('user', SYSTEM_USERNAME), pk)
+    return pk
+
+
+def _category_changed(sender, instance, **kwargs):
+    # A rename leaves the old name cached under the same id
+    cache.discard_value('category', instance.pk)
+
+
+def _product_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        cache.discard_value('product', instance.pk)
+
+
+def _user_saved(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; the resolved id changes only with superuser status
+    if update_fields is not None and 'is_superuser' not in update_fields:
+        return
+    if instance.is_superuser or instance.pk == cache.get(('user', SYSTEM_USERNAME)):
+        cache.clear('user')
+
+
+def _user_deleted(sender, instance, **kwargs):
+    cache.discard_value('user', instance.pk)
+
+
+def connect_signals():
+    post_save.connect(_category_changed, sender=Category, dispatch_uid='resolvers.category_saved')
+    post_delete.connect(_category_changed, sender=Category, dispatch_uid='resolvers.category_deleted')
+    post_save.connect(_product_changed, sender=Product, dispatch_uid='resolvers.product_saved')
+    post_delete.connect(_product_changed, sender=Product, dispatch_uid='resolvers.product_deleted')
+    post_save.connect(_user_saved, sender=User, dispatch_uid='resolvers.user_saved')
+    post_delete.connect(_user_deleted, sender=User, dispatch_uid='resolvers.user_deleted')
@@ -0,0 +1,119 @@
+# backend/inventory/retention.py
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import waste
+from .models import ArchivedInventory, ArchivedUsageLog, Inventory, UsageLog, WasteRecord
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _copy_fields(archive_model, source_model):
+    """Attribute names the archive table shares with its live table."""
+    source = {field.attname for field in source_model._meta.concrete_fields}
+    return [
+        field.attname for field in archive_model._meta.concrete_fields
+        if field.attname in source and field.name != 'archived_at'
+    ]
+
+
+def _expired_cutoff(now):
+    return now - timedelta(days=_setting('INVENTORY_EXPIRED_RETENTION_DAYS', 90))
+
+
+def closed_batches(now=None):
+    """
+    Batches the live table no longer needs: used up and older than
+    INVENTORY_CLOSED_RETENTION_DAYS, or used up and expired more than
+    INVENTORY_EXPIRED_RETENTION_DAYS ago. Batches with stock left are
+    never archived; see stale_stock().
+    """
+    now = now or timezone.now()
+    closed_cutoff = now - timedelta(days=_setting('INVENTORY_CLOSED_RETENTION_DAYS', 30))
+    return Inventory.objects.filter(quantity__lte=0).filter(
+        Q(created_at__lt=closed_cutoff) | Q(expiry_date__lt=_expired_cutoff(now))
+    )
+
+
+def stale_stock(now=None):
+    """Batches expired more than INVENTORY_EXPIRED_RETENTION_DAYS ago that still hold stock."""
+    now = now or timezone.now()
+    return Inventory.objects.filter(quantity__gt=0, expiry_date__lt=_expired_cutoff(now))
+
+
+def old_usage_logs(now=None):
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=_setting('USAGE_LOG_RETENTION_DAYS', 365))
+    return UsageLog.objects.filter(created_at__lt=cutoff)
+
+
+def _archive_usage_logs(logs):
+    fields = _copy_fields(ArchivedUsageLog, UsageLog)
+    rows = logs.annotate(product_id=F('inventory__product_id')).values(*fields, 'product_id')
+    ArchivedUsageLog.objects.bulk_create(
+        [ArchivedUsageLog(**row) for row in rows],
+        ignore_conflicts=True
+    )
+
+
+def archive_closed_batches(batch_size=None, now=None):
+    """
+    Move closed batches (and all of their usage logs) into the archive
+    tables, one bounded transaction per chunk. Long-expired batches that
+    still hold stock are written off first, so the loss reaches the waste
+    ledger and the cost ledgers before the batch leaves the live table.
+    Returns the number of batches archived.
+    """
+    batch_size = batch_size or _setting('RETENTION_BATCH_SIZE', 500)
+    waste.write_off(stale_stock(now), reason=WasteRecord.EXPIRED, notes='Written off before archiving')
+    queryset = closed_batches(now).order_by('pk')
+    fields = _copy_fields(ArchivedInventory, Inventory)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            _archive_usage_logs(UsageLog.objects.filter(inventory_id__in=ids))
+            ArchivedInventory.objects.bulk_create(
+                [ArchivedInventory(**row) for row in Inventory.objects.filter(pk__in=ids).values(*fields)],
+                ignore_conflicts=True
+            )
+            UsageLog.objects.filter(inventory_id__in=ids).delete()
+            Inventory.objects.filter(pk__in=ids).delete()
+        archived += len(ids)
+    return archived
+
+
+def archive_usage_logs(batch_size=None, now=None):
+    """
+    Move usage logs older than USAGE_LOG_RETENTION_DAYS into the archive in
+    bounded chunks. Returns the number of logs archived.
+    """
+    batch_size = batch_size or _setting('RETENTION_BATCH_SIZE', 500)
+    queryset = old_usage_logs(now).order_by('pk')
+    archived = 0
+    while True:
+        with transaction.atomic():
+            ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            _archive_usage_logs(UsageLog.objects.filter(pk__in=ids))
+            UsageLog.objects.filter(pk__in=ids).delete()
+        archived += len(ids)
+    return archived
+
+
+def run_retention(batch_size=None, now=None):
+    now = now or timezone.now()
+    return {
+        'batches_archived': archive_closed_batches(batch_size, now),
+        'usage_logs_archived': archive_usage_logs(batch_size, now),
+    }
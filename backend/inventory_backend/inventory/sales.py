@@ -0,0 +1,229 @@
+# backend/inventory/sales.py
+
+import csv
+import hashlib
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from . import costing
+from .models import Inventory, Recipe, SalesImport, UsageLog
+
+ITEM_COLUMNS = ('item', 'pos_code', 'sku', 'code')
+QUANTITY_COLUMNS = ('quantity', 'qty', 'sold')
+
+
+class SalesImportError(ValueError):
+    """The sales file is malformed or has already been imported."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class _HashedLines:
+    """Iterates the text lines of a file or stream, hashing them on the way."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.hash = hashlib.sha256()
+
+    def __iter__(self):
+        for line in self.lines:
+            if isinstance(line, bytes):
+                self.hash.update(line)
+                line = line.decode('utf-8')
+            else:
+                self.hash.update(line.encode())
+            yield line
+
+
+def _column(header, names):
+    for name in names:
+        if name in header:
+            return header.index(name)
+    raise SalesImportError(f"The header needs one of these columns: {', '.join(names)}")
+
+
+def read_sales(lines):
+    """
+    Stream a POS sales CSV and total the portions sold per item code. The
+    header names the item column (item, pos_code, sku or code) and the
+    quantity column (quantity, qty or sold); other columns are ignored and
+    refunds may be negative. Only one total per distinct item is held in
+    memory. Returns ({item: portions}, data lines read, sha256 of the file).
+    """
+    source = _HashedLines(lines)
+    reader = csv.reader(source)
+    header = next(reader, None)
+    if not header:
+        raise SalesImportError('The sales file is empty')
+    header = [name.strip().lstrip('\ufeff').lower() for name in header]
+    item_column = _column(header, ITEM_COLUMNS)
+    quantity_column = _column(header, QUANTITY_COLUMNS)
+
+    sold = defaultdict(Decimal)
+    count = 0
+    for number, row in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        try:
+            item = row[item_column].strip()
+            quantity = Decimal(row[quantity_column].strip())
+        except (IndexError, InvalidOperation):
+            raise SalesImportError(f'Line {number}: expected an item code and a numeric quantity')
+        if not item:
+            raise SalesImportError(f'Line {number}: missing item code')
+        sold[item] += quantity
+        count += 1
+    return sold, count, source.hash.hexdigest()
+
+
+def explode(sold):
+    """
+    Turn portions sold per item into stock units needed per ingredient
+    product, rounded to whole units once per product. Returns
+    ({product_id: units}, {item: portions} for items with no active recipe).
+    """
+    recipes = {
+        recipe.pos_code: recipe
+        for recipe in Recipe.objects.filter(is_active=True).prefetch_related('ingredients')
+    }
+    needed = defaultdict(Decimal)
+    unknown = {}
+    for item, portions in sold.items():
+        if portions <= 0:
+            continue
+        recipe = recipes.get(item)
+        if recipe is None:
+            unknown[item] = portions
+            continue
+        for ingredient in recipe.ingredients.all():
+            needed[ingredient.product_id] += ingredient.quantity * portions
+    units = {
+        product_id: int(quantity.to_integral_value(rounding=ROUND_HALF_UP))
+        for product_id, quantity in needed.items()
+    }
+    return {product_id: quantity for product_id, quantity in units.items() if quantity > 0}, unknown
+
+
+def allocate(needed, batches):
+    """
+    Take each product's units from its batches in the order given (earliest
+    expiry first). Returns ([(batch row, units)], {product_id: units short}).
+    """
+    remaining = dict(needed)
+    allocations = []
+    for batch in batches:
+        want = remaining.get(batch['product_id'], 0)
+        if want <= 0:
+            continue
+        take = min(want, batch['quantity'])
+        allocations.append((batch, take))
+        remaining[batch['product_id']] = want - take
+    shortfall = {product_id: units for product_id, units in remaining.items() if units > 0}
+    return allocations, shortfall
+
+
+def import_sales(lines, user, filename='', location=None, dry_run=False):
+    """
+    Apply a POS sales file as ingredient usage: stream and total it, explode
+    the totals through the recipes, take the units from usable stock
+    (earliest expiry first, optionally only at ``location``, a Q) and write
+    the decrements, cost ledger issues and sale UsageLogs in bulk, in one
+    transaction. Units not in stock are reported, not taken.
+    """
+    sold, line_count, digest = read_sales(lines)
+    needed, unknown = explode(sold)
+
+    try:
+        with transaction.atomic():
+            result = _apply(sold, line_count, digest, needed, unknown, user, filename, location, dry_run)
+    except IntegrityError:
+        # Same file imported concurrently; the unique digest let only one through
+        raise SalesImportError('This sales file has already been imported')
+    if result['id'] is not None:
+        print(f"🧾 Sales import #{result['id']}: {line_count} lines, {result['usage_logs']} batches drawn down")
+    return result
+
+
+def _apply(sold, line_count, digest, needed, unknown, user, filename, location, dry_run):
+    batch_size = _setting('SALES_IMPORT_BATCH_SIZE', 500)
+    if not dry_run and SalesImport.objects.filter(digest=digest).exists():
+        raise SalesImportError('This sales file has already been imported')
+
+    batches = Inventory.objects.on_hand().filter(product_id__in=list(needed))
+    if location is not None:
+        batches = batches.filter(location)
+    if not dry_run:
+        batches = batches.select_for_update(of=('self',))
+    allocations, shortfall = allocate(needed, batches.order_by('product_id', 'expiry_date', 'pk').values(
+        'id', 'product_id', 'supplier', 'supplier_key', 'cost_price', 'quantity'
+    ))
+    entries = [
+        (
+            Inventory(
+                pk=batch['id'], product_id=batch['product_id'], supplier=batch['supplier'],
+                supplier_key=batch['supplier_key'], cost_price=batch['cost_price']
+            ),
+            units
+        )
+        for batch, units in allocations
+    ]
+
+    record = None
+    if dry_run:
+        costs = [batch.cost_price * units for batch, units in entries]
+    else:
+        costs = costing.issue_many(entries)
+        record = SalesImport.objects.create(
+            filename=filename[:255],
+            digest=digest,
+            lines=line_count,
+            portions_sold=sum(sold.values(), Decimal('0')),
+            usage_logs=len(entries),
+            units_used=sum(units for _, units in entries),
+            value=sum(costs, Decimal('0')),
+            unknown_items={item: str(portions) for item, portions in unknown.items()},
+            shortfall={str(product_id): units for product_id, units in shortfall.items()},
+            imported_by=user,
+        )
+        Inventory.objects.bulk_update(
+            [
+                Inventory(pk=batch['id'], quantity=batch['quantity'] - units, version=F('version') + 1)
+                for batch, units in allocations
+            ],
+            ['quantity', 'version'],
+            batch_size=batch_size
+        )
+        UsageLog.objects.bulk_create(
+            [
+                UsageLog(
+                    inventory_id=batch['id'],
+                    quantity_used=units,
+                    used_by=user,
+                    reason=UsageLog.SALE,
+                    notes=f'POS sales import #{record.pk}',
+                    cost_value=cost,
+                )
+                for (batch, units), cost in zip(allocations, costs)
+            ],
+            batch_size=batch_size
+        )
+
+    return {
+        'id': record.pk if record else None,
+        'dry_run': dry_run,
+        'lines': line_count,
+        'items': len(sold),
+        'portions_sold': sum(sold.values(), Decimal('0')),
+        'products': len(needed),
+        'usage_logs': len(entries),
+        'units_used': sum(units for _, units in entries),
+        'value': sum(costs, Decimal('0')),
+        'unknown_items': unknown,
+        'shortfall': shortfall,
+    }
@@ -1,35 +1,96 @@
 # backend/inventory/serializers.py
 
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.validators import URLValidator
+from django.db import IntegrityError, transaction
+from django.urls import reverse
 from rest_framework import serializers
 from .models import Category, Product, Inventory, UsageLog
 from .models import ProductMaster, InventoryItem
+from .models import ArchivedInventory, ArchivedUsageLog, Job, QueryStat, RequestProfile
+from .models import Location, StockTransfer, WasteRecord
+from .models import Recipe, RecipeIngredient, SalesImport
+from . import costing, resolvers
+from .gtin import normalize_gtin
+from .sparse import SparseFieldsSerializerMixin
+from .thumbnails import source_hash
 
-class CategorySerializer(serializers.ModelSerializer):
+# Product images are fetched server-side for thumbnails (inventory/thumbnails.py)
+image_url_validator = URLValidator(schemes=['http', 'https'])
+
+class CategorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = '__all__'
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
+    thumbnail_url = serializers.SerializerMethodField()
+    
+    field_requirements = {
+        'category_name': ('category__name',),
+        'thumbnail_url': ('image_url',),
+    }
+    expandable_fields = {'category': CategorySerializer}
     
     class Meta:
         model = Product
         fields = '__all__'
 
+    def validate_barcode(self, value):
+        canonical = normalize_gtin(value)
+        if canonical:
+            duplicates = Product.objects.filter(gtin14=canonical)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError(f'A product with GTIN {canonical} already exists')
+        return value
+
+    def validate_image_url(self, value):
+        if value:
+            image_url_validator(value)
+        return value
+
+    def get_thumbnail_url(self, obj):
+        if not obj.image_url:
+            return None
+        # v= changes whenever image_url does, so clients can cache forever
+        url = reverse('product-thumbnail', args=[obj.pk]) + f'?v={source_hash(obj.image_url)[:12]}'
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 class ProductMasterSerializer(serializers.ModelSerializer):
     class Meta:
         model = ProductMaster
         fields = ['id', 'gtin', 'name', 'shelf_life_days']
 
-class InventorySerializer(serializers.ModelSerializer):
+class LocationSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Location
+        fields = ['id', 'name', 'kind', 'is_active', 'created_at']
+
+class InventorySerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     product_barcode = serializers.CharField(source='product.barcode', read_only=True)
+    location_name = serializers.CharField(source='location.name', read_only=True, default=None)
     days_until_expiry = serializers.ReadOnlyField()
     status = serializers.ReadOnlyField()
     
+    # days_until_expiry/status read the with_expiry() annotations when present
+    field_requirements = {
+        'product_name': ('product__name',),
+        'product_barcode': ('product__barcode',),
+        'location_name': ('location__name',),
+        'days_until_expiry': ('expiry_date',),
+        'status': ('expiry_date', 'is_expired'),
+    }
+    expandable_fields = {'product': ProductSerializer, 'location': LocationSerializer}
+    
     class Meta:
         model = Inventory
         fields = '__all__'
+        extra_kwargs = {'quantity': {'min_value': 0}}
 
 class InventoryItemSerializer(serializers.ModelSerializer):
     class Meta:
@@ -37,74 +98,189 @@ class InventoryItemSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'product', 'quantity',
             'purchase_date', 'expiry_date',
-            'supplier', 'cost_price', 'batch_number'
+            'supplier', 'cost_price', 'batch_number', 'version'
         ]
+        read_only_fields = ['version']
 
 class InventoryCreateSerializer(serializers.Serializer):
     # Product data
     product = serializers.DictField()
     
     # Inventory data
-    quantity = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
     purchase_date = serializers.DateTimeField()
     expiry_date = serializers.DateTimeField()
     batch_number = serializers.CharField(required=False, allow_blank=True)
     supplier = serializers.CharField()
     cost_price = serializers.DecimalField(max_digits=10, decimal_places=2)
+    location = serializers.PrimaryKeyRelatedField(
+        queryset=Location.objects.filter(is_active=True), required=False, allow_null=True
+    )
     
-    def create(self, validated_data):
-        from django.contrib.auth.models import User
-        
-        # Extract product data
-        product_data = validated_data.pop('product')
-        
-        # Get or create category
-        category_name = product_data.get('category', 'Food & Beverages')
-        category, created = Category.objects.get_or_create(
-            name=category_name,
-            defaults={'description': f'Auto-created category: {category_name}'}
-        )
-        
-        # Get or create product
-        product, created = Product.objects.get_or_create(
-            barcode=product_data['barcode'],
-            defaults={
-                'name': product_data['name'],
-                'category': category,
-                'brand': product_data.get('brand', ''),
-                'unit_price': product_data['unit_price'],
-                'description': product_data.get('description', ''),
-                'image_url': product_data.get('image_url', ''),
-            }
-        )
-        
-        # Create inventory item
-        # Get current user from request context
+    def validate_product(self, value):
+        image_url = value.get('image_url')
+        if image_url:
+            try:
+                image_url_validator(image_url)
+            except DjangoValidationError:
+                raise serializers.ValidationError({'image_url': 'Enter a valid http or https URL.'})
+        return value
+    
+    def _user_id(self):
         request = self.context.get('request')
-        if request and hasattr(request, 'user'):
-            user = request.user
-        else:
-            # Fallback to first superuser if no request context
-            user = User.objects.filter(is_superuser=True).first()
-            if not user:
-                # Create a default user if none exists
-                user = User.objects.create_user(
-                    username='system',
-                    email='system@cheftrack.com',
-                    password='temporary123'
-                )
-        
-        inventory = Inventory.objects.create(
-            product=product,
-            added_by=user,
-            **validated_data
-        )
-        
+        if self.context.get('user') is not None:
+            # Background jobs pass the user explicitly
+            return self.context['user'].pk
+        if request is not None and request.user.is_authenticated:
+            return request.user.pk
+        # Anonymous scans and jobs without a user are recorded as the system user
+        return resolvers.system_user_id()
+    
+    def _create(self, product_data, validated_data):
+        with transaction.atomic():
+            inventory = Inventory.objects.create(
+                product_id=resolvers.product_id(product_data),
+                added_by_id=self._user_id(),
+                **validated_data
+            )
+            costing.record_receipt(inventory)
         return inventory
+    
+    def create(self, validated_data):
+        # Category, product and user ids come from the resolver cache
+        # (inventory/resolvers.py), so a known product needs no lookups:
+        # just the batch INSERT and its receipt (price history and cost
+        # ledger), in one transaction
+        product_data = validated_data.pop('product')
+        try:
+            return self._create(product_data, validated_data)
+        except IntegrityError:
+            # A cached id can point at a row another process has since deleted
+            resolvers.cache.clear()
+            return self._create(product_data, validated_data)
 
-class UsageLogSerializer(serializers.ModelSerializer):
+class UsageLogSerializer(SparseFieldsSerializerMixin, serializers.ModelSerializer):
     product_name = serializers.CharField(source='inventory.product.name', read_only=True)
     
+    field_requirements = {'product_name': ('inventory__product__name',)}
+    expandable_fields = {'inventory': InventorySerializer}
+    
     class Meta:
         model = UsageLog
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+        extra_kwargs = {'quantity_used': {'min_value': 1}, 'cost_value': {'read_only': True}}
+
+class StockTransferSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    from_location_name = serializers.CharField(source='from_location.name', read_only=True, default=None)
+    to_location_name = serializers.CharField(source='to_location.name', read_only=True)
+    
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+
+class WasteRecordSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True, default=None)
+    category_name = serializers.CharField(source='category.name', read_only=True, default=None)
+    location_name = serializers.CharField(source='location.name', read_only=True, default=None)
+    
+    class Meta:
+        model = WasteRecord
+        fields = '__all__'
+
+class RecipeIngredientSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    
+    class Meta:
+        model = RecipeIngredient
+        fields = ['id', 'product', 'product_name', 'quantity']
+
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('Must be greater than zero')
+        return value
+
+class RecipeSerializer(serializers.ModelSerializer):
+    ingredients = RecipeIngredientSerializer(many=True)
+    
+    class Meta:
+        model = Recipe
+        fields = ['id', 'name', 'pos_code', 'is_active', 'ingredients', 'created_at', 'updated_at']
+
+    def validate_ingredients(self, value):
+        products = [item['product'].pk for item in value]
+        if len(products) != len(set(products)):
+            raise serializers.ValidationError('Each product can only be listed once')
+        return value
+
+    def _set_ingredients(self, recipe, ingredients):
+        recipe.ingredients.all().delete()
+        RecipeIngredient.objects.bulk_create(
+            [RecipeIngredient(recipe=recipe, **item) for item in ingredients]
+        )
+
+    def create(self, validated_data):
+        ingredients = validated_data.pop('ingredients')
+        with transaction.atomic():
+            recipe = Recipe.objects.create(**validated_data)
+            self._set_ingredients(recipe, ingredients)
+        return recipe
+
+    def update(self, instance, validated_data):
+        # A PUT/PATCH with ingredients replaces the whole list
+        ingredients = validated_data.pop('ingredients', None)
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            if ingredients is not None:
+                self._set_ingredients(instance, ingredients)
+        return instance
+
+class SalesImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SalesImport
+        fields = '__all__'
+
+class ArchivedInventorySerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True, default=None)
+    
+    class Meta:
+        model = ArchivedInventory
+        fields = '__all__'
+
+class ArchivedUsageLogSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True, default=None)
+    
+    class Meta:
+        model = ArchivedUsageLog
+        fields = '__all__'
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'status', 'priority', 'attempts', 'max_attempts',
+            'run_after', 'result', 'last_error', 'created_at',
+            'started_at', 'finished_at', 'duration_ms'
+        ]
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = RequestProfile
+        fields = [
+            'id', 'method', 'path', 'status_code', 'user', 'duration_ms',
+            'query_count', 'query_time_ms', 'created_at'
+        ]
+
+class RequestProfileDetailSerializer(RequestProfileSerializer):
+    class Meta(RequestProfileSerializer.Meta):
+        fields = RequestProfileSerializer.Meta.fields + ['report']
+
+class QueryStatSerializer(serializers.ModelSerializer):
+    avg_ms = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = QueryStat
+        fields = [
+            'id', 'endpoint', 'fingerprint', 'sql', 'count', 'total_ms', 'avg_ms', 'max_ms',
+            'slow_count', 'explain', 'explained_at', 'first_seen', 'last_seen'
+        ]
@@ -0,0 +1,122 @@
+# backend/inventory/snapshots.py
+
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import CategoryStockSnapshot, CostLedger, Inventory, Product, StockSnapshot, StockSnapshotRun
+
+
+def _table(model):
+    return connection.ops.quote_name(model._meta.db_table)
+
+
+def take_snapshot(day=None):
+    """
+    Record today's stock on hand (every batch still holding stock, valued
+    like /valuation/stock/ at its ledger's average cost) under ``day`` with
+    two INSERT ... SELECT statements: one row per product, then
+    per-category totals built from those rows. The day's StockSnapshotRun
+    marks it as taken even if nothing was in stock. Running it again for
+    the same day replaces that day.
+    """
+    day = day or timezone.localdate()
+    day_param = connection.ops.adapt_datefield_value(day)
+    with transaction.atomic():
+        StockSnapshot.objects.filter(day=day).delete()
+        CategoryStockSnapshot.objects.filter(day=day).delete()
+        with connection.cursor() as cursor:
+            # Same basis as costing.issue_many(): batch cost only for ledgers with no receipts
+            cursor.execute(
+                f"""
+                INSERT INTO {_table(StockSnapshot)} (day, product_id, category_id, quantity, value)
+                SELECT %s, stock.product_id, product.category_id, SUM(stock.quantity),
+                       SUM(stock.quantity * CASE WHEN ledger.received_quantity > 0
+                                                 THEN ledger.average_cost ELSE stock.cost_price END)
+                FROM {_table(Inventory)} stock
+                INNER JOIN {_table(Product)} product ON product.id = stock.product_id
+                LEFT JOIN {_table(CostLedger)} ledger
+                       ON ledger.product_id = stock.product_id AND ledger.supplier_key = stock.supplier_key
+                WHERE stock.quantity > 0
+                GROUP BY stock.product_id, product.category_id
+                """,
+                [day_param]
+            )
+            products = cursor.rowcount
+            cursor.execute(
+                f"""
+                INSERT INTO {_table(CategoryStockSnapshot)} (day, category_id, products, quantity, value)
+                SELECT day, category_id, COUNT(*), SUM(quantity), SUM(value)
+                FROM {_table(StockSnapshot)}
+                WHERE day = %s
+                GROUP BY day, category_id
+                """,
+                [day_param]
+            )
+            categories = cursor.rowcount
+        StockSnapshotRun.objects.update_or_create(
+            day=day, defaults={'products': products, 'categories': categories}
+        )
+    return {'day': day.isoformat(), 'products': products, 'categories': categories}
+
+
+def snapshot_day(day):
+    """The latest day on or before ``day`` that a snapshot was taken, or None."""
+    return StockSnapshotRun.objects.filter(day__lte=day).aggregate(day=Max('day'))['day']
+
+
+def stock_on(day, by_product=False, category=None):
+    """
+    Stock value as of ``day`` from the nearest earlier snapshot, per
+    category (or per product with ``by_product``), plus the total.
+    """
+    actual = snapshot_day(day)
+    if actual is None:
+        return None
+    if by_product:
+        rows = StockSnapshot.objects.filter(day=actual)
+        if category:
+            rows = rows.filter(category_id=category)
+        results = list(
+            rows.values('product_id', 'product__name', 'category_id', 'quantity', 'value').order_by('-value', 'product_id')
+        )
+    else:
+        rows = CategoryStockSnapshot.objects.filter(day=actual)
+        if category:
+            rows = rows.filter(category_id=category)
+        results = list(
+            rows.values('category_id', 'category__name', 'products', 'quantity', 'value').order_by('-value')
+        )
+    return {
+        'requested_day': day,
+        'day': actual,
+        'total_quantity': sum(row['quantity'] for row in results),
+        'total_value': sum(row['value'] for row in results),
+        'results': results,
+    }
+
+
+def stock_history(start, end, product=None, category=None):
+    """
+    One point per snapshot day in [start, end]: the totals for a product,
+    a category or the whole stock, zero on days it had no stock. Reads at
+    most one small set of rows per day.
+    """
+    if product:
+        rows = (
+            StockSnapshot.objects.filter(product_id=product, day__gte=start, day__lte=end)
+            .annotate(total_quantity=F('quantity'), total_value=F('value'))
+        )
+    else:
+        rows = CategoryStockSnapshot.objects.filter(day__gte=start, day__lte=end)
+        if category:
+            rows = rows.filter(category_id=category)
+        rows = rows.values('day').annotate(total_quantity=Sum('quantity'), total_value=Sum('value'))
+    points = {row['day']: row for row in rows.values('day', 'total_quantity', 'total_value')}
+    days = StockSnapshotRun.objects.filter(day__gte=start, day__lte=end).order_by('day').values_list('day', flat=True)
+    return [
+        points.get(day, {'day': day, 'total_quantity': 0, 'total_value': Decimal('0')})
+        for day in days
+    ]
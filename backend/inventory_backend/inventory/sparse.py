@@ -0,0 +1,147 @@
+# backend/inventory/sparse.py
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import permissions
+from rest_framework.exceptions import ValidationError
+
+
+def parse_field_list(value):
+    """'id,product.name,quantity' -> {'id': None, 'product': {'name'}, 'quantity': None}"""
+    requested = {}
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, child = item.partition('.')
+        if child:
+            if requested.get(name, set()) is not None:
+                requested.setdefault(name, set()).add(child)
+        else:
+            requested[name] = None
+    return requested
+
+
+class SparseFieldsSerializerMixin:
+    """
+    Serializer that can be cut down to the fields a client asked for.
+
+    ``fields`` (a parse_field_list() dict, or None for everything) keeps
+    only the named fields; ``expand`` (a set) swaps the listed relations
+    for nested serializers from ``expandable_fields``. Dotted names such as
+    ``product.name`` pick the fields of an expanded relation.
+
+    ``field_requirements`` lists the model paths behind fields that are not
+    plain model fields (``'product_name': ('product__name',)``), so
+    ``queryset_plan()`` can work out which columns to load and which joins
+    are needed.
+    """
+
+    field_requirements = {}
+    expandable_fields = {}
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sparse = fields is not None
+        expand = set(expand or ())
+        if fields is not None:
+            # Asking for product.name implies expanding product
+            expand |= {name for name, child in fields.items() if child is not None}
+
+        unknown = expand - set(self.expandable_fields)
+        if unknown:
+            raise ValidationError({'expand': f'Cannot expand {", ".join(sorted(unknown))}; '
+                                             f'expandable: {", ".join(sorted(self.expandable_fields)) or "none"}'})
+        for name in expand:
+            child_fields = fields.get(name) if fields is not None else None
+            self.fields[name] = self.expandable_fields[name](
+                read_only=True,
+                fields={child: None for child in child_fields} if child_fields else None,
+            )
+
+        if fields is not None:
+            unknown = set(fields) - set(self.fields)
+            if unknown:
+                raise ValidationError({'fields': f'Unknown fields: {", ".join(sorted(unknown))}'})
+            for name in list(self.fields):
+                if name not in fields:
+                    self.fields.pop(name)
+
+    def required_paths(self):
+        """
+        (paths, complete): the model paths behind the fields this serializer
+        renders. ``complete`` is False when some field's needs are unknown,
+        in which case every column has to be loaded.
+        """
+        paths = set()
+        complete = True
+        for name, field in self.fields.items():
+            if name in self.field_requirements:
+                paths.update(self.field_requirements[name])
+            elif isinstance(field, SparseFieldsSerializerMixin):
+                nested, nested_complete = field.required_paths()
+                if not nested_complete:
+                    nested |= {f.name for f in field.Meta.model._meta.concrete_fields}
+                paths.add(field.source)
+                paths.update(f'{field.source}__{path}' for path in nested)
+            elif field.source == '*':
+                complete = False
+            else:
+                try:
+                    self.Meta.model._meta.get_field(field.source)
+                except FieldDoesNotExist:
+                    complete = False
+                else:
+                    paths.add(field.source)
+        return paths, complete
+
+    def queryset_plan(self):
+        """
+        (only_paths, select_related_paths) for this serializer. only_paths
+        is None unless a field list was requested and every field's needs
+        are known.
+        """
+        paths, complete = self.required_paths()
+        related = set()
+        for path in paths:
+            parts = path.split('__')
+            for depth in range(1, len(parts)):
+                related.add('__'.join(parts[:depth]))
+        # Relations being traversed cannot also be deferred
+        only = sorted(paths | related) if complete and self.sparse else None
+        return only, sorted(related)
+
+    def trim_queryset(self, queryset):
+        only, related = self.queryset_plan()
+        if related:
+            queryset = queryset.select_related(*related)
+        if only is not None:
+            queryset = queryset.only(*only)
+        return queryset
+
+
+class SparseFieldsViewSetMixin:
+    """
+    ViewSet side of sparse fieldsets: reads ?fields= and ?expand= on GET
+    requests, hands them to the serializer and trims the queryset to the
+    columns and joins the serializer needs.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer_class = self.get_serializer_class()
+        if (issubclass(serializer_class, SparseFieldsSerializerMixin)
+                and self.request is not None
+                and self.request.method in permissions.SAFE_METHODS):
+            params = self.request.query_params
+            if 'fields' in params:
+                kwargs.setdefault('fields', parse_field_list(params['fields']))
+            if 'expand' in params:
+                kwargs.setdefault('expand', set(parse_field_list(params['expand'])))
+        return super().get_serializer(*args, **kwargs)
+
+    def trim_queryset(self, queryset):
+        if not issubclass(self.get_serializer_class(), SparseFieldsSerializerMixin):
+            return queryset
+        return self.get_serializer().trim_queryset(queryset)
+
+    def filter_queryset(self, queryset):
+        return self.trim_queryset(super().filter_queryset(queryset))
@@ -0,0 +1,168 @@
+# backend/inventory/stocktake.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import costing
+from .gtin import normalize_gtin
+from .models import Inventory, UsageLog, normalize_key
+
+
+class StocktakeError(ValueError):
+    """The uploaded count snapshot is malformed."""
+
+
+def product_code(barcode):
+    """GTIN-14 for GTINs (so UPC/EAN variants agree), else the code as sent."""
+    barcode = str(barcode).strip()
+    return normalize_gtin(barcode) or barcode
+
+
+def parse_counts(counts):
+    """
+    Collapse the uploaded rows into {(product code, batch_key): counted}.
+    An empty batch_key stands for "all batches of this barcode".
+    """
+    if not isinstance(counts, list) or not counts:
+        raise StocktakeError('counts must be a non-empty list')
+    totals = defaultdict(int)
+    for index, row in enumerate(counts):
+        if not isinstance(row, dict) or not row.get('barcode'):
+            raise StocktakeError(f'counts[{index}] needs a barcode')
+        try:
+            counted = int(row.get('counted'))
+        except (TypeError, ValueError):
+            raise StocktakeError(f'counts[{index}].counted must be an integer')
+        if counted < 0:
+            raise StocktakeError(f'counts[{index}].counted cannot be negative')
+        totals[(product_code(row['barcode']), normalize_key(row.get('batch_number')))] += counted
+    return totals
+
+
+def _allocate(rows, counted):
+    """
+    Spread one counted total over the batches it covers, oldest expiry
+    first and never above what each batch should hold; any surplus goes
+    on the last batch.
+    """
+    allocation = {}
+    remaining = counted
+    for row in rows:
+        take = min(row['quantity'], remaining) if row['quantity'] > 0 else 0
+        allocation[row['id']] = take
+        remaining -= take
+    if remaining and rows:
+        allocation[rows[-1]['id']] += remaining
+    return allocation
+
+
+def reconcile(counts, full=True, apply=False, user=None, notes='', location=None):
+    """
+    Diff a counted snapshot against Inventory in one pass. With ``full``
+    every batch still holding stock that the snapshot does not mention is
+    counted as zero. With ``apply`` the new quantities are written with a
+    bulk update, plus one stocktake UsageLog per changed batch, in a single
+    transaction. ``location`` limits the count to the batches held there.
+    """
+    totals = parse_counts(counts)
+    codes = {code for code, _ in totals}
+    barcodes = codes | {str(row['barcode']).strip() for row in counts}
+
+    with transaction.atomic():
+        scope = Q(product__gtin14__in=codes) | Q(product__barcode__in=barcodes)
+        if full:
+            scope |= Q(quantity__gt=0)
+        queryset = Inventory.objects.filter(scope)
+        if location is not None:
+            queryset = queryset.filter(location=location)
+        if apply:
+            queryset = queryset.select_for_update()
+        rows = list(
+            queryset
+            .values('id', 'product_id', 'product__barcode', 'product__name', 'batch_number',
+                    'batch_key', 'supplier', 'supplier_key', 'quantity', 'cost_price', 'expiry_date')
+            .order_by('expiry_date', 'pk')
+        )
+
+        by_barcode = defaultdict(list)
+        by_batch = defaultdict(list)
+        for row in rows:
+            code = product_code(row['product__barcode'])
+            by_barcode[code].append(row)
+            by_batch[(code, row['batch_key'])].append(row)
+
+        counted = {}
+        unmatched = []
+        for (barcode, batch_key), total in totals.items():
+            matching = by_batch.get((barcode, batch_key)) if batch_key else by_barcode.get(barcode)
+            if not matching:
+                unmatched.append({'barcode': barcode, 'batch_key': batch_key, 'counted': total})
+                continue
+            for pk, quantity in _allocate(matching, total).items():
+                counted[pk] = counted.get(pk, 0) + quantity
+
+        variances = []
+        batches = {}
+        for row in rows:
+            if row['id'] not in counted:
+                if not full or row['quantity'] <= 0:
+                    continue
+                counted[row['id']] = 0
+            variance = counted[row['id']] - row['quantity']
+            if variance:
+                variances.append({
+                    'inventory_id': row['id'],
+                    'barcode': row['product__barcode'],
+                    'product_name': row['product__name'],
+                    'batch_number': row['batch_number'],
+                    'expected': row['quantity'],
+                    'counted': counted[row['id']],
+                    'variance': variance,
+                    'value': variance * row['cost_price'],
+                })
+                batches[row['id']] = Inventory(
+                    pk=row['id'], product_id=row['product_id'], supplier=row['supplier'],
+                    supplier_key=row['supplier_key'], cost_price=row['cost_price']
+                )
+
+        if apply and variances:
+            # Shrinkage leaves the cost ledger at average cost; surplus comes back at it
+            costs = costing.issue_many(
+                (batches[item['inventory_id']], -item['variance']) for item in variances
+            )
+            Inventory.objects.bulk_update(
+                [
+                    Inventory(pk=item['inventory_id'], quantity=item['counted'], version=F('version') + 1)
+                    for item in variances
+                ],
+                ['quantity', 'version'],
+                batch_size=500
+            )
+            UsageLog.objects.bulk_create(
+                [
+                    UsageLog(
+                        inventory_id=item['inventory_id'],
+                        quantity_used=-item['variance'],
+                        used_by=user,
+                        reason=UsageLog.STOCKTAKE,
+                        notes=notes or 'Stocktake adjustment',
+                        cost_value=cost,
+                    )
+                    for item, cost in zip(variances, costs)
+                ],
+                batch_size=500
+            )
+
+    return {
+        'applied': bool(apply),
+        'batches_checked': len(counted),
+        'variance_count': len(variances),
+        'shrinkage': -sum(item['variance'] for item in variances if item['variance'] < 0),
+        'surplus': sum(item['variance'] for item in variances if item['variance'] > 0),
+        'value_change': sum((item['value'] for item in variances), Decimal('0')),
+        'variances': variances,
+        'unmatched': unmatched,
+    }
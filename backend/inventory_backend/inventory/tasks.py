@@ -0,0 +1,81 @@
+# backend/inventory/tasks.py
+
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import F
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import catalog, idempotency, retention, snapshots, waste
+from .jobs import PermanentError, task
+from .models import Inventory, RequestProfile
+
+
+@task('inventory.add_item')
+def add_item(data, user_id=None):
+    """Create a scanned item queued by add/?async=1. Invalid scans fail without retrying."""
+    from .serializers import InventoryCreateSerializer
+
+    user = User.objects.filter(pk=user_id).first() if user_id else None
+    serializer = InventoryCreateSerializer(data=data, context={'user': user})
+    if not serializer.is_valid():
+        raise PermanentError(json.dumps(serializer.errors))
+    inventory = serializer.save()
+    return {'inventory_id': inventory.pk}
+
+
+@task('inventory.expiry_sweep')
+def expiry_sweep(write_off=None):
+    """
+    Flag batches whose expiry date has passed, and write their stock off
+    as waste when ``write_off`` (default: WASTE_WRITE_OFF_ON_SWEEP) is set.
+    """
+    if write_off is None:
+        write_off = getattr(settings, 'WASTE_WRITE_OFF_ON_SWEEP', False)
+    written_off = waste.write_off_expired() if write_off else None
+    updated = Inventory.objects.filter(is_expired=False).with_status('expired').update(
+        is_expired=True, version=F('version') + 1
+    )
+    result = {'marked_expired': updated}
+    if written_off is not None:
+        result['written_off'] = written_off['batches']
+        result['waste_value'] = str(written_off['value'])
+    return result
+
+
+@task('inventory.write_off_expired')
+def write_off_expired():
+    result = waste.write_off_expired()
+    return {'batches': result['batches'], 'quantity': result['quantity'], 'value': str(result['value'])}
+
+
+@task('inventory.retention')
+def run_retention(batch_size=None):
+    return retention.run_retention(batch_size=batch_size)
+
+
+@task('inventory.purge_idempotency_keys')
+def purge_idempotency_keys():
+    return {'purged': idempotency.purge_expired()}
+
+
+@task('inventory.purge_request_profiles')
+def purge_request_profiles(days=7):
+    deleted, _ = RequestProfile.objects.filter(created_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return {'purged': deleted}
+
+
+@task('inventory.refresh_catalog')
+def refresh_catalog():
+    """Rebuild the device catalog snapshot ahead of the next download."""
+    snapshot = catalog.current_snapshot()
+    return {'version': snapshot.version, 'products': snapshot.row_count}
+
+
+@task('inventory.stock_snapshot')
+def stock_snapshot(day=None):
+    """Nightly stock valuation snapshot; queue from cron with enqueue_job."""
+    return snapshots.take_snapshot(parse_date(day) if day else None)
@@ -1,3 +1,854 @@
-from django.test import TestCase
+import hashlib
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    catalog, costing, forecasting, gtin_backfill, idempotency, jobs, locations, profiling, querylog, resolvers,
+    retention, snapshots, thumbnails,
+)
+from .gtin import normalize_gtin
+from .sparse import parse_field_list
+from .serializers import InventoryCreateSerializer, InventorySerializer
+from .models import (
+    ArchivedInventory, ArchivedUsageLog, Category, CostLedger, IdempotencyKey, Inventory, Job, Location, Product,
+    ProductMaster, QueryStat, Recipe, RecipeIngredient, RequestProfile, SalesImport, UsageLog, WasteRecord,
+)
+
+
+def scan_payload(barcode='012345678905', quantity=3, **extra):
+    now = timezone.now()
+    return {
+        'product': {'barcode': barcode, 'name': 'Milk', 'category': 'Dairy', 'unit_price': '1.50'},
+        'quantity': quantity,
+        'purchase_date': now.isoformat(),
+        'expiry_date': (now + timedelta(days=5)).isoformat(),
+        'cost_price': '1.00',
+        'supplier': 'Acme',
+        **extra,
+    }
+
+
+def make_batch(product, user, quantity=4, days=5, **fields):
+    """A costed batch, as the add endpoint would leave it."""
+    expiry = timezone.now() + timedelta(days=days)
+    batch = Inventory.objects.create(
+        product=product, added_by=user, quantity=quantity, cost_price=fields.pop('cost_price', '1.00'),
+        supplier=fields.pop('supplier', 'Acme'), purchase_date=min(expiry, timezone.now()), expiry_date=expiry,
+        **fields
+    )
+    batch.refresh_from_db()
+    costing.record_receipt(batch)
+    return batch
+
+
+class NormalizeGtinTests(TestCase):
+    def test_padded_forms_agree(self):
+        for code in ('96385074', '096385074', '0096385074', '00096385074', '00000096385074'):
+            self.assertEqual(normalize_gtin(code), '00000096385074', code)
+        for code in ('012345678905', '0012345678905', '00012345678905', '0123-4567-8905'):
+            self.assertEqual(normalize_gtin(code), '00012345678905', code)
+        self.assertEqual(normalize_gtin('4006381333931'), '04006381333931')
+
+    def test_bad_check_digit_is_not_a_gtin(self):
+        self.assertIsNone(normalize_gtin('4006381333932'))
+        self.assertIsNone(normalize_gtin('012345678900'))
+
+    def test_internal_and_short_codes(self):
+        for code in ('1234567', '0001234', '00000000', 'ABC-123', '', None, '1' * 15):
+            self.assertIsNone(normalize_gtin(code), code)
+
+
+@override_settings(TIME_ZONE='Pacific/Auckland')
+class ExpiryBoundaryTests(TestCase):
+    def test_status_at_day_boundaries(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        user = User.objects.create_user('cook')
+        today = timezone.localdate()
+        expected = {}
+        for days, status in ((-1, 'expired'), (0, 'good'), (1, 'expiring_soon'), (7, 'expiring_soon'), (8, 'good')):
+            for moment in (time.min, time(23, 59, 59)):
+                expiry = timezone.make_aware(datetime.combine(today + timedelta(days=days), moment))
+                batch = Inventory.objects.create(
+                    product=product, added_by=user, quantity=1, cost_price='1.00', supplier='Acme',
+                    purchase_date=expiry - timedelta(days=30), expiry_date=expiry,
+                )
+                expected[batch.pk] = (days, status)
+
+        for batch in Inventory.objects.with_expiry():
+            days, status = expected[batch.pk]
+            self.assertEqual((batch.days_to_expiry, batch.expiry_status), (days, status), batch.expiry_date)
+            self.assertEqual(Inventory.objects.get(pk=batch.pk).status, status)
+        for status in ('expired', 'expiring_soon', 'good'):
+            self.assertEqual(
+                set(Inventory.objects.with_status(status).values_list('pk', flat=True)),
+                {pk for pk, (_, expected_status) in expected.items() if expected_status == status},
+                status,
+            )
+
+
+class ForecastTests(TestCase):
+    def test_weekday_profile_lines_up_with_future_days(self):
+        start_day = datetime(2026, 3, 4).date()   # a Wednesday
+        history_days = 10
+        matrix = np.array([[7.0 if (start_day + timedelta(days=j)).weekday() == 0 else 0.0
+                            for j in range(history_days)]])
+
+        forecast = forecasting.forecast_daily_demand(matrix, start_day, horizon_days=7)
+
+        first_day = start_day + timedelta(days=history_days)
+        for k in range(7):
+            weekday = (first_day + timedelta(days=k)).weekday()
+            # Mean of the 7-day moving average (1/day) and the weekday profile (7 on Mondays)
+            self.assertEqual(forecast[0, k], 4.0 if weekday == 0 else 0.5, weekday)
+
+    def test_usage_lands_in_its_utc_day_column(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        user = User.objects.create_user('cook')
+        batch = make_batch(product, user, quantity=10)
+        end_day = timezone.now().date()
+        log = UsageLog.objects.create(inventory=batch, quantity_used=3, used_by=user)
+        used_at = timezone.make_aware(datetime.combine(end_day - timedelta(days=3), time(23, 59)), dt_timezone.utc)
+        UsageLog.objects.filter(pk=log.pk).update(created_at=used_at)
+
+        product_ids, matrix = forecasting.load_usage_matrix(end_day, 7)
+
+        self.assertEqual(list(product_ids), [product.pk])
+        self.assertEqual(matrix[0].tolist(), [0, 0, 0, 0, 3, 0, 0])
+
+
+class GtinBackfillTests(TestCase):
+    def test_merge_folds_lines_of_a_shared_recipe(self):
+        survivor = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        duplicate = Product.objects.create(barcode='milk-legacy', name='Milk', unit_price='1.50')
+        Product.objects.filter(pk=duplicate.pk).update(barcode='0012345678905')
+        recipe = Recipe.objects.create(name='Latte', pos_code='LAT')
+        recipe.ingredients.create(product=survivor, quantity='0.200')
+        recipe.ingredients.create(product=duplicate, quantity='0.050')
+
+        result = gtin_backfill.backfill(Product, 'barcode')
+
+        self.assertEqual(result['merged'], 1)
+        self.assertEqual(list(Product.objects.values_list('pk', flat=True)), [survivor.pk])
+        line = RecipeIngredient.objects.get()
+        self.assertEqual((line.recipe_id, line.product_id, line.quantity), (recipe.pk, survivor.pk, Decimal('0.250')))
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook', password='pw')
+        self.client.force_login(self.user)
+
+    def post(self, data, key):
+        return self.client.post(
+            '/api/add/', json.dumps(data), content_type='application/json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    def test_retry_replays_first_response(self):
+        payload = scan_payload()
+        first = self.post(payload, 'scan-1')
+        second = self.post(payload, 'scan-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(Inventory.objects.count(), 1)
+
+    def test_key_reused_with_different_body(self):
+        payload = scan_payload()
+        self.post(payload, 'scan-1')
+        response = self.post(dict(payload, quantity=5), 'scan-1')
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Inventory.objects.count(), 1)
+
+    def test_key_in_flight(self):
+        payload = scan_payload()
+        scope = f'POST /api/add/ u{self.user.pk}'
+        idempotency.begin('scan-1', scope, idempotency.data_fingerprint(payload))
+
+        response = self.post(payload, 'scan-1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Inventory.objects.exists())
+
+    def test_expired_lease_is_taken_over(self):
+        payload = scan_payload()
+        scope = f'POST /api/add/ u{self.user.pk}'
+        dead, _ = idempotency.begin('scan-1', scope, idempotency.data_fingerprint(payload))
+        IdempotencyKey.objects.filter(pk=dead.pk).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self.post(payload, 'scan-1')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Inventory.objects.count(), 1)
+        # The dead request can no longer overwrite or release the key
+        idempotency.abandon(dead)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 201)
+
+
+class RetentionTests(TestCase):
+    def test_expired_stock_is_written_off_before_archiving(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        make_batch(product, User.objects.create_user('cook'), days=-200)
+
+        self.assertEqual(retention.archive_closed_batches(), 1)
+
+        self.assertFalse(Inventory.objects.exists())
+        self.assertEqual(ArchivedInventory.objects.get().quantity, 0)
+        record = WasteRecord.objects.get()
+        self.assertEqual((record.quantity, record.reason), (4, WasteRecord.EXPIRED))
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, 0)
+
+    def test_archived_usage_still_feeds_the_forecast(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        user = User.objects.create_user('cook')
+        batch = make_batch(product, user, quantity=0)
+        Inventory.objects.filter(pk=batch.pk).update(created_at=timezone.now() - timedelta(days=40))
+        UsageLog.objects.create(inventory=batch, quantity_used=4, used_by=user)
+        end_day = timezone.now().date() + timedelta(days=1)
+
+        self.assertEqual(retention.archive_closed_batches(), 1)
+
+        self.assertEqual(ArchivedUsageLog.objects.get().quantity_used, 4)
+        product_ids, matrix = forecasting.load_usage_matrix(end_day, 56)
+        self.assertEqual(list(product_ids), [product.pk])
+        self.assertEqual(matrix.sum(), 4)
+
+
+class RecallTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, User.objects.create_user('cook'), batch_number='L231')
+
+    def recall(self):
+        return self.client.post(
+            '/api/items/recall/',
+            {'recalls': [{'supplier': 'Acme', 'batch': 'L23*'}], 'quarantine': True},
+            content_type='application/json'
+        )
+
+    def test_requires_staff(self):
+        self.assertEqual(self.recall().status_code, 403)
+        self.client.force_login(User.objects.create_user('cook2'))
+        self.assertEqual(self.recall().status_code, 403)
+        self.batch.refresh_from_db()
+        self.assertFalse(self.batch.quarantined)
+
+    def test_staff_recall_quarantines(self):
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+        response = self.recall()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quarantined'], 1)
+
+
+def stub_fetcher(url):
+    from PIL import Image
+
+    output = BytesIO()
+    Image.new('RGB', (640, 480), 'red').save(output, 'PNG')
+    return output.getvalue()
+
+
+@override_settings(THUMBNAIL_FETCHER='inventory.tests.stub_fetcher', THUMBNAIL_SIZES=(160,))
+class ThumbnailTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+
+    def test_same_image_under_two_urls_is_stored_once(self):
+        first = thumbnails.get_thumbnail('https://images.example/a.jpg', 160)
+        second = thumbnails.get_thumbnail('https://cdn.example/a.jpg?v=2', 160)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first.name, f'{hashlib.sha256(stub_fetcher(None)).hexdigest()}_160.webp')
+
+    def test_only_public_http_urls_are_fetched(self):
+        for url in ('file:///etc/passwd', 'ftp://example.com/a.jpg', 'http://127.0.0.1/a.jpg',
+                    'http://10.0.0.8/a.jpg', 'http://169.254.169.254/latest/', 'http://[::ffff:127.0.0.1]/'):
+            with self.assertRaises(thumbnails.ThumbnailError, msg=url):
+                thumbnails.check_source_url(url)
+
+    def test_connection_goes_only_to_the_checked_address(self):
+        public = [(2, 1, 6, '', ('93.184.216.34', 80))]
+        rebound = [(2, 1, 6, '', ('127.0.0.1', 80))]
+        with mock.patch('socket.getaddrinfo', side_effect=[public, rebound]), \
+                mock.patch('socket.socket') as new_socket:
+            with self.assertRaisesMessage(thumbnails.ThumbnailError, 'not a public address'):
+                thumbnails.urllib_fetcher('http://images.example/a.jpg')
+        new_socket.assert_not_called()
+
+    def test_add_rejects_non_http_image_url(self):
+        payload = scan_payload()
+        payload['product']['image_url'] = 'file:///etc/passwd'
+        response = self.client.post('/api/add/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Product.objects.exists())
+
+
+class CostLedgerConsistencyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(self.product, self.user, quantity=23)
+
+    def patch(self, data):
+        return self.client.patch(f'/api/items/{self.batch.pk}/', data, content_type='application/json')
+
+    def assertLedgerMatchesShelf(self):
+        on_shelf = sum(Inventory.objects.values_list('quantity', flat=True))
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, on_shelf)
+        valuation = self.client.get('/api/valuation/stock/').json()
+        self.assertEqual(valuation['total_quantity'], on_shelf)
+
+    def test_quantity_edit(self):
+        self.assertEqual(self.patch({'quantity': 22}).status_code, 200)
+        self.assertLedgerMatchesShelf()
+        self.assertEqual(self.patch({'quantity': 30}).status_code, 200)
+        self.assertLedgerMatchesShelf()
+
+    def test_quantity_delta(self):
+        self.assertEqual(self.patch({'quantity_delta': -5}).status_code, 200)
+        self.assertLedgerMatchesShelf()
+
+    def test_supplier_change_moves_stock_between_ledgers(self):
+        self.assertEqual(self.patch({'supplier': 'Other Dairy'}).status_code, 200)
+        ledgers = dict(CostLedger.objects.values_list('supplier', 'on_hand_quantity'))
+        self.assertEqual(ledgers, {'Acme': 0, 'Other Dairy': 23})
+
+    def test_delete(self):
+        make_batch(self.product, self.user, quantity=2)
+        self.assertEqual(self.client.delete(f'/api/items/{self.batch.pk}/').status_code, 204)
+        self.assertLedgerMatchesShelf()
+
+    def test_add_rejects_non_positive_quantity(self):
+        response = self.client.post('/api/add/', scan_payload(quantity=-1), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertLedgerMatchesShelf()
+
+
+class IfMatchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_user('cook'))
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, User.objects.get(), quantity=10)
+        self.url = f'/api/items/{self.batch.pk}/'
+
+    def test_stale_if_match_is_rejected(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.patch(self.url, {'quantity': 9}, content_type='application/json', HTTP_IF_MATCH=etag)
+
+        response = self.client.patch(self.url, {'quantity': 8}, content_type='application/json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 412)
+        self.assertNotEqual(response['ETag'], etag)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 9)
+
+    def test_current_if_match_applies(self):
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.patch(self.url, {'quantity': 7}, content_type='application/json', HTTP_IF_MATCH=etag)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 7)
+
+
+class StocktakeTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.client.force_login(self.user)
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, self.user, quantity=10, batch_number='L1')
+
+    def stocktake(self, apply):
+        return self.client.post('/api/items/stocktake/', {
+            # An EAN-13 form of the product's UPC-A counts against the same batches
+            'counts': [{'barcode': '0012345678905', 'batch_number': 'L1', 'counted': 7}],
+            'apply': apply,
+        }, content_type='application/json')
+
+    def test_diff_leaves_stock_alone(self):
+        response = self.stocktake(apply=False)
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual((body['applied'], body['shrinkage'], body['variance_count']), (False, 3, 1))
+        self.assertEqual(body['variances'][0]['variance'], -3)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 10)
+
+    def test_apply_adjusts_stock_and_ledger(self):
+        self.assertTrue(self.stocktake(apply=True).json()['applied'])
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 7)
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, 7)
+        # Counting again finds nothing to change
+        self.assertEqual(self.stocktake(apply=True).json()['variance_count'], 0)
+
+
+class StockSnapshotTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.client.force_login(self.user)
+        self.product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+
+    def test_valued_like_stock_valuation(self):
+        cheap = make_batch(self.product, self.user, quantity=10, cost_price='1.00')
+        make_batch(self.product, self.user, quantity=10, cost_price='2.00')
+        # Use up the cheap batch: 10 left at the 1.50 average, not at the 2.00 batch cost
+        Inventory.objects.filter(pk=cheap.pk).update(quantity=0)
+        costing.issue(cheap, 10)
+        snapshots.take_snapshot()
+
+        history = snapshots.stock_on(timezone.localdate())
+        valuation = costing.stock_valuation()
+        self.assertEqual(history['total_quantity'], valuation['total_quantity'])
+        self.assertEqual(Decimal(history['total_value']), valuation['total_value'])
+        self.assertEqual(valuation['total_value'], Decimal('15'))
+
+    def test_day_without_stock_reads_zero(self):
+        yesterday = timezone.localdate() - timedelta(days=1)
+        batch = make_batch(self.product, self.user, quantity=5)
+        snapshots.take_snapshot(yesterday)
+        Inventory.objects.filter(pk=batch.pk).update(quantity=0)
+        snapshots.take_snapshot()
+
+        today = snapshots.stock_on(timezone.localdate())
+        self.assertEqual((today['day'], today['total_quantity']), (timezone.localdate(), 0))
+        points = snapshots.stock_history(yesterday, timezone.localdate())
+        self.assertEqual([point['total_quantity'] for point in points], [5, 0])
+
+
+class WasteWriteOffTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, self.user, quantity=6)
+
+    def write_off(self):
+        return self.client.post(
+            '/api/waste/write_off/', {'inventory_ids': [self.batch.pk], 'reason': 'damaged'},
+            content_type='application/json'
+        )
+
+    def test_anonymous_write_off_is_refused(self):
+        self.assertEqual(self.write_off().status_code, 403)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 6)
+        self.assertFalse(WasteRecord.objects.exists())
+
+    def test_write_off_records_user(self):
+        self.client.force_login(self.user)
+        response = self.write_off()
+
+        self.assertEqual(response.status_code, 200)
+        record = WasteRecord.objects.get()
+        self.assertEqual((record.quantity, record.reason, record.recorded_by), (6, 'damaged', self.user))
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, 0)
+
+
+class SalesImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, self.user, quantity=10)
+        recipe = Recipe.objects.create(name='Latte', pos_code='LAT')
+        recipe.ingredients.create(product=product, quantity=1)
+
+    def upload(self, dry_run=False):
+        return self.client.post(
+            '/api/sales-imports/import/' + ('?dry_run=1' if dry_run else ''),
+            'item,quantity\nLAT,3\n', content_type='text/csv'
+        )
+
+    def test_anonymous_import_is_refused(self):
+        self.assertEqual(self.upload().status_code, 403)
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 10)
+        self.assertFalse(SalesImport.objects.exists())
+
+    def test_anonymous_dry_run(self):
+        response = self.upload(dry_run=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['units_used'], 3)
+        self.assertFalse(SalesImport.objects.exists())
+
+    def test_import_records_user(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.upload().status_code, 201)
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, 7)
+        self.assertEqual(SalesImport.objects.get().imported_by, self.user)
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, 7)
+
+
+class ScanResolverTests(TestCase):
+    def setUp(self):
+        resolvers.cache.clear()
+        self.addCleanup(resolvers.cache.clear)
+
+    def scan(self, user=None, **payload):
+        serializer = InventoryCreateSerializer(data=scan_payload(**payload), context={'user': user})
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def test_known_product_needs_no_lookups(self):
+        user = User.objects.create_user('cook')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.scan(user)
+
+        # Savepoint, batch INSERT, receipt (price history INSERT, ledger
+        # INSERT OR IGNORE, SELECT FOR UPDATE, UPDATE), release
+        with self.assertNumQueries(7):
+            batch = self.scan(user, barcode='0012345678905')
+        self.assertEqual(Inventory.objects.filter(product_id=batch.product_id).count(), 2)
+
+    def test_anonymous_scan_is_recorded_as_system_user(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            batch = self.scan()
+
+        self.assertEqual(batch.added_by.username, resolvers.SYSTEM_USERNAME)
+        self.assertFalse(batch.added_by.has_usable_password())
+
+    def test_receipt_failure_leaves_no_batch(self):
+        with mock.patch.object(costing, 'record_receipt', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.scan(User.objects.create_user('cook'))
+        self.assertFalse(Inventory.objects.exists())
+
+    def test_login_keeps_cached_user(self):
+        boss = User.objects.create_superuser('boss', password='pw')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(resolvers.system_user_id(), boss.pk)
+
+        self.client.login(username='boss', password='pw')
+        with self.assertNumQueries(0):
+            self.assertEqual(resolvers.system_user_id(), boss.pk)
+
+        boss.is_superuser = False
+        boss.save()
+        self.assertNotEqual(resolvers.system_user_id(), boss.pk)
+
+
+class UsageLogApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('cook')
+        self.client.force_login(self.user)
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, self.user, quantity=10)
+
+    def log_usage(self, quantity):
+        return self.client.post('/api/usage-logs/', {
+            'inventory': self.batch.pk, 'quantity_used': quantity, 'used_by': self.user.pk,
+        }, content_type='application/json')
+
+    def assertShelfAndLedger(self, quantity):
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.quantity, quantity)
+        self.assertEqual(CostLedger.objects.get().on_hand_quantity, quantity)
+        self.assertEqual(self.client.get('/api/valuation/stock/').json()['total_quantity'], quantity)
+
+    def test_usage_takes_stock_off_the_batch_and_ledger(self):
+        response = self.log_usage(3)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Decimal(response.json()['cost_value']), Decimal('3'))
+        self.assertShelfAndLedger(7)
+
+    def test_short_stock_is_refused(self):
+        self.assertEqual(self.log_usage(11).status_code, 400)
+        self.assertFalse(UsageLog.objects.exists())
+        self.assertShelfAndLedger(10)
+
+    def test_edit_and_delete_move_the_stock_back(self):
+        log_id = self.log_usage(3).json()['id']
+        response = self.client.patch(f'/api/usage-logs/{log_id}/', {'quantity_used': 5}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertShelfAndLedger(5)
+
+        self.assertEqual(self.client.delete(f'/api/usage-logs/{log_id}/').status_code, 204)
+        self.assertShelfAndLedger(10)
+
+
+class QueryLogTests(TestCase):
+    def test_fingerprint_ignores_literals_and_list_lengths(self):
+        key, normalized = querylog.fingerprint("SELECT * FROM item WHERE id IN (1, 2, 3) AND name = 'a''b'")
+
+        self.assertEqual(normalized, 'SELECT * FROM item WHERE id IN (?+) AND name = ?')
+        self.assertEqual(querylog.fingerprint('SELECT * FROM item WHERE id IN (%s, %s) AND name = %s')[0], key)
+        self.assertEqual(
+            querylog.fingerprint('INSERT INTO item VALUES (%s, %s), (%s, %s), (%s, %s)')[0],
+            querylog.fingerprint('INSERT INTO item VALUES (%s, %s), (%s, %s)')[0],
+        )
+        self.assertNotEqual(querylog.fingerprint('SELECT * FROM stock WHERE id IN (1, 2)')[0], key)
+
+    def test_totals_are_aggregated_and_explained_off_the_request(self):
+        log = querylog.QueryLog()
+        self.enterContext(mock.patch.object(log, '_start_worker'))
+        explain = self.enterContext(mock.patch('inventory.querylog.explain', return_value='SCAN item'))
+        for id_ in (1, 2):
+            collector = querylog.StatementCollector(slow_ms=0)
+            collector(lambda *args: None, 'SELECT * FROM item WHERE id = %s', (id_,), False, {})
+            collector(lambda *args: None, 'SELECT * FROM item WHERE id = %s', (id_ + 1,), False, {})
+            log.record('GET item-list', collector)
+
+        explain.assert_not_called()
+        self.assertEqual(log.explain_pending(), 1)
+        self.assertEqual(log.flush(), 1)
+
+        stat = QueryStat.objects.get()
+        self.assertEqual((stat.endpoint, stat.count, stat.slow_count), ('GET item-list', 4, 4))
+        self.assertEqual((stat.sql, stat.explain), ('SELECT * FROM item WHERE id = ?', 'SCAN item'))
+        self.assertEqual(log.flush(), 0)
+
+
+@jobs.task('tests.fail')
+def failing_task():
+    raise RuntimeError('boom')
+
+
+@jobs.task('tests.succeed')
+def succeeding_task():
+    return {'ok': True}
+
+
+@override_settings(JOB_RETRY_BASE_SECONDS=10)
+class JobTests(TestCase):
+    def test_a_job_is_claimed_by_one_worker(self):
+        job = jobs.enqueue('tests.succeed')
+
+        self.assertEqual([claimed.pk for claimed in jobs.claim('w1')], [job.pk])
+        self.assertEqual(jobs.claim('w2'), [])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, 'w1', 1))
+
+    def test_failures_back_off_then_fail(self):
+        job = jobs.enqueue('tests.fail', max_attempts=2)
+
+        self.assertFalse(jobs.run_job(jobs.claim('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertAlmostEqual((job.run_after - timezone.now()).total_seconds(), 10, delta=2)
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertFalse(jobs.run_job(jobs.claim('w1')[0]))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+        self.assertIn('boom', job.last_error)
+
+    def test_invalid_scan_fails_without_retrying(self):
+        job = jobs.enqueue('inventory.add_item', {'data': scan_payload(quantity=0)})
+
+        self.assertFalse(jobs.run_job(jobs.claim('w1')[0]))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 1))
+        self.assertIn('PermanentError', job.last_error)
+
+    def test_stale_job_without_attempts_left_is_failed(self):
+        retried = jobs.enqueue('tests.succeed')
+        exhausted = jobs.enqueue('tests.succeed', max_attempts=1)
+        jobs.claim('w1', limit=2)
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale(), 1)
+
+        self.assertEqual(Job.objects.get(pk=retried.pk).status, Job.QUEUED)
+        self.assertEqual(Job.objects.get(pk=exhausted.pk).status, Job.FAILED)
+
+    def test_outcome_is_not_written_after_losing_the_lease(self):
+        job = jobs.enqueue('tests.succeed')
+        stale_claim = jobs.claim('w1')[0]
+        Job.objects.update(locked_at=timezone.now() - timedelta(hours=1))
+        jobs.requeue_stale()
+        jobs.claim('w2')
+
+        self.assertFalse(jobs.run_job(stale_claim))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.locked_by, job.attempts), (Job.RUNNING, 'w2', 2))
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'throttle': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'throttle-tests'},
+    },
+    THROTTLE_RATES={'add_inventory_item': '2/min'},
+)
+class ThrottleTests(TestCase):
+    def test_429_with_retry_after_once_the_burst_is_used(self):
+        self.enterContext(mock.patch('inventory.throttling.time.time', return_value=1_000_000.0))
+        payload = scan_payload()
+
+        for _ in range(2):
+            response = self.client.post('/api/add/', payload, content_type='application/json')
+            self.assertNotEqual(response.status_code, 429)
+        response = self.client.post('/api/add/', payload, content_type='application/json')
+
+        self.assertEqual(response.status_code, 429)
+        # 2/min refills one token every 30 seconds
+        self.assertEqual(response['Retry-After'], '30')
+
+
+class ProfilingTests(TestCase):
+    def test_only_staff_requests_are_profiled(self):
+        self.client.force_login(User.objects.create_user('cook'))
+        response = self.client.get('/api/items/?_profile=1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_inline_report_is_stored(self):
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+        response = self.client.get('/api/items/', HTTP_X_PROFILE='inline')
+
+        report = response.json()
+        profile = RequestProfile.objects.get()
+        self.assertEqual(response['X-Profile-Id'], str(profile.pk))
+        self.assertEqual((report['id'], report['query_count']), (str(profile.pk), profile.query_count))
+        self.assertEqual(len(report['queries']), profile.query_count)
+        self.assertTrue(report['top_functions'])
+
+    def test_repeats_and_n_plus_one_suspects(self):
+        queries = [{'sql': 'SELECT name FROM product WHERE id = %s', 'params': repr((pk,)), 'time_ms': 1.0}
+                   for pk in (1, 2, 3, 3)]
+
+        duplicates, suspects = profiling._query_analysis(queries, n_plus_one_threshold=4)
+
+        self.assertEqual(duplicates, [{'sql': queries[0]['sql'], 'params': '(3,)', 'count': 2}])
+        self.assertEqual(suspects, [{'sql': queries[0]['sql'], 'count': 4, 'time_ms': 4.0}])
+
+
+class TransferTests(TestCase):
+    def test_split_batch_keeps_ledger_totals(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        store, kitchen = Location.objects.create(name='Store'), Location.objects.create(name='Kitchen')
+        source = make_batch(product, User.objects.create_user('cook'), quantity=10, location=store)
+
+        first = locations.transfer(source.pk, kitchen, 4)
+        second = locations.transfer(source.pk, kitchen, 2)
+        with self.assertRaises(locations.TransferError):
+            locations.transfer(source.pk, kitchen, 5)
+
+        self.assertEqual(first.destination_id, second.destination_id)
+        self.assertEqual(
+            dict(Inventory.objects.values_list('location__name', 'quantity')), {'Store': 4, 'Kitchen': 6}
+        )
+        ledger = CostLedger.objects.get()
+        self.assertEqual(ledger.on_hand_quantity, 10)
+        self.assertEqual(ledger.on_hand_value, Decimal('10.0000'))
+
+
+class LocationSummaryTests(TestCase):
+    def test_values_add_up_to_the_valuation(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        user = User.objects.create_user('cook')
+        store, kitchen = Location.objects.create(name='Store'), Location.objects.create(name='Kitchen')
+        make_batch(product, user, location=store, cost_price='1.00')
+        make_batch(product, user, location=kitchen, cost_price='3.00')
+
+        summary = {row['location_name']: row['stock_value'] for row in locations.location_summary()}
+
+        # Both batches are valued at the ledger's average cost of 2.00
+        self.assertEqual(summary, {'Store': Decimal('8'), 'Kitchen': Decimal('8')})
+        self.assertEqual(sum(summary.values()), costing.stock_valuation()['total_value'])
+
+
+class SparseFieldsTests(TestCase):
+    def setUp(self):
+        product = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50')
+        self.batch = make_batch(product, User.objects.create_user('cook'))
+
+    def get(self, query):
+        response = self.client.get(f'/api/items/{self.batch.pk}/?{query}')
+        return response.status_code, response.json()
+
+    def test_fields_and_expand_shape_the_response(self):
+        self.assertEqual(self.get('fields=id,quantity,product.name'),
+                         (200, {'id': self.batch.pk, 'quantity': 4, 'product': {'name': 'Milk'}}))
+        status, body = self.get('expand=product')
+        self.assertEqual((status, body['product']['barcode']), (200, '012345678905'))
+        self.assertIn('supplier', body)
+
+    def test_unknown_fields_and_relations_are_rejected(self):
+        for query, key in (('fields=id,nope', 'fields'), ('expand=added_by', 'expand'),
+                           ('fields=added_by.username', 'expand')):
+            status, body = self.get(query)
+            self.assertEqual((status, list(body)), (400, [key]), query)
+
+    def test_only_the_needed_columns_and_joins_are_loaded(self):
+        serializer = InventorySerializer(fields=parse_field_list('id,product_name,status'))
+
+        self.assertEqual(
+            serializer.queryset_plan(),
+            (['expiry_date', 'id', 'is_expired', 'product', 'product__name'], ['product'])
+        )
+        self.assertEqual(InventorySerializer().queryset_plan()[0], None)
+
+
+class CatalogSnapshotTests(TestCase):
+    def setUp(self):
+        self.dairy = Category.objects.create(name='Dairy')
+        self.milk = Product.objects.create(barcode='012345678905', name='Milk', unit_price='1.50', category=self.dairy)
+        Product.objects.create(barcode='SKU-1', name='House stock', unit_price='4.00')
+        ProductMaster.objects.create(gtin='4006381333931', name='Pencils', shelf_life_days=999)
+        self.first = catalog.current_snapshot()
+
+    def rebuild(self):
+        with mock.patch.object(catalog, '_all_rows', wraps=catalog._all_rows) as all_rows:
+            snapshot = catalog.current_snapshot()
+        self.assertEqual(catalog.decode(snapshot.payload), catalog._all_rows())
+        return snapshot, all_rows.called
+
+    def test_incremental_merge_matches_a_full_rebuild(self):
+        self.milk.name = 'Whole milk'
+        self.milk.save()
+        Product.objects.create(barcode='96385074', name='Butter', unit_price='2.00', category=self.dairy)
+        ProductMaster.objects.create(gtin='0012345678905', name='Milk (master)', shelf_life_days=7)
+
+        snapshot, full = self.rebuild()
+
+        self.assertFalse(full)
+        self.assertGreater(snapshot.pk, self.first.pk)
+        self.assertEqual(catalog.decode(snapshot.payload)['00012345678905'], ('Whole milk', 7, 'Dairy'))
+
+    def test_deleted_product_forces_a_full_rebuild(self):
+        Product.objects.filter(barcode='SKU-1').delete()
+
+        snapshot, full = self.rebuild()
+
+        self.assertTrue(full)
+        self.assertNotIn('SKU-1', catalog.decode(snapshot.payload))
+
+    def test_renamed_category_forces_a_full_rebuild(self):
+        Category.objects.filter(pk=self.dairy.pk).update(name='Chilled')
+
+        snapshot, full = self.rebuild()
+
+        self.assertTrue(full)
+        self.assertEqual(catalog.decode(snapshot.payload)['00012345678905'][2], 'Chilled')
+
+    def test_unchanged_contents_keep_the_version(self):
+        self.milk.description = 'Semi-skimmed'
+        self.milk.save()
+
+        self.assertEqual(catalog.current_snapshot().pk, self.first.pk)
@@ -0,0 +1,100 @@
+# backend/inventory/throttling.py
+
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60.0)"""
+    count, period = rate.split('/')
+    return int(count), float(PERIODS[period])
+
+
+def client_ip(request):
+    if getattr(settings, 'THROTTLE_TRUST_X_FORWARDED_FOR', False):
+        forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '')
+
+
+class TokenBucket:
+    """
+    Token bucket in GCRA form: each key stores a single float, the time at
+    which its bucket will be full again, so a check is one cache get and
+    (when allowed) one set.
+
+    The limit is best-effort, not exact: the get and the set are not one
+    atomic step (the file cache behind THROTTLE_CACHE_ALIAS has no atomic
+    operation to build one from), so requests for the same key that check
+    at the same moment all read the same state and are all let through.
+    The overshoot is bounded by how many requests for one client are in
+    flight at once. That is acceptable for slowing down login guessing
+    and runaway scanners; do not use it where a hard quota is required.
+    """
+
+    def __init__(self, cache, rate, period):
+        self.cache = cache
+        self.period = period
+        self.interval = period / rate
+
+    def consume(self, key):
+        """Take one token; returns 0 if allowed, else seconds until allowed."""
+        now = time.time()
+        full_at = max(self.cache.get(key, now), now)
+        new_full_at = full_at + self.interval
+        wait = new_full_at - self.period - now
+        if wait > 0:
+            return wait
+        self.cache.set(key, new_full_at, timeout=math.ceil(self.period) + 1)
+        return 0
+
+
+class ThrottleMiddleware:
+    """
+    Per-endpoint token buckets keyed by client IP and, for signed-in
+    users, by user. Endpoints are picked by URL name in THROTTLE_RATES;
+    everything else passes through after a dict lookup. Must come after
+    AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE_ALIAS', 'default')]
+        self.buckets = {
+            url_name: TokenBucket(self.cache, *parse_rate(rate))
+            for url_name, rate in getattr(settings, 'THROTTLE_RATES', {}).items()
+        }
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        bucket = self.buckets.get(match.url_name) if match else None
+        if bucket is None or request.method == 'OPTIONS':
+            return None
+
+        keys = [f'throttle:{match.url_name}:ip:{client_ip(request)}']
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            keys.append(f'throttle:{match.url_name}:user:{user.pk}')
+
+        for key in keys:
+            wait = bucket.consume(key)
+            if wait:
+                print(f"⛔ Throttled {match.url_name} for {key}")
+                response = JsonResponse({
+                    'success': False,
+                    'message': 'Too many requests, please try again later'
+                }, status=429)
+                response['Retry-After'] = str(math.ceil(wait))
+                response['Access-Control-Allow-Origin'] = '*'
+                return response
+        return None
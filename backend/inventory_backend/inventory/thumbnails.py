@@ -0,0 +1,238 @@
+# backend/inventory/thumbnails.py
+
+import hashlib
+import http.client
+import ipaddress
+import os
+import socket
+import tempfile
+import urllib.error
+import urllib.parse
+import urllib.request
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps
+
+FORMATS = {
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+ALLOWED_SCHEMES = ('http', 'https')
+
+
+class ThumbnailError(Exception):
+    """The source image could not be fetched or decoded."""
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def check_source_url(url):
+    """
+    Refuse anything but http(s) URLs on public hosts, so a product's
+    image_url cannot be used to read local files or reach internal services.
+    """
+    parts = urllib.parse.urlsplit(url)
+    if parts.scheme not in ALLOWED_SCHEMES or not parts.hostname:
+        raise ThumbnailError('Only http and https image URLs can be fetched')
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError as e:
+        raise ThumbnailError(f'Could not resolve image host: {e}')
+    public_addresses(parts.hostname, port)
+
+
+def public_addresses(host, port):
+    """
+    Resolve ``host`` once and return its getaddrinfo() entries, refusing
+    the lot if any of them is not a public address.
+    """
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM, proto=socket.IPPROTO_TCP)
+    except (OSError, UnicodeError) as e:
+        raise ThumbnailError(f'Could not resolve image host: {e}')
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split('%')[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise ThumbnailError('Image host is not a public address')
+    return addresses
+
+
+def _create_public_connection(address, timeout=None, source_address=None):
+    """
+    socket.create_connection() that connects to the addresses it has just
+    checked, so a DNS answer that changes between the check and the
+    connect (rebinding) cannot point the fetch at an internal host.
+    """
+    host, port = address
+    error = None
+    for family, socktype, proto, _, sockaddr in public_addresses(host, port):
+        sock = socket.socket(family, socktype, proto)
+        try:
+            if timeout is not None:
+                sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f'Could not connect to {host}')
+
+
+class _PublicOnlyConnectionMixin:
+    # http.client opens its socket through self._create_connection; the Host
+    # header and TLS server name still come from the URL's host name
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = _create_public_connection
+
+
+class _PublicHTTPConnection(_PublicOnlyConnectionMixin, http.client.HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicOnlyConnectionMixin, http.client.HTTPSConnection):
+    pass
+
+
+class _PublicHTTPHandler(urllib.request.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open(_PublicHTTPConnection, req)
+
+
+class _PublicHTTPSHandler(urllib.request.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open(_PublicHTTPSConnection, req, context=self._context)
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        check_source_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+def urllib_fetcher(url):
+    """
+    Default fetcher: plain HTTP GET with a timeout and a size cap. The URL
+    and every redirect target are checked with check_source_url(), and
+    each connection goes only to the addresses it checked. Proxies from
+    the environment are ignored, since they would resolve the host again.
+    """
+    check_source_url(url)
+    max_bytes = _setting('THUMBNAIL_MAX_SOURCE_BYTES', 10 * 1024 * 1024)
+    request = urllib.request.Request(url, headers={'User-Agent': 'ChefTrack/1.0 (thumbnail proxy)'})
+    opener = urllib.request.build_opener(
+        urllib.request.ProxyHandler({}), _PublicHTTPHandler, _PublicHTTPSHandler, _CheckedRedirectHandler
+    )
+    try:
+        with opener.open(request, timeout=_setting('THUMBNAIL_FETCH_TIMEOUT', 10)) as response:
+            data = response.read(max_bytes + 1)
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ThumbnailError):
+            raise e.reason
+        raise
+    if len(data) > max_bytes:
+        raise ThumbnailError(f'Source image is larger than {max_bytes} bytes')
+    return data
+
+
+def get_fetcher():
+    """The callable set in THUMBNAIL_FETCHER (url -> bytes); swap it out for offline tests."""
+    return import_string(_setting('THUMBNAIL_FETCHER', 'inventory.thumbnails.urllib_fetcher'))
+
+
+def source_hash(url):
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+def _root():
+    return Path(settings.MEDIA_ROOT) / 'thumbnails'
+
+
+def thumbnail_path(content_digest, size, fmt):
+    """Renders are keyed by a hash of the source image bytes, so the same image under several URLs is stored once."""
+    return _root() / content_digest[:2] / f'{content_digest}_{size}.{fmt}'
+
+
+def _source_index_path(url):
+    # Small file holding the content hash last fetched for this URL
+    digest = source_hash(url)
+    return _root() / 'sources' / digest[:2] / digest
+
+
+def _content_digest(url):
+    try:
+        return _source_index_path(url).read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def render_thumbnail(data, size, fmt):
+    """Scale image bytes to fit a ``size`` x ``size`` box."""
+    try:
+        image = Image.open(BytesIO(data))
+        # Lets the JPEG decoder downscale while decoding
+        image.draft('RGB', (size, size))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f'Could not decode source image: {e}')
+
+    pil_format, _ = FORMATS[fmt]
+    if pil_format == 'JPEG' or image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGB')
+    output = BytesIO()
+    image.save(output, pil_format, quality=_setting('THUMBNAIL_QUALITY', 80))
+    return output.getvalue()
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename so readers never see a partial file
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(data)
+    os.replace(tmp_name, path)
+
+
+def get_thumbnail(url, size, fmt='webp'):
+    """
+    Path of the cached thumbnail for ``url``. On a miss the source image is
+    fetched once and every configured size and format is rendered from it,
+    so later requests for other variants never refetch.
+    """
+    content_digest = _content_digest(url)
+    if content_digest is not None:
+        path = thumbnail_path(content_digest, size, fmt)
+        if path.exists():
+            return path
+
+    try:
+        data = get_fetcher()(url)
+    except ThumbnailError:
+        raise
+    except Exception as e:
+        raise ThumbnailError(f'Could not fetch source image: {e}')
+
+    content_digest = hashlib.sha256(data).hexdigest()
+    sizes = set(_setting('THUMBNAIL_SIZES', (160,))) | {size}
+    for variant_size in sizes:
+        for variant_fmt in FORMATS:
+            variant = thumbnail_path(content_digest, variant_size, variant_fmt)
+            if not variant.exists():
+                _write_atomic(variant, render_thumbnail(data, variant_size, variant_fmt))
+    _write_atomic(_source_index_path(url), content_digest.encode())
+    return thumbnail_path(content_digest, size, fmt)
+
+
+def content_etag(path):
+    # The file name carries the source content hash, size and format
+    return '"%s"' % path.name
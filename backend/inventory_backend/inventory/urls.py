@@ -25,8 +25,36 @@ router.register(
     basename='inventory-item'
 )
 
+# Storage locations and the transfers between them
+router.register(r'locations', views.LocationViewSet)
+router.register(r'transfers', views.StockTransferViewSet, basename='stock-transfer')
+
+# Stock value, cost of goods used and supplier price trends
+router.register(r'valuation', views.ValuationViewSet, basename='valuation')
+
+# Recipes and POS sales imports (inventory/sales.py)
+router.register(r'recipes', views.RecipeViewSet, basename='recipe')
+router.register(r'sales-imports', views.SalesImportViewSet, basename='sales-import')
+
+# Written-off stock (inventory/waste.py)
+router.register(r'waste', views.WasteViewSet, basename='waste')
+
+# Read-only history moved out of the live tables by the retention job
+router.register(r'archive/items', views.ArchivedInventoryViewSet, basename='archived-inventory')
+router.register(r'archive/usage-logs', views.ArchivedUsageLogViewSet, basename='archived-usage-log')
+
+# Background job status and stats
+router.register(r'jobs', views.JobViewSet, basename='job')
+
+# Staff-only request profiling reports
+router.register(r'profiles', views.RequestProfileViewSet, basename='request-profile')
+
+# SQL statistics per endpoint (inventory/querylog.py), staff only
+router.register(r'sql-stats', views.QueryStatViewSet, basename='sql-stat')
+
 urlpatterns = [
     path('test/', views.test_view, name='inventory_test'),
     path('add/',  views.add_inventory_item, name='add_inventory_item'),
+    path('add/batch/', views.add_inventory_batch, name='add_inventory_batch'),
     path('', include(router.urls)),
 ]
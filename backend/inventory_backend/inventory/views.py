@@ -1,18 +1,40 @@
 # backend/inventory/views.py
 
-from rest_framework import viewsets, status
+from rest_framework import permissions, viewsets, status
 from rest_framework.decorators import action, api_view
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.csrf import csrf_exempt
-from django.http import JsonResponse
+from django.conf import settings
+import gzip
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, JsonResponse
+from django.db import transaction
+from django.db.models import Count, F, Max, Q, Sum
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework.utils.encoders import JSONEncoder as DRFJSONEncoder
 from .models import ProductMaster, InventoryItem
+from .models import ArchivedInventory, ArchivedUsageLog, Job, QueryStat, RequestProfile
+from .models import Location, StockTransfer, WasteRecord
+from .models import Recipe, SalesImport
 from .serializers import ProductMasterSerializer, InventoryItemSerializer
+from .serializers import ArchivedInventorySerializer, ArchivedUsageLogSerializer, JobSerializer
+from .serializers import RequestProfileSerializer, RequestProfileDetailSerializer, QueryStatSerializer
+from .serializers import LocationSerializer, StockTransferSerializer, WasteRecordSerializer
+from .serializers import RecipeSerializer, SalesImportSerializer
+from .concurrency import OptimisticConcurrencyMixin
+from .gtin import code_filter
+from .querylog import query_log
+from .sparse import SparseFieldsViewSetMixin
 import json
 
-from .models import Category, Product, Inventory, UsageLog
+from . import catalog, costing, forecasting, idempotency, jobs, locations, sales, snapshots, stocktake, thumbnails, waste
+
+from .models import Category, Product, Inventory, InventoryQuerySet, UsageLog, normalize_key
 from .serializers import (
     CategorySerializer, 
     ProductSerializer, 
@@ -21,6 +43,42 @@ from .serializers import (
     UsageLogSerializer
 )
 
+def _parse_date_param(name, value, end_of_day=False):
+    """
+    Parse a date or datetime query parameter into an aware datetime. Plain
+    dates mean the start of that day, or the start of the next day when
+    ``end_of_day`` is set so the bound is inclusive.
+    """
+    day = parse_date(value)
+    if day is not None:
+        if end_of_day:
+            day += timedelta(days=1)
+        parsed = datetime.combine(day, time.min)
+    else:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            raise ValidationError({name: 'Expected YYYY-MM-DD or an ISO 8601 datetime'})
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+def _location_filter(params):
+    """
+    Q for ?location=<id or name>; ``none`` selects stock with no location.
+    Returns an empty Q when the parameter is absent.
+    """
+    location = params.get('location')
+    if not location:
+        return Q()
+    if location == 'none':
+        return Q(location__isnull=True)
+    if location.isdigit():
+        return Q(location_id=int(location))
+    location_id = Location.objects.filter(name__iexact=location).values_list('pk', flat=True).first()
+    if location_id is None:
+        raise ValidationError({'location': f'Unknown location {location!r}'})
+    return Q(location_id=location_id)
+
 def test_view(request):
     return JsonResponse({
         'message': 'Inventory app is working!', 
@@ -31,6 +89,7 @@ def test_view(request):
             '/api/inventory/products/',
             '/api/inventory/items/',
             '/api/inventory/add/',
+            '/api/inventory/add/batch/',
             '/api/inventory/dashboard_stats/',
         ]
     })
@@ -39,7 +98,7 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     
@@ -47,39 +106,332 @@ class ProductViewSet(viewsets.ModelViewSet):
     def search_by_barcode(self, request):
         barcode = request.query_params.get('barcode')
         if barcode:
-            try:
-                product = Product.objects.get(barcode=barcode)
-                serializer = self.get_serializer(product)
-                return Response(serializer.data)
-            except Product.DoesNotExist:
+            # Matches any UPC/EAN/padded form of the code (inventory/gtin.py)
+            product = self.trim_queryset(Product.objects.filter(code_filter(barcode, 'barcode'))).order_by('pk').first()
+            if product is None:
                 return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+            serializer = self.get_serializer(product)
+            return Response(serializer.data)
         return Response({'error': 'Barcode parameter required'}, status=status.HTTP_400_BAD_REQUEST)
 
-class InventoryViewSet(viewsets.ModelViewSet):
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """
+        Whole product catalog (gtin, name, shelf_life_days, category) as one
+        versioned columnar JSON document for offline barcode lookups. Send
+        the ETag back in If-None-Match to get a 304 until the catalog changes.
+        """
+        snapshot = catalog.current_snapshot()
+        if snapshot.etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        elif 'gzip' in request.headers.get('Accept-Encoding', ''):
+            response = HttpResponse(bytes(snapshot.payload), content_type='application/json')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = HttpResponse(gzip.decompress(bytes(snapshot.payload)), content_type='application/json')
+        response['ETag'] = snapshot.etag
+        response['X-Catalog-Version'] = str(snapshot.version)
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'no-cache'
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    @action(detail=True, methods=['get'])
+    def thumbnail(self, request, pk=None):
+        """
+        Small WebP (or ?image_format=jpeg) version of the product image, fetched
+        once and cached on disk. ?size= must be one of THUMBNAIL_SIZES.
+        """
+        product = self.get_object()
+        if not product.image_url:
+            return Response({'error': 'Product has no image'}, status=status.HTTP_404_NOT_FOUND)
+
+        sizes = getattr(settings, 'THUMBNAIL_SIZES', (160,))
+        try:
+            size = int(request.query_params.get('size', sizes[0]))
+        except ValueError:
+            size = None
+        # Not ?format=, which DRF reserves for renderer selection
+        fmt = request.query_params.get('image_format', 'webp')
+        if size not in sizes or fmt not in thumbnails.FORMATS:
+            return Response({
+                'error': f'size must be one of {list(sizes)} and image_format one of {list(thumbnails.FORMATS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            path = thumbnails.get_thumbnail(product.image_url, size, fmt)
+        except thumbnails.ThumbnailError as e:
+            print(f"❌ Thumbnail failed for product {product.pk}: {e}")
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+
+        etag = thumbnails.content_etag(path)
+        if etag in request.headers.get('If-None-Match', ''):
+            response = HttpResponseNotModified()
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=thumbnails.FORMATS[fmt][1])
+        response['ETag'] = etag
+        # The URL carries a hash of image_url (see ProductSerializer), so it never goes stale
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def reorder_suggestions(self, request):
+        """
+        Suggested order quantities from forecast consumption, current stock
+        and shelf life. Computed once per day; ?refresh=1 recomputes.
+        """
+        refresh = request.query_params.get('refresh') in ('1', 'true')
+        suggestions = forecasting.get_reorder_suggestions(refresh=refresh)
+        return Response({
+            'date': timezone.now().date().isoformat(),
+            'count': len(suggestions),
+            'results': suggestions
+        })
+
+class InventoryViewSet(OptimisticConcurrencyMixin, SparseFieldsViewSetMixin, viewsets.ModelViewSet):
+    """
+    Stock batches. GET endpoints take ?fields=id,quantity,product_name to
+    return (and load) only those fields, and ?expand=product,location to
+    nest the related objects; see inventory/sparse.py. Updates honour
+    If-Match and PATCH accepts quantity_delta; see inventory/concurrency.py.
+    """
     queryset = Inventory.objects.all()
     serializer_class = InventorySerializer
+
+    # ?ordering= values mapped to the columns/annotations they sort on
+    ORDERING_FIELDS = {
+        'expiry': 'expiry_date',
+        'expiry_date': 'expiry_date',
+        'days_until_expiry': 'days_to_expiry',
+        'quantity': 'quantity',
+        'purchase_date': 'purchase_date',
+        'created_at': 'created_at',
+        'product': 'product__name',
+    }
+
+    def get_queryset(self):
+        # Joins are added by trim_queryset() for the fields being rendered
+        queryset = Inventory.objects.with_expiry()
+        if self.action != 'list':
+            return queryset
+        return self.filter_queryset_by_params(queryset, self.request.query_params)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            inventory = serializer.save()
+            costing.record_receipt(inventory)
+
+    def after_update(self, before, instance):
+        # Quantity edits and quantity_delta move the cost ledgers too
+        costing.record_adjustment(before, instance)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            if instance.quantity > 0:
+                costing.issue(instance, instance.quantity)
+            instance.delete()
+
+    def filter_queryset_by_params(self, queryset, params):
+        """
+        Server-side filtering and ordering for the list endpoint:
+        ?status=expired|expiring_soon|good, ?category=<id or name>,
+        ?location=<id or name>, ?supplier=, ?expires_after=, ?expires_before= (YYYY-MM-DD or ISO
+        datetime) and ?ordering=expiry|-expiry|days_until_expiry|...
+        """
+        status_param = params.get('status')
+        if status_param:
+            if status_param not in InventoryQuerySet.STATUSES:
+                raise ValidationError({'status': f'Must be one of {", ".join(InventoryQuerySet.STATUSES)}'})
+            queryset = queryset.with_status(status_param)
+
+        category = params.get('category')
+        if category:
+            if category.isdigit():
+                queryset = queryset.filter(product__category_id=int(category))
+            else:
+                queryset = queryset.filter(product__category__name__iexact=category)
+
+        queryset = queryset.filter(_location_filter(params))
+
+        supplier = params.get('supplier')
+        if supplier:
+            queryset = queryset.filter(supplier_key=normalize_key(supplier))
+
+        quarantined = params.get('quarantined')
+        if quarantined in ('true', '1', 'false', '0'):
+            queryset = queryset.filter(quarantined=quarantined in ('true', '1'))
+
+        expires_after = params.get('expires_after')
+        if expires_after:
+            queryset = queryset.filter(expiry_date__gte=_parse_date_param('expires_after', expires_after))
+
+        expires_before = params.get('expires_before')
+        if expires_before:
+            queryset = queryset.filter(expiry_date__lt=_parse_date_param('expires_before', expires_before, end_of_day=True))
+
+        ordering = params.get('ordering')
+        if ordering:
+            descending = ordering.startswith('-')
+            field = self.ORDERING_FIELDS.get(ordering.lstrip('-'))
+            if field is None:
+                raise ValidationError({'ordering': f'Must be one of {", ".join(self.ORDERING_FIELDS)}'})
+            queryset = queryset.order_by(f'-{field}' if descending else field, 'pk')
+        else:
+            queryset = queryset.order_by('pk')
+        return queryset
     
     @action(detail=False, methods=['get'])
     def expiring_soon(self, request):
         days = int(request.query_params.get('days', 7))
         expiry_threshold = timezone.now() + timedelta(days=days)
         expiring_items = Inventory.objects.filter(
+            _location_filter(request.query_params),
             expiry_date__lte=expiry_threshold,
             is_expired=False,
             quantity__gt=0
-        ).select_related('product')
+        ).with_expiry().order_by('expiry_date')
+        expiring_items = self.trim_queryset(expiring_items)
         serializer = self.get_serializer(expiring_items, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['post'])
+    def transfer(self, request, pk=None):
+        """
+        Move part or all of this batch to another location.
+
+        Body: {"to_location": <id>, "quantity": 5, "notes": "..."}
+        """
+        try:
+            quantity = int(request.data.get('quantity'))
+        except (TypeError, ValueError):
+            return Response({'error': 'quantity must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        to_location = Location.objects.filter(pk=request.data.get('to_location'), is_active=True).first()
+        if to_location is None:
+            return Response({'error': 'to_location must be an active location'}, status=status.HTTP_400_BAD_REQUEST)
+        if not Inventory.objects.filter(pk=pk).exists():
+            return Response({'error': 'Inventory item not found'}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            record = locations.transfer(
+                pk, to_location, quantity,
+                user=request.user,
+                notes=request.data.get('notes', ''),
+            )
+        except locations.TransferError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        print(f"✅ Moved {quantity} of item {pk} to {to_location.name}")
+        return Response(StockTransferSerializer(record).data, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def recall(self, request):
+        """
+        Find every batch hit by supplier recalls in one indexed query.
+        Staff only; consumers are reported by user id.
+
+        Body: {"recalls": [{"supplier": "Acme Dairy", "batch": "L23*"}, ...],
+               "quarantine": false}
+        A trailing * makes the batch a prefix match; an empty batch matches
+        every batch from that supplier. With "quarantine": true the matched
+        batches are taken out of usable stock in the same transaction.
+        """
+        recalls = request.data.get('recalls')
+        if not isinstance(recalls, list) or not recalls:
+            return Response({'error': 'recalls must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+
+        condition = Q()
+        for recall in recalls:
+            supplier_key = normalize_key(recall.get('supplier') if isinstance(recall, dict) else None)
+            if not supplier_key:
+                return Response({'error': 'Every recall needs a supplier'}, status=status.HTTP_400_BAD_REQUEST)
+            pattern = str(recall.get('batch') or '')
+            batch_key = normalize_key(pattern)
+            if not batch_key:
+                condition |= Q(supplier_key=supplier_key)
+            elif pattern.rstrip().endswith('*'):
+                condition |= Q(supplier_key=supplier_key, batch_key__startswith=batch_key)
+            else:
+                condition |= Q(supplier_key=supplier_key, batch_key=batch_key)
+
+        with transaction.atomic():
+            affected = Inventory.objects.filter(condition)
+            items = list(
+                affected
+                .annotate(value=F('quantity') * F('cost_price'))
+                .values(
+                    'id', 'product_id', 'product__name', 'product__barcode',
+                    'batch_number', 'supplier', 'quantity', 'cost_price',
+                    'value', 'expiry_date', 'quarantined'
+                )
+                .order_by('supplier_key', 'batch_key', 'pk')
+            )
+            consumers = list(
+                UsageLog.objects
+                .filter(inventory__in=affected.values('pk'), reason__in=UsageLog.CONSUMPTION_REASONS)
+                .values('used_by_id')
+                .annotate(quantity_used=Sum('quantity_used'), batches=Count('inventory_id', distinct=True))
+                .order_by('-quantity_used')
+            )
+            quarantined = 0
+            if request.data.get('quarantine'):
+                quarantined = affected.filter(quarantined=False).update(
+                    quarantined=True, version=F('version') + 1
+                )
+
+        return Response({
+            'batches': len(items),
+            'total_quantity': sum(item['quantity'] for item in items),
+            'total_value': sum((item['value'] for item in items), Decimal('0')),
+            'quarantined': quarantined,
+            'items': items,
+            'consumers': consumers,
+        })
+    
+    @action(detail=False, methods=['post'])
+    def stocktake(self, request):
+        """
+        Reconcile a full stock count in one request.
+
+        Body: {"counts": [{"barcode": "...", "batch_number": "L1", "counted": 5}, ...],
+               "full": true, "apply": false, "notes": "Weekly count",
+               "location": <id>}
+        Returns the variances; with "apply": true the adjustments are
+        written too. "full": false leaves batches missing from the upload
+        alone instead of counting them as zero. "location" restricts the
+        count to the stock held there.
+        """
+        apply = bool(request.data.get('apply'))
+        if apply and not request.user.is_authenticated:
+            return Response({'error': 'Sign in to apply a stocktake'}, status=status.HTTP_403_FORBIDDEN)
+        location = None
+        if request.data.get('location') not in (None, ''):
+            location = Location.objects.filter(pk=request.data.get('location')).first()
+            if location is None:
+                return Response({'error': 'Unknown location'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = stocktake.reconcile(
+                request.data.get('counts'),
+                full=request.data.get('full', True) not in (False, 'false', '0'),
+                apply=apply,
+                user=request.user if apply else None,
+                notes=request.data.get('notes', ''),
+                location=location,
+            )
+        except stocktake.StocktakeError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if apply:
+            print(f"✅ Stocktake applied: {result['variance_count']} batches adjusted")
+        return Response(result)
+    
     @action(detail=False, methods=['get'])
     def dashboard_stats(self, request):
-        total_items = Inventory.objects.filter(quantity__gt=0).count()
-        expiring_soon = Inventory.objects.filter(
+        # ?location= scopes the counts to one site
+        stock = Inventory.objects.filter(_location_filter(request.query_params))
+        total_items = stock.filter(quantity__gt=0).count()
+        expiring_soon = stock.filter(
             expiry_date__lte=timezone.now() + timedelta(days=7),
             is_expired=False,
             quantity__gt=0
         ).count()
-        expired_items = Inventory.objects.filter(
+        expired_items = stock.filter(
             expiry_date__lt=timezone.now()
         ).count()
         total_categories = Category.objects.count()
@@ -91,6 +443,65 @@ class InventoryViewSet(viewsets.ModelViewSet):
             'total_categories': total_categories
         })
 
+def _add_inventory_from_data(data, request):
+    """
+    Validate and create one scanned item. Returns the response body and
+    HTTP status shared by the single and batch add endpoints.
+    """
+    serializer = InventoryCreateSerializer(
+        data=data, 
+        context={'request': request}
+    )
+    
+    if serializer.is_valid():
+        inventory_item = serializer.save()
+        
+        # Return the created inventory item
+        response_serializer = InventorySerializer(inventory_item)
+        
+        print(f"✅ Inventory item created: {inventory_item}")
+        
+        return {
+            'success': True,
+            'message': 'Product added to inventory successfully!',
+            'data': response_serializer.data
+        }, status.HTTP_201_CREATED
+    
+    print(f"❌ Validation errors: {serializer.errors}")
+    return {
+        'success': False,
+        'message': 'Validation failed',
+        'errors': serializer.errors
+    }, status.HTTP_400_BAD_REQUEST
+
+def _queue_add_inventory(request):
+    """
+    Validate now, create later: the item is handed to a background worker
+    and the client gets 202 with a job to poll.
+    """
+    serializer = InventoryCreateSerializer(data=request.data, context={'request': request})
+    if not serializer.is_valid():
+        response = Response({
+            'success': False,
+            'message': 'Validation failed',
+            'errors': serializer.errors
+        }, status=status.HTTP_400_BAD_REQUEST)
+    else:
+        user = request.user if request.user.is_authenticated else None
+        job = jobs.enqueue('inventory.add_item', {
+            'data': json.loads(json.dumps(request.data, cls=DRFJSONEncoder)),
+            'user_id': user.pk if user else None,
+        })
+        print(f"⏳ Queued inventory item as job {job.pk}")
+        response = Response({
+            'success': True,
+            'message': 'Product queued for adding to inventory',
+            'job': JobSerializer(job).data,
+            'status_url': reverse('job-detail', args=[job.pk]),
+        }, status=status.HTTP_202_ACCEPTED)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
 @csrf_exempt
 @api_view(['POST'])
 def add_inventory_item(request):
@@ -101,32 +512,11 @@ def add_inventory_item(request):
         print(f"📥 Received add inventory request")
         print(f"📥 Request data: {request.data}")
         
-        serializer = InventoryCreateSerializer(
-            data=request.data, 
-            context={'request': request}
-        )
+        if request.query_params.get('async') in ('1', 'true'):
+            return _queue_add_inventory(request)
         
-        if serializer.is_valid():
-            inventory_item = serializer.save()
-            
-            # Return the created inventory item
-            response_serializer = InventorySerializer(inventory_item)
-            
-            print(f"✅ Inventory item created: {inventory_item}")
-            
-            response = Response({
-                'success': True,
-                'message': 'Product added to inventory successfully!',
-                'data': response_serializer.data
-            }, status=status.HTTP_201_CREATED)
-            
-        else:
-            print(f"❌ Validation errors: {serializer.errors}")
-            response = Response({
-                'success': False,
-                'message': 'Validation failed',
-                'errors': serializer.errors
-            }, status=status.HTTP_400_BAD_REQUEST)
+        body, response_status = _add_inventory_from_data(request.data, request)
+        response = Response(body, status=response_status)
         
         # Add CORS headers
         response['Access-Control-Allow-Origin'] = '*'
@@ -145,16 +535,465 @@ def add_inventory_item(request):
         response['Access-Control-Allow-Origin'] = '*'
         return response
 
-class UsageLogViewSet(viewsets.ModelViewSet):
+@csrf_exempt
+@api_view(['POST'])
+def add_inventory_batch(request):
+    """
+    Upload a whole offline scan queue in one request. Each entry can carry
+    its own ``idempotency_key``; entries the server has already seen (alone
+    or in an earlier batch) are replayed instead of creating duplicates.
+    """
+    entries = request.data.get('items') if isinstance(request.data, dict) else request.data
+    if not isinstance(entries, list):
+        response = Response({
+            'success': False,
+            'message': 'Expected a list of items'
+        }, status=status.HTTP_400_BAD_REQUEST)
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
+
+    print(f"📥 Received batch of {len(entries)} inventory items")
+
+    # Keys share their scope with the single add endpoint
+    scope = idempotency.request_scope(request, path=reverse('add_inventory_item'))
+    results = []
+    for entry in entries:
+        entry = dict(entry) if isinstance(entry, dict) else {}
+        key = entry.pop('idempotency_key', None)
+        record = None
+        if key:
+            try:
+                record, replay = idempotency.begin(key, scope, idempotency.data_fingerprint(entry))
+            except idempotency.KeyInUse:
+                results.append({'idempotency_key': key, 'status': 409, 'success': False,
+                                'message': 'A request with this Idempotency-Key is still being processed'})
+                continue
+            except idempotency.KeyReused:
+                results.append({'idempotency_key': key, 'status': 422, 'success': False,
+                                'message': 'This Idempotency-Key was already used with a different request body'})
+                continue
+            if replay is not None:
+                body = json.loads(idempotency.stored_body(replay) or b'{}')
+                results.append({'idempotency_key': key, 'status': replay.status_code, 'replayed': True, **body})
+                continue
+
+        try:
+            with transaction.atomic():
+                body, response_status = _add_inventory_from_data(entry, request)
+        except Exception as e:
+            print(f"❌ Error adding inventory item: {str(e)}")
+            if record is not None:
+                idempotency.abandon(record)
+            results.append({'idempotency_key': key, 'status': 500, 'success': False,
+                            'message': f'An error occurred: {str(e)}'})
+            continue
+
+        if record is not None:
+            idempotency.complete(
+                record, response_status, 'application/json',
+                json.dumps(body, cls=DRFJSONEncoder).encode()
+            )
+        results.append({'idempotency_key': key, 'status': response_status, **body})
+
+    response = Response({
+        'success': all(200 <= result['status'] < 300 for result in results),
+        'results': results
+    }, status=status.HTTP_200_OK)
+    response['Access-Control-Allow-Origin'] = '*'
+    return response
+
+class UsageLogViewSet(SparseFieldsViewSetMixin, viewsets.ModelViewSet):
     queryset = UsageLog.objects.all()
     serializer_class = UsageLogSerializer
 
+    # Every change moves the batch and its cost ledger with it, so the
+    # shelf and /valuation/stock/ agree (inventory/costing.py)
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except costing.InsufficientStock as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except costing.InsufficientStock as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    def perform_create(self, serializer):
+        with transaction.atomic():
+            usage_log = serializer.save()
+            costing.record_usage(usage_log)
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            costing.reverse_usage(UsageLog.objects.select_related('inventory').get(pk=serializer.instance.pk))
+            usage_log = serializer.save()
+            costing.record_usage(usage_log)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            costing.reverse_usage(instance)
+            instance.delete()
+
 
 class ProductMasterViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ProductMaster.objects.all()
     lookup_field = 'gtin'
     serializer_class = ProductMasterSerializer
 
-class InventoryItemViewSet(viewsets.ModelViewSet):
+    def get_object(self):
+        # Any UPC/EAN/padded form of the GTIN finds the product
+        product = self.get_queryset().filter(code_filter(self.kwargs['gtin'], 'gtin')).order_by('pk').first()
+        if product is None:
+            raise Http404
+        self.check_object_permissions(self.request, product)
+        return product
+
+class InventoryItemViewSet(OptimisticConcurrencyMixin, viewsets.ModelViewSet):
     queryset = InventoryItem.objects.all().order_by('-created_at')
     serializer_class = InventoryItemSerializer
+
+
+class ArchivedInventoryViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    History of batches moved out of the live table by the retention job.
+    Filter with ?product=<id> and ?supplier=.
+    """
+    serializer_class = ArchivedInventorySerializer
+
+    def get_queryset(self):
+        queryset = ArchivedInventory.objects.select_related('product').order_by('-archived_at', '-pk')
+        product = self.request.query_params.get('product')
+        if product:
+            queryset = queryset.filter(product_id=product)
+        supplier = self.request.query_params.get('supplier')
+        if supplier:
+            queryset = queryset.filter(supplier=supplier)
+        return queryset
+
+class ArchivedUsageLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Archived usage history. Filter with ?product=<id> or ?inventory=<id>
+    (the id of a live or archived batch).
+    """
+    serializer_class = ArchivedUsageLogSerializer
+
+    def get_queryset(self):
+        queryset = ArchivedUsageLog.objects.select_related('product').order_by('-created_at', '-pk')
+        product = self.request.query_params.get('product')
+        if product:
+            queryset = queryset.filter(product_id=product)
+        inventory = self.request.query_params.get('inventory')
+        if inventory:
+            queryset = queryset.filter(inventory_id=inventory)
+        return queryset
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Background job status (poll after a 202) and per-task timing stats."""
+    queryset = Job.objects.all().order_by('-created_at')
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        for param in ('name', 'status'):
+            value = self.request.query_params.get(param)
+            if value:
+                queryset = queryset.filter(**{param: value})
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        return Response(jobs.stats())
+
+class RequestProfileViewSet(viewsets.ReadOnlyModelViewSet):
+    """Reports captured by ProfilingMiddleware (staff only)."""
+    queryset = RequestProfile.objects.all().order_by('-created_at')
+    permission_classes = [permissions.IsAdminUser]
+
+    def get_serializer_class(self):
+        if self.action == 'retrieve':
+            return RequestProfileDetailSerializer
+        return RequestProfileSerializer
+
+class QueryStatViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    SQL totals per endpoint and statement fingerprint from
+    QueryLogMiddleware (staff only). ``?order=`` total_ms (default),
+    max_ms, avg_ms, count, slow_count or last_seen; ``?endpoint=`` and
+    ``?slow=1`` narrow the list.
+    """
+    serializer_class = QueryStatSerializer
+    permission_classes = [permissions.IsAdminUser]
+    ORDERINGS = ('total_ms', 'max_ms', 'avg_ms', 'count', 'slow_count', 'last_seen')
+
+    def get_queryset(self):
+        queryset = QueryStat.objects.annotate(avg_ms=F('total_ms') / F('count'))
+        endpoint = self.request.query_params.get('endpoint')
+        if endpoint:
+            queryset = queryset.filter(endpoint__icontains=endpoint)
+        if self.request.query_params.get('slow') in ('1', 'true'):
+            queryset = queryset.filter(slow_count__gt=0)
+        order = self.request.query_params.get('order', 'total_ms')
+        if order not in self.ORDERINGS:
+            raise ValidationError({'order': f"Must be one of {', '.join(self.ORDERINGS)}"})
+        return queryset.order_by(f'-{order}', 'pk')
+
+    @action(detail=False, methods=['get'])
+    def endpoints(self, request):
+        """Totals per endpoint, slowest first."""
+        rows = self.get_queryset().order_by().values('endpoint').annotate(
+            statements=Count('pk'),
+            count=Sum('count'),
+            total_ms=Sum('total_ms'),
+            max_ms=Max('max_ms'),
+            slow_count=Sum('slow_count'),
+        ).order_by('-total_ms')
+        return Response(list(rows))
+
+    @action(detail=False, methods=['post'])
+    def reset(self, request):
+        """Start the totals over, e.g. after adding an index."""
+        query_log.flush()
+        deleted, _ = QueryStat.objects.all().delete()
+        return Response({'deleted': deleted})
+
+class LocationViewSet(viewsets.ModelViewSet):
+    """Storage locations; /summary/ gives stock and expiry counts per location."""
+    queryset = Location.objects.all().order_by('name')
+    serializer_class = LocationSerializer
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        return Response(locations.location_summary())
+
+class StockTransferViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Transfer history. Filter with ?product=<id> and ?location=<id> (either
+    end of the move).
+    """
+    serializer_class = StockTransferSerializer
+
+    def get_queryset(self):
+        queryset = StockTransfer.objects.select_related(
+            'product', 'from_location', 'to_location'
+        ).order_by('-created_at', '-pk')
+        product = self.request.query_params.get('product')
+        if product:
+            queryset = queryset.filter(product_id=product)
+        location = self.request.query_params.get('location')
+        if location:
+            queryset = queryset.filter(Q(from_location_id=location) | Q(to_location_id=location))
+        return queryset
+
+class WasteViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Waste ledger (inventory/waste.py). Filter with ?product=, ?category=,
+    ?reason= and ?start=&end=.
+    """
+    serializer_class = WasteRecordSerializer
+
+    def get_queryset(self):
+        queryset = WasteRecord.objects.select_related(
+            'product', 'category', 'location'
+        ).order_by('-created_at', '-pk')
+        params = self.request.query_params
+        for param in ('product', 'category'):
+            if params.get(param):
+                queryset = queryset.filter(**{f'{param}_id': params[param]})
+        if params.get('reason'):
+            queryset = queryset.filter(reason=params['reason'])
+        if params.get('start'):
+            queryset = queryset.filter(created_at__gte=_parse_date_param('start', params['start']))
+        if params.get('end'):
+            queryset = queryset.filter(created_at__lt=_parse_date_param('end', params['end'], end_of_day=True))
+        return queryset
+
+    @action(detail=False, methods=['post'])
+    def write_off(self, request):
+        """
+        Zero batches and record them as waste in one transaction.
+
+        Body: {"inventory_ids": [1, 2], "reason": "damaged", "notes": "..."}
+        or {"expired": true, "location": <id or name>} for every expired
+        batch that still has stock. Without a reason, selected batches are
+        recorded as expired or other depending on their date.
+        """
+        if not request.user.is_authenticated:
+            return Response({'error': 'Sign in to write off stock'}, status=status.HTTP_403_FORBIDDEN)
+        reason = request.data.get('reason') or None
+        if reason and reason not in dict(WasteRecord.REASON_CHOICES):
+            return Response({'error': f'Unknown reason: {reason}'}, status=status.HTTP_400_BAD_REQUEST)
+        notes = request.data.get('notes', '')
+
+        if request.data.get('expired') in (True, 'true', '1'):
+            queryset = waste.expired_stock(_location_filter({'location': str(request.data.get('location') or '')}))
+            reason = reason or WasteRecord.EXPIRED
+        else:
+            ids = request.data.get('inventory_ids')
+            if not isinstance(ids, list) or not ids:
+                return Response(
+                    {'error': 'inventory_ids must be a non-empty list, or set expired to true'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                ids = [int(pk) for pk in ids]
+            except (TypeError, ValueError):
+                return Response({'error': 'inventory_ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+            queryset = Inventory.objects.filter(pk__in=ids)
+
+        result = waste.write_off(queryset, reason=reason, user=request.user, notes=notes)
+        return Response(result)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Waste between ?start= and ?end= (default: the last 30 days) grouped by
+        ?group_by=category (default), supplier, product, location or reason,
+        optionally per ?period=day, week or month; ?reason= narrows it.
+        """
+        params = request.query_params
+        end = _parse_date_param('end', params['end'], end_of_day=True) if params.get('end') else timezone.now()
+        start = _parse_date_param('start', params['start']) if params.get('start') else end - timedelta(days=30)
+        if start >= end:
+            raise ValidationError({'start': 'Must be before end'})
+        group_by = params.get('group_by', 'category')
+        if group_by not in waste.GROUPS:
+            raise ValidationError({'group_by': f"Must be one of {', '.join(waste.GROUPS)}"})
+        period = params.get('period') or None
+        if period and period not in waste.PERIODS:
+            raise ValidationError({'period': f"Must be one of {', '.join(waste.PERIODS)}"})
+        return Response(waste.waste_summary(start, end, group_by=group_by, period=period, reason=params.get('reason')))
+
+class RecipeViewSet(viewsets.ModelViewSet):
+    """Menu items and their ingredients; ?active=1 lists only active recipes."""
+    serializer_class = RecipeSerializer
+
+    def get_queryset(self):
+        queryset = Recipe.objects.prefetch_related('ingredients__product').order_by('name')
+        if self.request.query_params.get('active') in ('1', 'true'):
+            queryset = queryset.filter(is_active=True)
+        return queryset
+
+class SalesImportViewSet(viewsets.ReadOnlyModelViewSet):
+    """POS sales files applied as ingredient usage (inventory/sales.py)."""
+    queryset = SalesImport.objects.all().order_by('-created_at')
+    serializer_class = SalesImportSerializer
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def ingest(self, request):
+        """
+        Apply a POS sales CSV: a multipart upload in ``file``, or the CSV
+        itself as a text/csv body, which is read as it streams in.
+        ?dry_run=1 reports what would be used without writing anything;
+        ?location=<id or name> takes stock from that location only.
+        Only a dry run may be sent without signing in.
+        """
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        if not dry_run and not request.user.is_authenticated:
+            return Response({'error': 'Sign in to import sales'}, status=status.HTTP_403_FORBIDDEN)
+        if request.content_type.startswith('text/csv'):
+            lines, filename = request.stream, request.query_params.get('filename', '')
+            if lines is None:
+                return Response({'error': 'Empty request body'}, status=status.HTTP_400_BAD_REQUEST)
+        else:
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response(
+                    {'error': 'Upload the sales CSV as "file" or send it as text/csv'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            lines, filename = upload, upload.name
+
+        location = _location_filter(request.query_params)
+        try:
+            result = sales.import_sales(
+                lines,
+                user=request.user if request.user.is_authenticated else None,
+                filename=filename,
+                location=location if location else None,
+                dry_run=dry_run,
+            )
+        except sales.SalesImportError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except UnicodeDecodeError:
+            return Response({'error': 'The sales file must be UTF-8 text'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK if result['dry_run'] else status.HTTP_201_CREATED)
+
+class ValuationViewSet(viewsets.ViewSet):
+    """
+    Stock valuation read from the running cost ledgers (inventory/costing.py)
+    rather than from batch history.
+    """
+
+    @action(detail=False, methods=['get'])
+    def stock(self, request):
+        """Current stock value; ?product=, ?supplier=, ?by_supplier=1."""
+        supplier = request.query_params.get('supplier')
+        return Response(costing.stock_valuation(
+            product=request.query_params.get('product'),
+            supplier_key=normalize_key(supplier) if supplier else None,
+            by_supplier=request.query_params.get('by_supplier') in ('1', 'true'),
+        ))
+
+    @action(detail=False, methods=['get'])
+    def cogs(self, request):
+        """Cost of goods used between ?start= and ?end= (default: the last 30 days); ?product=."""
+        params = request.query_params
+        end = _parse_date_param('end', params['end'], end_of_day=True) if params.get('end') else timezone.now()
+        start = _parse_date_param('start', params['start']) if params.get('start') else end - timedelta(days=30)
+        if start >= end:
+            raise ValidationError({'start': 'Must be before end'})
+        return Response(costing.cost_of_goods_used(start, end, product=params.get('product')))
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """
+        Stock value from the nightly snapshots. ?date=YYYY-MM-DD gives the
+        breakdown on that day (per category, or per product with
+        ?by_product=1); ?start=&end= gives one total per day for a trend
+        chart. Both take ?category=<id>; ranges also take ?product=<id>.
+        """
+        params = request.query_params
+        if params.get('date'):
+            day = parse_date(params['date'])
+            if day is None:
+                raise ValidationError({'date': 'Expected YYYY-MM-DD'})
+            result = snapshots.stock_on(
+                day,
+                by_product=params.get('by_product') in ('1', 'true'),
+                category=params.get('category'),
+            )
+            if result is None:
+                return Response({'error': f'No snapshot on or before {day}'}, status=status.HTTP_404_NOT_FOUND)
+            return Response(result)
+
+        end = parse_date(params['end']) if params.get('end') else timezone.localdate()
+        start = parse_date(params['start']) if params.get('start') else None
+        if start is None and params.get('start'):
+            raise ValidationError({'start': 'Expected YYYY-MM-DD'})
+        if end is None:
+            raise ValidationError({'end': 'Expected YYYY-MM-DD'})
+        start = start or end - timedelta(days=30)
+        if start > end:
+            raise ValidationError({'start': 'Must not be after end'})
+        return Response({
+            'start': start,
+            'end': end,
+            'results': snapshots.stock_history(
+                start, end, product=params.get('product'), category=params.get('category')
+            ),
+        })
+
+    @action(detail=False, methods=['get'])
+    def price_trends(self, request):
+        """Receipt price history per supplier; needs ?product= or ?supplier=, optional ?since=."""
+        params = request.query_params
+        if not params.get('product') and not params.get('supplier'):
+            return Response({'error': 'product or supplier parameter required'}, status=status.HTTP_400_BAD_REQUEST)
+        since = _parse_date_param('since', params['since']) if params.get('since') else None
+        return Response(costing.price_trends(
+            product=params.get('product'),
+            supplier_key=normalize_key(params['supplier']) if params.get('supplier') else None,
+            since=since,
+        ))
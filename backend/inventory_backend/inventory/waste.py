@@ -0,0 +1,144 @@
+# backend/inventory/waste.py
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.utils import timezone
+
+from . import costing
+from .models import Inventory, InventoryQuerySet, WasteRecord
+
+GROUPS = {
+    'category': ['category_id', 'category__name'],
+    'supplier': ['supplier_key', 'supplier'],
+    'product': ['product_id', 'product__name'],
+    'location': ['location_id', 'location__name'],
+    'reason': ['reason'],
+}
+PERIODS = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _reason_for(row, today):
+    expired = row['is_expired'] or timezone.localdate(row['expiry_date']) < today
+    return WasteRecord.EXPIRED if expired else WasteRecord.OTHER
+
+
+def write_off(queryset, reason=None, user=None, notes=''):
+    """
+    Zero every batch in ``queryset`` that still has stock and record the
+    loss: one UPDATE per chunk of batches, one bulk insert of WasteRecords
+    and one pass over the cost ledgers, all in a single transaction.
+    Without a ``reason`` each batch is recorded as expired or other.
+    """
+    today = timezone.localdate()
+    chunk = _setting('WASTE_BATCH_SIZE', 500)
+    with transaction.atomic():
+        rows = list(
+            queryset.filter(quantity__gt=0).select_for_update(of=('self',)).order_by('pk').values(
+                'id', 'product_id', 'product__category_id', 'location_id', 'supplier', 'supplier_key',
+                'quantity', 'cost_price', 'expiry_date', 'is_expired'
+            )
+        )
+        if not rows:
+            return {'batches': 0, 'quantity': 0, 'value': Decimal('0')}
+
+        values = costing.issue_many(
+            (
+                Inventory(
+                    pk=row['id'], product_id=row['product_id'], supplier=row['supplier'],
+                    supplier_key=row['supplier_key'], cost_price=row['cost_price']
+                ),
+                row['quantity']
+            )
+            for row in rows
+        )
+        # Batches past their date are flagged as expired on the way
+        flag = Case(When(InventoryQuerySet._expired_q(today), then=Value(True)), default=F('is_expired'))
+        ids = [row['id'] for row in rows]
+        for start in range(0, len(ids), chunk):
+            Inventory.objects.filter(pk__in=ids[start:start + chunk]).update(
+                quantity=0, is_expired=flag, version=F('version') + 1
+            )
+        WasteRecord.objects.bulk_create(
+            [
+                WasteRecord(
+                    inventory_id=row['id'],
+                    product_id=row['product_id'],
+                    category_id=row['product__category_id'],
+                    location_id=row['location_id'],
+                    supplier=row['supplier'],
+                    supplier_key=row['supplier_key'],
+                    quantity=row['quantity'],
+                    unit_cost=row['cost_price'],
+                    value=value,
+                    reason=reason or _reason_for(row, today),
+                    expiry_date=row['expiry_date'],
+                    recorded_by=user,
+                    notes=notes,
+                )
+                for row, value in zip(rows, values)
+            ],
+            batch_size=chunk
+        )
+
+    total_value = sum(values, Decimal('0'))
+    print(f"🗑️ Wrote off {len(rows)} batches ({sum(row['quantity'] for row in rows)} units, {total_value})")
+    return {
+        'batches': len(rows),
+        'quantity': sum(row['quantity'] for row in rows),
+        'value': total_value,
+    }
+
+
+def expired_stock(location=None):
+    """Expired batches that still hold stock, optionally at one location (a Q)."""
+    queryset = Inventory.objects.with_status('expired').filter(quantity__gt=0)
+    if location is not None:
+        queryset = queryset.filter(location)
+    return queryset
+
+
+def write_off_expired(user=None, notes='', location=None):
+    return write_off(expired_stock(location), reason=WasteRecord.EXPIRED, user=user,
+                     notes=notes or 'Expired stock write-off')
+
+
+def waste_summary(start, end, group_by='category', period=None, reason=None):
+    """
+    Written-off quantity and value in [start, end) per category, supplier,
+    product, location or reason, optionally split by day, week or month.
+    Filters on created_at first so the (group, created_at) indexes apply.
+    """
+    if group_by not in GROUPS:
+        raise ValueError(f'Unknown group: {group_by}')
+    if period is not None and period not in PERIODS:
+        raise ValueError(f'Unknown period: {period}')
+
+    records = WasteRecord.objects.filter(created_at__gte=start, created_at__lt=end)
+    if reason:
+        records = records.filter(reason=reason)
+    group = list(GROUPS[group_by])
+    if period:
+        records = records.annotate(period=PERIODS[period]('created_at'))
+        group = ['period'] + group
+    rows = list(
+        records.values(*group)
+        .annotate(records=Count('pk'), quantity=Sum('quantity'), value=Sum('value'))
+        .order_by(*(['period'] if period else []), '-value')
+    )
+    return {
+        'start': start,
+        'end': end,
+        'group_by': group_by,
+        'period': period,
+        'total_quantity': sum(row['quantity'] for row in rows),
+        'total_value': sum((row['value'] for row in rows), Decimal('0')),
+        'results': rows,
+    }
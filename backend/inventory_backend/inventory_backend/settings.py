@@ -1,3 +1,4 @@
+import tempfile
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -39,6 +40,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.profiling.ProfilingMiddleware',
+    'inventory.querylog.QueryLogMiddleware',
+    'inventory.throttling.ThrottleMiddleware',
+    'inventory.idempotency.IdempotencyMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -70,6 +75,18 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all worker processes on this host so throttling limits hold
+    # across them; point at Redis/Memcached when running on several hosts
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'cheftrack-throttle'),
+    },
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,4 +133,107 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
-]
\ No newline at end of file
+    'idempotency-key',
+    'if-match',
+    'if-none-match',
+]
+CORS_EXPOSE_HEADERS = ['etag']
+
+# How long a stored Idempotency-Key response can be replayed
+IDEMPOTENCY_KEY_TTL_HOURS = 24
+# A request still in flight after this long is presumed dead; a retry may take its key over
+IDEMPOTENCY_LEASE_SECONDS = 60
+
+# Retention: batches and usage logs past these windows are moved to the
+# archive tables by `manage.py archive_inventory`
+INVENTORY_CLOSED_RETENTION_DAYS = 30     # used-up batches
+INVENTORY_EXPIRED_RETENTION_DAYS = 90    # batches past their expiry date
+USAGE_LOG_RETENTION_DAYS = 365
+RETENTION_BATCH_SIZE = 500
+
+# Demand forecasting / reorder suggestions (inventory/forecasting.py)
+FORECAST_HISTORY_DAYS = 56    # days of UsageLog history per forecast
+REORDER_COVER_DAYS = 7        # days of demand an order should cover, capped by shelf life
+
+# Background jobs (inventory/jobs.py, `manage.py run_jobs`)
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_BASE_SECONDS = 30        # doubled after every failed attempt
+JOB_LOCK_TIMEOUT_SECONDS = 600     # running jobs older than this are requeued
+
+# Token-bucket throttling (inventory/throttling.py), keyed by URL name.
+# Each rate is also the burst size. Best-effort: concurrent requests from one
+# client can each get through before the bucket is updated.
+THROTTLE_CACHE_ALIAS = 'throttle'
+THROTTLE_RATES = {
+    'login': '10/min',
+    'register': '5/min',
+    'add_inventory_item': '120/min',
+    'add_inventory_batch': '30/min',
+}
+THROTTLE_TRUST_X_FORWARDED_FOR = False
+
+# Product image thumbnails (inventory/thumbnails.py), cached under MEDIA_ROOT
+THUMBNAIL_FETCHER = 'inventory.thumbnails.urllib_fetcher'   # callable(url) -> bytes
+THUMBNAIL_SIZES = (160, 96, 320)                            # first is the default
+THUMBNAIL_QUALITY = 80
+THUMBNAIL_FETCH_TIMEOUT = 10
+THUMBNAIL_MAX_SOURCE_BYTES = 10 * 1024 * 1024
+
+# Staff request profiling (?_profile=1 or X-Profile: 1, inventory/profiling.py)
+PROFILING_TOP_FUNCTIONS = 40
+PROFILING_N_PLUS_ONE_THRESHOLD = 5   # same SQL this many times in one request
+
+# Device catalog snapshot (products/catalog/, inventory/catalog.py)
+CATALOG_SNAPSHOTS_KEPT = 3
+CATALOG_WATERMARK_OVERLAP_SECONDS = 60   # re-read rows saved this close to the last build
+
+# Inventory writes without If-Match are rejected with 428 when True
+# (inventory/concurrency.py); otherwise they are checked against the
+# version read at the start of the request
+CONCURRENCY_REQUIRE_IF_MATCH = False
+
+# Waste write-offs (inventory/waste.py)
+WASTE_BATCH_SIZE = 500
+WASTE_WRITE_OFF_ON_SWEEP = False   # expiry_sweep also writes expired stock off
+
+# POS sales imports (inventory/sales.py): rows per bulk UPDATE/INSERT
+SALES_IMPORT_BATCH_SIZE = 500
+
+# Process-local id cache for categories, products and the system user on the
+# scan insert path (inventory/resolvers.py); local changes clear it by signal,
+# the TTL bounds how stale another process's changes can be
+RESOLVER_CACHE_TTL_SECONDS = 300
+RESOLVER_CACHE_SIZE = 10000
+
+# SQL statistics per endpoint and statement fingerprint (inventory/querylog.py),
+# staff report at /api/sql-stats/
+QUERYLOG_ENABLED = True
+QUERYLOG_SAMPLE_RATE = 1.0                  # share of requests timed
+QUERYLOG_SLOW_MS = 100                      # logged, and EXPLAINed if a SELECT
+QUERYLOG_EXPLAIN_INTERVAL_SECONDS = 3600    # per endpoint and fingerprint
+QUERYLOG_FLUSH_SECONDS = 60                 # EXPLAIN and write-out, in a background thread
+QUERYLOG_MAX_SQL_CHARS = 4000
+
+# Created on the first write (inventory/log_handlers.py)
+LOG_DIR = BASE_DIR / 'logs'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'querylog_file': {
+            'class': 'inventory.log_handlers.RotatingFileHandler',
+            'filename': LOG_DIR / 'sql.log',
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'delay': True,
+        },
+    },
+    'loggers': {
+        'inventory.querylog': {
+            'handlers': ['querylog_file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
+}